@@ -0,0 +1,116 @@
+# benchmarks/history.py
+
+"""
+This module keeps benchmark results per commit and flags regressions.
+Every run is appended as one JSON line (suite, commit, metrics) to a history file; a new run is
+compared with the latest run of the same suite on another commit (or a chosen baseline commit).
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+
+
+DEFAULT_HISTORY_FILE = "json_data/benchmarks/history.jsonl"
+
+# Metrics where a larger value is better; every other metric (seconds, commands, bytes) should shrink
+HIGHER_IS_BETTER_SUFFIXES = ("_per_second",)
+
+
+def current_commit():
+    """
+    Return (short commit hash, dirty flag) of the working tree, or (None, False) outside a git checkout.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def load(history_file=DEFAULT_HISTORY_FILE, suite=None):
+    """Return the recorded runs (oldest first), optionally only those of one suite."""
+    if not os.path.exists(history_file):
+        return []
+    runs = []
+    with open(history_file, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                run = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if suite is None or run.get("suite") == suite:
+                runs.append(run)
+    return runs
+
+
+def record(suite, metrics, history_file=DEFAULT_HISTORY_FILE, details=None):
+    """Append a run to the history file and return it."""
+    commit, dirty = current_commit()
+    run = {
+        "suite": suite,
+        "commit": commit,
+        "dirty": dirty,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "metrics": metrics,
+        "details": details or {},
+    }
+    directory = os.path.dirname(history_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(history_file, "a", encoding="utf-8") as file:
+        file.write(json.dumps(run, ensure_ascii=False) + "\n")
+    return run
+
+
+def baseline(suite, history_file=DEFAULT_HISTORY_FILE, commit=None):
+    """
+    Pick the run to compare against.
+
+    :param commit: Baseline commit (prefix match); default: the latest run made on another commit than HEAD.
+    :return: The baseline run, or None if there is none yet.
+    """
+    head, _ = current_commit()
+    for run in reversed(load(history_file, suite)):
+        if commit is not None:
+            if run["commit"] and run["commit"].startswith(commit):
+                return run
+        elif run["commit"] != head:
+            return run
+    return None
+
+
+def compare(metrics, baseline_metrics, threshold=0.1):
+    """
+    Compare two metric dicts.
+
+    :param threshold: Relative change in the wrong direction that counts as a regression (0.1 = 10%).
+    :return: One row per shared numeric metric: {"metric", "baseline", "current", "change", "regressed"}.
+    """
+    rows = []
+    for name, current in metrics.items():
+        previous = baseline_metrics.get(name)
+        if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)):
+            continue
+        change = (current - previous) / previous if previous else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER_SUFFIXES) else change
+        rows.append({"metric": name, "baseline": previous, "current": current, "change": round(change, 4),
+                     "regressed": worse > threshold})
+    return rows
+
+
+def print_comparison(rows, baseline_run):
+    """Print a comparison table; returns True if any metric regressed."""
+    label = f"{baseline_run['commit']}{' (dirty)' if baseline_run.get('dirty') else ''} ({baseline_run['recorded_at']})"
+    print(f"Compared with {label}:")
+    for row in rows:
+        flag = "REGRESSION" if row["regressed"] else ""
+        print(f"  {row['metric']:<36} {row['baseline']:>14} -> {row['current']:<14} {row['change']:+.1%} {flag}")
+    return any(row["regressed"] for row in rows)
@@ -0,0 +1,158 @@
+# benchmarks/micro_benchmark.py
+
+"""
+This module times the two per-itinerary hot spots outside the browser:
+- structure_flight_data: turning the raw values read from a detail page into the stored record
+  (build_flight_data, fed with the raw parents of the saved pages in fixtures/detail_pages);
+- save_flight_data: appending one itinerary to a JSONL store that already holds N flights,
+  which should cost the same at 1k and 100k stored flights;
+- memory: the traced size of N loaded itineraries as the slotted Itinerary objects of core.records
+  and as plain dicts (json.loads). Dicts take ~9 KB per record, so they are measured on a sample of
+  at most DICT_SAMPLE_RECORDS and extrapolated to N.
+"""
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from lxml import html as lxml_html
+
+from config.save_data import build_flight_data, save_flight_data
+from core.jsonl_store import JsonlFlightStore
+from core.page_parser import PARENTS_XPATH, _read_parent
+from core.records import Itinerary
+
+
+DETAIL_PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "fixtures", "detail_pages")
+DEFAULT_SIZES = (1_000, 100_000)
+DEFAULT_MEMORY_RECORDS = 1_000_000
+DICT_SAMPLE_RECORDS = 100_000  # ~0.9 GB of dicts
+
+
+def _fixture_parents(fixture_dir=DETAIL_PAGES_DIR):
+    """Raw parent values and parent count of every saved detail page."""
+    pages = []
+    for page_path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(page_path, "r", encoding="utf-8") as file:
+            parents = PARENTS_XPATH(lxml_html.fromstring(file.read()))
+        pages.append(([_read_parent(parent) for parent in parents[:2]], len(parents)))
+    return pages
+
+
+def _fixture_records(fixture_dir=DETAIL_PAGES_DIR):
+    records = []
+    for expected_path in sorted(glob.glob(os.path.join(fixture_dir, "*.json"))):
+        with open(expected_path, "r", encoding="utf-8") as file:
+            records.append(json.load(file))
+    return records
+
+
+def bench_structure(count):
+    """
+    Structure `count` itineraries, cycling over the saved pages.
+
+    :return: Microseconds per itinerary.
+    """
+    pages = _fixture_parents()
+    started = time.perf_counter()
+    for index in range(count):
+        raw_parents, parent_count = pages[index % len(pages)]
+        build_flight_data(raw_parents, parent_count)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def bench_save(stored, samples=1_000, chunk=1_000):
+    """
+    Fill a temporary store with `stored` flights, then time `samples` single saves.
+
+    :return: (microseconds per save, bytes per stored flight).
+    """
+    records = _fixture_records()
+    work_dir = tempfile.mkdtemp(prefix="flightscraper-micro-")
+    try:
+        store = JsonlFlightStore(os.path.join(work_dir, "flight_segments"))
+        for offset in range(0, stored, chunk):
+            store.append_many(records[(offset + index) % len(records)] for index in range(min(chunk, stored - offset)))
+
+        started = time.perf_counter()
+        for index in range(samples):
+            save_flight_data(records[index % len(records)], store)
+        elapsed = time.perf_counter() - started
+
+        store.close()
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(store.directory, "*.jsonl")))
+        return elapsed / samples * 1e6, size / (stored + samples)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _stored_lines(count):
+    """Yield `count` JSONL lines cycling over the saved records, each with its own price and scrape time."""
+    records = _fixture_records()
+    for index in range(count):
+        record = dict(records[index % len(records)], price=f"{100 + index % 900} €",
+                      scraped_at=f"2025-02-{1 + index % 28:02d}T{index % 24:02d}:{index % 60:02d}:{index // 60 % 60:02d}Z")
+        yield json.dumps(record, ensure_ascii=False)
+
+
+def bench_memory(count, loader):
+    """
+    Load `count` stored lines with `loader` and keep them all in memory.
+
+    :return: (traced bytes per record, microseconds per record).
+    """
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        loaded = [loader(line) for line in _stored_lines(count)]
+        elapsed = time.perf_counter() - started
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del loaded
+    return size / count, elapsed / count * 1e6
+
+
+def _label(size):
+    if size >= 1_000_000:
+        return f"{size // 1_000_000}m"
+    return f"{size // 1000}k" if size >= 1000 else str(size)
+
+
+def run_micro_benchmarks(sizes=DEFAULT_SIZES, records=DEFAULT_MEMORY_RECORDS, dict_sample=DICT_SAMPLE_RECORDS):
+    """
+    :param records: Itineraries held in memory by the dict / Itinerary memory benchmark (0 to skip it).
+    :param dict_sample: Dict records actually loaded; their size is extrapolated to `records`.
+    :return: (metrics, details): metrics named like "save_flight_data_100k_us" for the history file.
+    """
+    metrics, details = {}, {}
+    for size in sizes:
+        label = _label(size)
+        metrics[f"structure_flight_data_{label}_us"] = round(bench_structure(size), 2)
+        save_us, bytes_per_flight = bench_save(size)
+        metrics[f"save_flight_data_{label}_us"] = round(save_us, 2)
+        details[f"bytes_per_flight_{label}"] = round(bytes_per_flight)
+
+    if records:
+        label = _label(records)
+        for name, loader, count in (("itinerary", Itinerary.from_json, records),
+                                    ("dict", json.loads, min(records, dict_sample))):
+            bytes_per_record, load_us = bench_memory(count, loader)
+            metrics[f"{name}_records_{label}_mb"] = round(bytes_per_record * records / 2 ** 20, 1)
+            details[f"{name}_bytes_per_record"] = round(bytes_per_record)
+            details[f"{name}_load_us"] = round(load_us, 2)
+            details[f"{name}_measured_records"] = count
+    return metrics, details
+
+
+def print_report(metrics, details):
+    print("Micro-benchmarks (microseconds per itinerary):")
+    for name, value in metrics.items():
+        print(f"  {name}: {value}")
+    for name, value in details.items():
+        print(f"  {name}: {value}")
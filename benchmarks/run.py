@@ -0,0 +1,86 @@
+# benchmarks/run.py
+
+"""
+Command-line entry point of the offline benchmark suite.
+
+Usage:
+    python -m benchmarks.run scraper [--routes 3] [--max-flights 8] [--extraction-mode script] [--contexts 3]
+    python -m benchmarks.run micro [--sizes 1000 100000] [--records 1000000]
+    python -m benchmarks.run history [--suite scraper]
+
+Each run is recorded in json_data/benchmarks/history.jsonl with the current commit and compared with
+the latest run of another commit; the exit code is 1 if a metric regressed by more than --threshold.
+"""
+
+import argparse
+import sys
+
+from benchmarks import history
+from core.telemetry import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks and track regressions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scraper_parser = commands.add_parser("scraper", help="Full scraper flow in headless Chrome on the fixture site.")
+    scraper_parser.add_argument("--routes", type=int, default=3, help="Number of benchmark routes (max 3).")
+    scraper_parser.add_argument("--max-flights", type=int, default=8)
+    scraper_parser.add_argument("--extraction-mode", choices=["script", "html", "element"], default="script")
+    scraper_parser.add_argument("--show-browser", action="store_true", help="Run Chrome with a window.")
+    scraper_parser.add_argument("--contexts", type=int, default=0,
+                                help="Scrape the routes concurrently as tabs of one Chrome (recorded as "
+                                     "the scraper-contexts suite).")
+
+    micro_parser = commands.add_parser("micro", help="structure_flight_data / save_flight_data micro-benchmarks.")
+    micro_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000],
+                              help="Stored flights (and structured itineraries) per measurement.")
+    micro_parser.add_argument("--records", type=int, default=1_000_000,
+                              help="Itineraries held in memory as Itinerary objects (0 to skip); dicts are "
+                                   "measured on at most 100k of them and extrapolated.")
+
+    history_parser = commands.add_parser("history", help="Print the recorded runs.")
+    history_parser.add_argument("--suite", choices=["scraper", "scraper-contexts", "micro"], default=None)
+
+    for command in (scraper_parser, micro_parser):
+        command.add_argument("--history-file", default=history.DEFAULT_HISTORY_FILE)
+        command.add_argument("--baseline", default=None, help="Commit to compare with (default: previous commit run).")
+        command.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression.")
+        command.add_argument("--no-record", action="store_true", help="Compare without appending to the history.")
+    history_parser.add_argument("--history-file", default=history.DEFAULT_HISTORY_FILE)
+    args = parser.parse_args()
+
+    configure_logging("WARNING")  # Keep per-itinerary INFO logs out of the measurements and the report
+
+    if args.command == "history":
+        for run in history.load(args.history_file, args.suite):
+            print(f"{run['recorded_at']} {run['suite']:<8} {run['commit']}{'*' if run['dirty'] else ''} "
+                  f"{run['metrics']}")
+        return 0
+
+    suite = args.command
+    if args.command == "scraper":
+        from benchmarks.scraper_benchmark import DEFAULT_ROUTES, print_report, run_scraper_benchmark
+        metrics, details = run_scraper_benchmark(DEFAULT_ROUTES[:args.routes], max_flights=args.max_flights,
+                                                 extraction_mode=args.extraction_mode,
+                                                 headless=not args.show_browser, contexts=args.contexts)
+        if args.contexts:
+            suite = "scraper-contexts"  # Wall-time throughput: not comparable with sequential runs
+    else:
+        from benchmarks.micro_benchmark import print_report, run_micro_benchmarks
+        metrics, details = run_micro_benchmarks(args.sizes, args.records)
+    print_report(metrics, details)
+
+    baseline_run = history.baseline(suite, args.history_file, args.baseline)
+    if not args.no_record:
+        history.record(suite, metrics, args.history_file, details)
+    if baseline_run is None:
+        print("No earlier run of another commit to compare with.")
+        return 0
+    regressed = history.print_comparison(history.compare(metrics, baseline_run["metrics"], args.threshold),
+                                         baseline_run)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
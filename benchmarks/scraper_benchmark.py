@@ -0,0 +1,187 @@
+# benchmarks/scraper_benchmark.py
+
+"""
+This module runs the full KiwiFlightScraper flow (landing page, search form, date picker, result cards,
+detail views) in headless Chrome against the local fixture site in fixtures/site, so scraper
+performance can be measured without touching the live site.
+
+Reported per run: itineraries per second, seconds per route, WebDriver commands per itinerary,
+peak RSS (Python plus chromedriver and its Chrome processes) and bytes written to the store.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.save_data import save_flight_data
+from core.browser_contexts import ContextPool, process_tree_rss
+from core.browser_manager import BrowserManager, PerformanceProfile
+from core.command_counter import WebDriverCommandCounter
+from core.driver_pool import DriverPool
+from core.jsonl_store import JsonlFlightStore
+from core.scraper_engine import KiwiFlightScraper
+from core.stub_server import ReplayServer
+from core.timing import JitterPolicy
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "site")
+
+# The fixture date picker opens on February 2025, like the routes in main.py
+DEFAULT_ROUTES = [
+    ("Chicago", "London", "2025-02-06", "2025-03-01", "February 2025", "March 2025"),
+    ("New York", "Paris", "2025-02-10", "2025-03-05", "February 2025", "March 2025"),
+    ("Berlin", "Rome", "2025-03-12", "2025-04-02", "March 2025", "April 2025"),
+]
+
+
+class RssSampler:
+    """Samples the RSS of this process plus the watched chromedriver trees and keeps the peak."""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self.available = os.path.isdir("/proc")
+        self._pids = {os.getpid()}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def watch(self, driver):
+        """Include a driver's chromedriver process (and the Chrome processes it started)."""
+        process = getattr(getattr(driver, "service", None), "process", None)
+        if process is not None:
+            self._pids.add(process.pid)
+
+    def sample(self):
+        if self.available:
+            self.peak = max(self.peak, process_tree_rss(self._pids))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def run_scraper_benchmark(routes=DEFAULT_ROUTES, max_flights=8, extraction_mode="script", headless=True,
+                          site_dir=SITE_DIR, contexts=0):
+    """
+    Scrape every route from the fixture site with one pooled headless Chrome.
+
+    :param routes: Route tuples like main.ROUTES (dates must fall in the fixture's date picker range).
+    :param max_flights: Cards scraped per route; above 5 the "Load more" button is exercised too.
+    :param extraction_mode: Extraction mode passed to the scraper.
+    :param contexts: Run up to this many routes at once as tabs of one Chrome (ContextPool) instead of
+        one after another; itineraries per second are then measured over the wall time.
+    :return: (metrics, details): flat numeric metrics compared across commits, plus counts and per-route details.
+    """
+    work_dir = tempfile.mkdtemp(prefix="flightscraper-bench-")
+    store = JsonlFlightStore(os.path.join(work_dir, "flight_segments"))
+    server = ReplayServer(site_dir).start()
+    if contexts:
+        pool = ContextPool(BrowserManager(headless=headless, profile=PerformanceProfile(page_load_strategy="none")),
+                           max_contexts=contexts)
+    else:
+        pool = DriverPool(BrowserManager(headless=headless, profile=PerformanceProfile()), size=1)
+    sampler = RssSampler().start()
+    per_route = []
+    started = time.perf_counter()
+
+    def scrape(route):
+        driver = pool.acquire()
+        sampler.watch(driver)
+        itineraries = []
+
+        def sink(flight_data):
+            itineraries.append(flight_data)
+            save_flight_data(flight_data, store)
+
+        scraper = KiwiFlightScraper(*route, headless=headless, extraction_mode=extraction_mode, sink=sink,
+                                    driver=driver, jitter=JitterPolicy(enabled=False), max_flights=max_flights,
+                                    base_url=server.base_url + "/")
+        route_started = time.perf_counter()
+        error = None
+        with WebDriverCommandCounter(driver) as counter:
+            try:
+                scraper.run()
+            except Exception as e:
+                error = str(e) or type(e).__name__
+        pool.release(driver)
+        return {
+            "route": f"{route[0]} -> {route[1]}",
+            "seconds": round(time.perf_counter() - route_started, 3),
+            "itineraries": len(itineraries),
+            "commands": counter.count,
+            "error": error,
+            "phases": scraper.timing.report(),
+        }
+
+    try:
+        if contexts:
+            with ThreadPoolExecutor(max_workers=contexts, thread_name_prefix="bench-route") as executor:
+                per_route = list(executor.map(scrape, routes))
+        else:
+            per_route = [scrape(route) for route in routes]
+    finally:
+        wall_seconds = time.perf_counter() - started
+        sampler.stop()
+        pool_stats = pool.stats()
+        pool.close()
+        server.stop()
+        store.close()
+        bytes_written = _directory_size(store.directory)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    itineraries = sum(route["itineraries"] for route in per_route)
+    # Concurrent routes overlap, so their throughput is measured over the wall time
+    scrape_seconds = wall_seconds if contexts else sum(route["seconds"] for route in per_route)
+    commands = sum(route["commands"] for route in per_route)
+    metrics = {
+        "itineraries_per_second": round(itineraries / scrape_seconds, 4) if scrape_seconds else 0.0,
+        "seconds_per_route": round(scrape_seconds / len(per_route), 3) if per_route else 0.0,
+        "commands_per_itinerary": round(commands / itineraries, 1) if itineraries else None,
+        "peak_rss_mb": round(sampler.peak / 2 ** 20, 1) if sampler.available else None,
+        "python_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        "bytes_written": bytes_written,
+        "wall_seconds": round(wall_seconds, 3),
+    }
+    details = {"routes": len(per_route), "itineraries": itineraries, "per_route": per_route, "bytes_served": server.bytes_served, "requests_served": server.requests_served,
+               "max_flights": max_flights, "extraction_mode": extraction_mode, "contexts": contexts, "pool": pool_stats}
+    return metrics, details
+
+
+def print_report(metrics, details):
+    print(f"Scraper benchmark: {details['routes']} routes, {details['itineraries']} itineraries "
+          f"({details['extraction_mode']} extraction, {details['max_flights']} cards per route)")
+    for route in details["per_route"]:
+        error = f", failed: {route['error']}" if route["error"] else ""
+        print(f"  {route['route']}: {route['seconds']}s, {route['itineraries']} itineraries, "
+              f"{route['commands']} WebDriver commands{error}")
+    print(f"  itineraries/s: {metrics['itineraries_per_second']}, s/route: {metrics['seconds_per_route']}, "
+          f"commands/itinerary: {metrics['commands_per_itinerary']}")
+    print(f"  peak RSS: {metrics['peak_rss_mb']} MB (Python alone {metrics['python_peak_rss_mb']} MB), "
+          f"bytes written: {metrics['bytes_written']}, bytes served: {details['bytes_served']}")
+    if details["contexts"]:
+        pool = details["pool"]
+        print(f"  {details['contexts']} contexts per Chrome: {pool['avg_context_js_heap_mb']} MB JS heap and "
+              f"{pool['avg_context_dom_nodes']} DOM nodes per context, ~{pool['avg_rss_per_context_mb']} MB RSS "
+              f"per context, {pool['session_wait_seconds']}s waiting for the shared session")
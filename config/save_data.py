@@ -1,190 +1,297 @@
-import json
-import os
-import traceback
+import logging
+import sys
+import threading
 from selenium.webdriver.common.by import By
-
 from selenium.common.exceptions import NoSuchElementException
 from config.selectors import KiwiSelectors
+from core.jsonl_store import JsonlFlightStore
+from core.records import DETAIL_ATTRIBUTES, SEATING_ATTRIBUTES, FlightDetails, Itinerary, Leg, SeatingInfo, Stop
+from core.telemetry import traced
+
+
+logger = logging.getLogger(__name__)
 
 
+# Directory of the append-only JSONL store that receives every scraped itinerary
+DEFAULT_STORE_DIR = "json_data/flight_segments"
 
+_stores = {}
+_stores_lock = threading.Lock()
 
 
+def get_flight_store(directory=DEFAULT_STORE_DIR):
+    """Return the shared JsonlFlightStore for a directory, creating it on first use."""
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = JsonlFlightStore(directory)
+        return _stores[directory]
 
-import json
-import os
-import traceback
 
-def save_flight_data(flight_data, output_file="json_data/flight_results.json"):
+def close_flight_stores():
+    """Flush and close every shared store (call once when scraping ends)."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+
+
+@traced()
+def save_flight_data(flight_data, store=None):
     """
-    Saves structured flight data into a JSON file immediately after extraction.
-    Ensures that all flights are appended to the existing JSON file in real-time.
+    Saves structured flight data immediately after extraction.
+    Each itinerary is appended as one line to the JSONL store, so saving costs O(1) regardless of
+    how many flights are already stored. Run `python -m core.jsonl_store export` to produce the
+    legacy json_data/flight_results.json file.
+
+    :param flight_data: Itinerary from structure_flight_data() (or its dict record).
+    :param store: Store to append to (default: the shared store in DEFAULT_STORE_DIR).
     """
     try:
-        # ✅ Ensure the directory exists before writing the file
-        output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-
         # ✅ Validate flight_data before saving
-        if not flight_data or not isinstance(flight_data, dict) or "flights" not in flight_data:
-            print("[ERROR] Invalid flight data format. Not saving empty or incorrect data.")
+        if not flight_data or not isinstance(flight_data, (Itinerary, dict)) or "flights" not in flight_data:
+            logger.error("Invalid flight data format. Not saving empty or incorrect data.")
             return
 
-        # ✅ Check if the JSON file exists and has valid data
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            try:
-                with open(output_file, "r", encoding="utf-8") as file:
-                    existing_data = json.load(file)
-            except json.JSONDecodeError:
-                print("[WARNING] Corrupted JSON file. Resetting data.")
-                existing_data = {"flights": []}
+        store = store or get_flight_store()
+        store.append(flight_data)
+
+        logger.info(f"Flight data saved to {store.directory}")
+
+    except Exception:
+        logger.exception("Failed to save flight data")
+
+
+# Fields from FLIGHT_INFO_TEMPLATE that are grouped under "seating_info"
+SEATING_INFO_KEYS = ["Seat Pitch", "Seat Width", "Seat Recline", "Audio & Video on Demand",
+                     "In-Seat Power", "Wi-Fi on Board"]
+
+
+# Evaluates every KiwiSelectors XPath inside the browser and returns the raw values in one round trip.
+# A value of null means the element was not found (the equivalent of NoSuchElementException).
+ITINERARY_EXTRACTION_SCRIPT = """
+const [parentXPath, departureRootXPath, arrivalRootXPath, totalDurationXPath,
+       infoBoxesXPath, infoTemplate, timeSelectors] = arguments;
+
+function first(xpath, context) {
+    return document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+
+function all(xpath, context) {
+    const snapshot = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < snapshot.snapshotLength; i++) {
+        nodes.push(snapshot.snapshotItem(i));
+    }
+    return nodes;
+}
+
+function text(xpath, context) {
+    const node = first(xpath, context);
+    return node === null ? null : (node.innerText || node.textContent || "").trim();
+}
+
+function required(xpath, context) {
+    const value = text(xpath, context);
+    if (value === null) {
+        throw new Error("no such element: Unable to locate element: " + xpath);
+    }
+    return value;
+}
+
+const parents = all(parentXPath, document);
+const result = {parent_count: parents.length, parents: []};
+
+for (const parent of parents.slice(0, 2)) {
+    try {
+        const departureRoot = required(departureRootXPath, parent);
+        const arrivalRoot = required(arrivalRootXPath, parent);
+        const totalDuration = text(totalDurationXPath, parent);
+        const boxes = all(infoBoxesXPath, parent).map(box => {
+            const info = {};
+            for (const [key, xpath] of Object.entries(infoTemplate)) {
+                info[key] = text(xpath, box);
+            }
+            const times = {};
+            for (const [key, xpath] of Object.entries(timeSelectors)) {
+                times[key] = text(xpath, box);
+            }
+            return {info: info, times: times};
+        });
+        result.parents.push({
+            departure_root: departureRoot,
+            arrival_root: arrivalRoot,
+            total_duration: totalDuration,
+            boxes: boxes
+        });
+    } catch (e) {
+        result.parents.push({error: String(e.message || e)});
+    }
+}
+
+return result;
+"""
+
+
+def _field_name(key):
+    """Convert a selector label (e.g. "Seat Pitch") into its JSON field name."""
+    return key.lower().replace(" ", "_")
+
+
+def _build_flight_details(info):
+    """Build the FlightDetails of a single info box from its raw extracted values."""
+    details, seating = {}, {}
+    for key in KiwiSelectors.FLIGHT_INFO_TEMPLATE:
+        extracted_value = info.get(key)
+        field = _field_name(key)
+        if key in SEATING_INFO_KEYS:
+            # A missing row (None) is stored as "N/A" next to seating_info, an empty one as "N/A" inside it
+            seating[SEATING_ATTRIBUTES[field]] = None if extracted_value is None else (extracted_value or "N/A")
         else:
-            existing_data = {"flights": []}
+            details[DETAIL_ATTRIBUTES[field]] = extracted_value if extracted_value else "N/A"
+    return FlightDetails(seating_info=SeatingInfo(**seating), **details)
 
-        # ✅ Append new flight data immediately after extraction
-        existing_data["flights"].append(flight_data)
 
-        # ✅ Save JSON data **IMMEDIATELY AFTER EACH SCRAPE**
-        with open(output_file, "w", encoding="utf-8") as file:
-            json.dump(existing_data, file, indent=4)
+def build_flight_data(raw_parents, parent_count, verbose=True):
+    """
+    Assemble raw extracted values into the structured flight data record.
 
-        print(f"[SUCCESS] Flight data saved to {output_file}")
+    Every extraction mode (live WebElements, in-browser script, offline HTML) produces the same
+    raw shape, so they all share this function and yield identical output.
 
-    except Exception as e:
-        print(f"[ERROR] Failed to save flight data: {traceback.format_exc()}")
+    :param raw_parents: List of dicts with "departure_root", "arrival_root", "total_duration" and
+                        "boxes" (each box holding "info" and "times" values, None when missing),
+                        or {"error": message} when the parent could not be read.
+    :param parent_count: Number of FLIGHT_DETAILS_PARENT elements found on the page.
+    :param verbose: Log the structured data after assembling it.
+    :return: Itinerary (its to_dict() is the stored JSON record).
+    """
+    flight_data = Itinerary("round trip" if parent_count > 1 else "one way")
+
+    for parent_idx, raw_parent in enumerate(raw_parents[:2], start=1):  # Process only departure & return
+        if "error" in raw_parent:
+            logger.error(f"Could not extract flight details for parent {parent_idx}: {raw_parent['error']}")
+            continue
+
+        flight_label = "departure" if parent_idx == 1 else "return"
+        total_duration = raw_parent["total_duration"]
+        if total_duration is None:
+            total_duration = "Not Available"
+
+        boxes = raw_parent["boxes"]
+        leg = Leg(flight_label, raw_parent["departure_root"], raw_parent["arrival_root"], total_duration,
+                  is_direct=len(boxes) == 1)
+
+        # ✅ If only one info_box, it's a direct flight (stops = 0)
+        if leg.is_direct:
+            leg.flight_details = _build_flight_details(boxes[0]["info"])
+
+            # ✅ Departure & Arrival Times
+            for key in KiwiSelectors.TIME_SELECTORS:
+                extracted_value = boxes[0]["times"].get(key)
+                if extracted_value is None:
+                    continue
+                if "Departure Time" in key:
+                    leg.departure_time = sys.intern(extracted_value)
+                elif "Arrival Time" in key:
+                    leg.arrival_time = sys.intern(extracted_value)
 
+        else:
+            # ✅ Multi-stop flights
+            for box_idx, box in enumerate(boxes, start=1):
+                times = {}
+                for key in KiwiSelectors.TIME_SELECTORS:
+                    extracted_value = box["times"].get(key)
+                    side = "departure" if "Departure" in key else "arrival"
+                    times[f"{side}_{key.split(' ')[-1].lower()}"] = \
+                        extracted_value if extracted_value is not None else "Not Available"
 
+                leg.stops.append(Stop(box_idx, flight_details=_build_flight_details(box["info"]), **times))
 
-from selenium.common.exceptions import NoSuchElementException
-from config.selectors import KiwiSelectors
+        flight_data.flights.append(leg)
 
-from selenium.common.exceptions import NoSuchElementException
-from config.selectors import KiwiSelectors
-from selenium.webdriver.common.by import By
-import json
+    # ✅ Log structured flight data after extraction
+    if verbose and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(flight_data.to_json(indent=4))
+
+    return flight_data
 
+
+def _optional_text(element, xpath, attribute=None):
+    """Return the stripped text of a child element, or None if it does not exist."""
+    try:
+        child = element.find_element(By.XPATH, xpath)
+    except NoSuchElementException:
+        return None
+    if attribute:
+        return child.get_attribute(attribute).strip()
+    return child.text.strip()
+
+
+def _read_parent(parent):
+    """Read the raw values of one departure/return parent element through WebElement calls."""
+    departure_root = parent.find_element(By.XPATH, KiwiSelectors.DEPARTURE_ROOT).text.strip()
+    arrival_root = parent.find_element(By.XPATH, KiwiSelectors.ARRIVAL_ROOT).text.strip()
+    total_duration = _optional_text(parent, KiwiSelectors.TOTAL_DURATION)
+
+    boxes = []
+    for box in parent.find_elements(By.XPATH, KiwiSelectors.INFO_BOXES):
+        boxes.append({
+            "info": {key: _optional_text(box, xpath, attribute="innerText")
+                     for key, xpath in KiwiSelectors.FLIGHT_INFO_TEMPLATE.items()},
+            "times": {key: _optional_text(box, xpath)
+                      for key, xpath in KiwiSelectors.TIME_SELECTORS.items()},
+        })
+
+    return {
+        "departure_root": departure_root,
+        "arrival_root": arrival_root,
+        "total_duration": total_duration,
+        "boxes": boxes,
+    }
+
+
+@traced()
 def structure_flight_data(parents):
     """
     Organizes extracted flight data into a structured JSON format,
     ensuring stops are correctly assigned to departure and return flights.
     If a flight has only one box, it is marked as a direct flight (stops = 0)
     and retains all extracted flight details.
-    """
-    flight_data = {
-        "flight_type": "round trip" if len(parents) > 1 else "one way",
-        "flights": []
-    }
 
-    for parent_idx, parent in enumerate(parents[:2], start=1):  # Process only departure & return
+    This reads every field through a separate WebDriver command; see
+    structure_flight_data_in_browser() for the single round-trip variant.
+    """
+    raw_parents = []
+    for parent in parents[:2]:
         try:
-            flight_label = "departure" if parent_idx == 1 else "return"
-
-            departure_root = parent.find_element(By.XPATH, KiwiSelectors.DEPARTURE_ROOT).text.strip()
-            arrival_root = parent.find_element(By.XPATH, KiwiSelectors.ARRIVAL_ROOT).text.strip()
-
-            try:
-                total_duration = parent.find_element(By.XPATH, KiwiSelectors.TOTAL_DURATION).text.strip()
-            except NoSuchElementException:
-                total_duration = "Not Available"
-
-            # ✅ Fetch stops within this specific flight (departure or return)
-            info_boxes = parent.find_elements(By.XPATH, ".//div[@class='pt-300' and @role='button' and @tabindex='0']")
-            num_stops = len(info_boxes)
-
-            # ✅ If only one info_box, it's a direct flight (stops = 0)
-            if num_stops == 1:
-                direct_flight_details = {
-                    "flight_label": flight_label,
-                    "departure_root": departure_root,
-                    "arrival_root": arrival_root,
-                    "total_duration": total_duration,
-                    "stops": [],  # No stops
-                    "num_stops": 0,
-                    "is_direct": True,
-                    "flight_details": {
-                        "seating_info": {}
-                    }
-                }
-
-                # ✅ Extract Flight-Specific Details (Airline, Flight Number, Seating, etc.)
-                for key, xpath in KiwiSelectors.FLIGHT_INFO_TEMPLATE.items():
-                    try:
-                        extracted_value = info_boxes[0].find_element(By.XPATH, xpath).get_attribute("innerText").strip()
-                        if key in ["Seat Pitch", "Seat Width", "Seat Recline", "Audio & Video on Demand",
-                                   "In-Seat Power", "Wi-Fi on Board"]:
-                            direct_flight_details["flight_details"]["seating_info"][key.lower().replace(" ", "_")] = extracted_value if extracted_value else "N/A"
-                        else:
-                            direct_flight_details["flight_details"][key.lower().replace(" ", "_")] = extracted_value if extracted_value else "N/A"
-                    except NoSuchElementException:
-                        direct_flight_details["flight_details"][key.lower().replace(" ", "_")] = "N/A"
-
-                # ✅ Extract Departure & Arrival Times
-                for key, xpath in KiwiSelectors.TIME_SELECTORS.items():
-                    try:
-                        extracted_value = info_boxes[0].find_element(By.XPATH, xpath).text.strip()
-                        if "Departure Time" in key:
-                            direct_flight_details["departure_time"] = extracted_value
-                        elif "Arrival Time" in key:
-                            direct_flight_details["arrival_time"] = extracted_value
-                    except NoSuchElementException:
-                        pass
-
-                flight_data["flights"].append(direct_flight_details)
-
-            else:
-                # ✅ Process multi-stop flights
-                stops = []
-                for box_idx, box in enumerate(info_boxes, start=1):
-                    stop_data = {
-                        "stop_number": box_idx,
-                        "departure": {},
-                        "arrival": {},
-                        "flight_details": {
-                            "seating_info": {}
-                        }
-                    }
-
-                    # ✅ Extract Flight-Specific Details
-                    for key, xpath in KiwiSelectors.FLIGHT_INFO_TEMPLATE.items():
-                        try:
-                            extracted_value = box.find_element(By.XPATH, xpath).get_attribute("innerText").strip()
-                            if key in ["Seat Pitch", "Seat Width", "Seat Recline", "Audio & Video on Demand",
-                                       "In-Seat Power", "Wi-Fi on Board"]:
-                                stop_data["flight_details"]["seating_info"][key.lower().replace(" ", "_")] = extracted_value if extracted_value else "N/A"
-                            else:
-                                stop_data["flight_details"][key.lower().replace(" ", "_")] = extracted_value if extracted_value else "N/A"
-                        except NoSuchElementException:
-                            stop_data["flight_details"][key.lower().replace(" ", "_")] = "N/A"
-
-                    # ✅ Extract Departure & Arrival Times
-                    for key, xpath in KiwiSelectors.TIME_SELECTORS.items():
-                        try:
-                            extracted_value = box.find_element(By.XPATH, xpath).text.strip()
-                            if "Departure" in key:
-                                stop_data["departure"][key.split(" ")[-1].lower()] = extracted_value
-                            elif "Arrival" in key:
-                                stop_data["arrival"][key.split(" ")[-1].lower()] = extracted_value
-                        except NoSuchElementException:
-                            stop_data["departure" if "Departure" in key else "arrival"][
-                                key.split(" ")[-1].lower()] = "Not Available"
-
-                    stops.append(stop_data)
-
-                flight_data["flights"].append({
-                    "flight_label": flight_label,
-                    "departure_root": departure_root,
-                    "arrival_root": arrival_root,
-                    "total_duration": total_duration,
-                    "stops": stops,
-                    "num_stops": num_stops,
-                    "is_direct": False
-                })
-
+            raw_parents.append(_read_parent(parent))
         except Exception as e:
-            print(f"[ERROR] Could not extract flight details for parent {parent_idx}: {e}")
+            raw_parents.append({"error": str(e)})
 
-    # ✅ Print structured flight data after extraction
-    print(json.dumps(flight_data, indent=4))
+    return build_flight_data(raw_parents, len(parents))
 
-    return flight_data
+
+@traced("structure_flight_data")
+def structure_flight_data_in_browser(driver):
+    """
+    Extract and structure the flight details of the current page with a single execute_script call.
+    The output is identical to structure_flight_data().
+
+    :param driver: Selenium WebDriver showing a flight detail page.
+    :return: Itinerary, or None if no flight details are present.
+    """
+    raw = driver.execute_script(
+        ITINERARY_EXTRACTION_SCRIPT,
+        KiwiSelectors.FLIGHT_DETAILS_PARENT,
+        KiwiSelectors.DEPARTURE_ROOT,
+        KiwiSelectors.ARRIVAL_ROOT,
+        KiwiSelectors.TOTAL_DURATION,
+        KiwiSelectors.INFO_BOXES,
+        KiwiSelectors.FLIGHT_INFO_TEMPLATE,
+        KiwiSelectors.TIME_SELECTORS,
+    )
+
+    if not raw or not raw["parent_count"]:
+        return None
+
+    return build_flight_data(raw["parents"], raw["parent_count"])
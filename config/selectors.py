@@ -11,6 +11,14 @@ class KiwiSelectors:
     # Website URL
     BASE_URL = "https://www.kiwi.com/"
 
+    # Direct navigation to search results (location slugs + YYYY-MM-DD dates, "no-return" for one way)
+    SEARCH_RESULTS_URL = BASE_URL + "en/search/results/{departure}/{destination}/{departure_date}/{return_date}"
+    LOCATIONS_API_URL = "https://api.skypicker.com/locations"
+
+    # Background API responses that carry the search results (matched against response URLs)
+    SEARCH_API_PATTERN = r"/umbrella/v2/graphql\?featureName=Search\w*ItinerariesQuery"
+    SEARCH_API_URL = "https://api.skypicker.com/umbrella/v2/graphql?featureName={feature}"
+
     # Popup & Modal Selectors
     COOKIE_ACCEPT_BTN = "/html/body/div[2]/div[2]/div[1]/section/div/div/div/section/div[2]/button[3]/div"  # Accept cookies
     GOOGLE_SIGNIN_IFRAME = "//iframe[contains(@src, 'accounts.google.com')]"  # Google Sign-in iframe
@@ -31,6 +39,8 @@ class KiwiSelectors:
     DATE_PICKER_NEXT_BTN = "button[data-test='CalendarMoveNextButton']"
     DATE_PICKER_MONTH_BUTTONS = "button[data-test='DatepickerMonthButton']"
     CALENDAR_DAY_SELECTOR = "div[data-test='CalendarDay'][data-value='{}']"
+    CALENDAR_DAYS = "div[data-test='CalendarDay']"
+    CALENDAR_DAY_PRICE = "[data-test='NewDatepickerPrice']"  # Price shown under a day (inside CALENDAR_DAYS)
     SET_DATES_BUTTON = "//div[contains(text(), 'Set dates')]"
 
     # Flight Search Results Selectors
@@ -45,6 +55,7 @@ class KiwiSelectors:
 
     # Clicking all Boxes
     BOX_ELEMENTS = "//div[@class='pt-300' and @role='button' and @tabindex='0']"
+    INFO_BOXES = ".//div[@class='pt-300' and @role='button' and @tabindex='0']"  # Boxes within one flight parent
 
     # Flight Information Selectors
     FLIGHT_DETAILS_PARENT = "//div[@class='space-y-300 not-last:mb-200']"
@@ -0,0 +1,219 @@
+# core/background_writer.py
+
+"""
+This module provides a single background writer thread for scraped flights.
+Scraper threads hand records off through a bounded queue; the writer groups them into batches
+(by count or time interval) and appends each batch to the store with one write.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from core.telemetry import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+
+class _MarkedQueue(queue.Queue):
+    """FIFO queue counting puts and finished items, so a flush can wait for the items queued before it only."""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.put_count = 0
+        self.done_count = 0
+
+    def _put(self, item):
+        # Runs under the queue mutex, so put_count follows the order items are queued in
+        super()._put(item)
+        self.put_count += 1
+
+    def task_done(self):
+        with self.all_tasks_done:
+            self.done_count += 1
+            self.all_tasks_done.notify_all()
+        super().task_done()
+
+    def join_queued(self):
+        """Block until every item queued before this call is done; later items are not waited for."""
+        with self.all_tasks_done:
+            mark = self.put_count
+            while self.done_count < mark:
+                self.all_tasks_done.wait()
+
+
+class BackgroundFlightWriter:
+    """Batches records from many scraper threads into a store from one dedicated thread."""
+
+    FSYNC_POLICIES = ("batch", "periodic", "none")
+
+    # Marker put on the queue to stop the writer thread
+    _STOP = object()
+
+    def __init__(self, store, max_queue_size=1000, batch_size=50, flush_interval=1.0,
+                 fsync_policy="periodic", fsync_interval=5.0, on_written=None):
+        """
+        Initialize the writer (call start() or use it as a context manager).
+
+        :param store: Store exposing append_many(records, fsync=...) and sync().
+        :param max_queue_size: Bound of the hand-off queue; producers block only when it is full.
+        :param batch_size: Write a batch as soon as this many records are waiting.
+        :param flush_interval: Write a partial batch after this many seconds.
+        :param fsync_policy: "batch" (fsync every batch), "periodic" (every fsync_interval) or "none".
+        :param fsync_interval: Seconds between fsyncs for the "periodic" policy.
+        :param on_written: Callable receiving each batch after it was stored (e.g. JobJournal.written).
+        """
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.on_written = on_written
+        self._queue = _MarkedQueue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="flight-writer", daemon=True)
+        self._metrics_lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+        self._closed = False
+
+        # Backpressure metrics
+        self.records_submitted = 0
+        self.records_written = 0
+        self.records_failed = 0
+        self.batches_written = 0
+        self.max_queue_depth = 0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self.total_batch_latency = 0.0
+        self.max_batch_latency = 0.0
+
+    def start(self):
+        """Start the writer thread."""
+        self._thread.start()
+        return self
+
+    def submit(self, record):
+        """
+        Hand a record to the writer. Returns immediately unless the queue is full,
+        in which case the caller waits for room (and the wait is counted as backpressure).
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundFlightWriter is closed")
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            blocked_at = time.monotonic()
+            self._queue.put(record)
+            with self._metrics_lock:
+                self.blocked_submits += 1
+                self.blocked_seconds += time.monotonic() - blocked_at
+
+        with self._metrics_lock:
+            self.records_submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def _write_batch(self, batch):
+        """Append one batch to the store and apply the fsync policy."""
+        started = time.monotonic()
+        try:
+            self.store.append_many(batch, fsync=self.fsync_policy == "batch")
+            if self.fsync_policy == "periodic" and started - self._last_fsync >= self.fsync_interval:
+                self.store.sync()
+                self._last_fsync = started
+            written, failed = len(batch), 0
+        except Exception:
+            logger.exception(f"Failed to write {len(batch)} flights")
+            written, failed = 0, len(batch)
+
+        latency = time.monotonic() - started
+        with self._metrics_lock:
+            self.records_written += written
+            self.records_failed += failed
+            self.batches_written += 1
+            self.total_batch_latency += latency
+            self.max_batch_latency = max(self.max_batch_latency, latency)
+        REGISTRY.observe("flightscraper_store_write_seconds", {}, latency)
+        REGISTRY.inc("flightscraper_records_written_total", {}, written)
+        if failed:
+            REGISTRY.inc("flightscraper_records_failed_total", {}, failed)
+
+        if written and self.on_written:
+            try:
+                self.on_written(batch)
+            except Exception:
+                logger.exception("on_written callback failed")
+
+    def _run(self):
+        """Writer loop: collect records until the batch is full or the interval elapses."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+
+            if batch and (stopping or item is None or len(batch) >= self.batch_size):
+                self._write_batch(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                batch = []
+            if item is None or not batch:
+                deadline = time.monotonic() + self.flush_interval
+
+            if item is self._STOP:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Block until every record submitted so far has been written. Records submitted while waiting
+        (e.g. by other routes) are not waited for, so a busy writer cannot keep a flush waiting.
+        """
+        self._queue.join_queued()
+
+    def close(self):
+        """Write everything still queued, fsync (unless the policy is "none") and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self.fsync_policy != "none":
+            self.store.sync()
+        logger.info(f"Flight writer stopped: {self.metrics()}")
+
+    def metrics(self):
+        """Return a snapshot of the writer's throughput and backpressure metrics."""
+        with self._metrics_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "records_submitted": self.records_submitted,
+                "records_written": self.records_written,
+                "records_failed": self.records_failed,
+                "batches_written": self.batches_written,
+                "blocked_submits": self.blocked_submits,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+                "avg_batch_latency": round(self.total_batch_latency / self.batches_written, 6)
+                if self.batches_written else 0.0,
+                "max_batch_latency": round(self.max_batch_latency, 6),
+            }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
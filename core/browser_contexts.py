@@ -0,0 +1,575 @@
+# core/browser_contexts.py
+
+"""
+This module runs many routes in one Chrome process.
+
+A MultiplexedBrowser owns one WebDriver session and opens one tab per route, each in its own
+isolated browser context (own cookies, storage and cache, via CDP Target.createBrowserContext).
+Every route gets a tab driver: a copy of the session's WebDriver whose commands first switch the
+session to the route's tab, so an unchanged KiwiFlightScraper flow runs in it.
+
+A WebDriver session executes one command at a time, so routes take turns command by command
+(SessionScheduler hands the session out in arrival order). A route only holds the session while a
+command runs: while it sleeps between WebDriverWait polls, waits for a page to load (the pool uses
+the "none" page load strategy) or waits for an async script (run as a polled script, see
+ASYNC_SCRIPT_PREFIX), the other tabs' commands run.
+
+ContextPool hands out tab drivers with the DriverPool interface (acquire/release/close), with a cap
+on contexts per Chrome process, and records the JS heap and DOM size of every context it closes.
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from selenium.common.exceptions import NoSuchWindowException, TimeoutException, WebDriverException
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.switch_to import SwitchTo
+
+from core.browser_manager import BrowserManager, PerformanceProfile
+
+
+logger = logging.getLogger(__name__)
+
+# execute_async_script would hold the session until the script calls back; instead the script is
+# started with execute_script and leaves its result in a window property that is polled
+ASYNC_SCRIPT_PREFIX = """
+const __key = arguments[arguments.length - 1];
+const __args = Array.prototype.slice.call(arguments, 0, -1);
+window[__key] = {done: false};
+__args.push(function (value) { window[__key] = {done: true, value: value}; });
+(function () {
+"""
+ASYNC_SCRIPT_SUFFIX = """
+}).apply(null, __args);
+"""
+ASYNC_RESULT_SCRIPT = """
+const key = arguments[0];
+if (!(key in window)) return {done: true, lost: true};  // The page navigated away
+const result = window[key];
+if (!result.done) return null;
+delete window[key];
+return result;
+"""
+
+MEMORY_SCRIPT = """
+const memory = performance.memory || {};
+return {JSHeapUsedSize: memory.usedJSHeapSize || 0, Nodes: document.getElementsByTagName('*').length,
+        Documents: 1 + window.frames.length};
+"""
+
+
+def _children_by_parent():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as file:
+                # The command name may contain spaces; the fields after ")" start with state, ppid
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    return children
+
+
+def process_tree_rss(root_pids):
+    """Resident memory in bytes of the given processes and all their descendants (Linux /proc)."""
+    if not os.path.isdir("/proc"):
+        return 0
+    children = _children_by_parent()
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    seen, stack, total = set(), list(root_pids), 0
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm", "r") as file:
+                total += int(file.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class SessionScheduler:
+    """Hands the shared WebDriver session to the tabs in the order their commands arrive."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._busy = False
+        self.turns = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def turn(self):
+        """Hold the session for one command (or one switch-and-command sequence)."""
+        started = time.perf_counter()
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            while self._busy or self._waiting[0] is not ticket:
+                self._condition.wait()
+            self._waiting.popleft()
+            self._busy = True
+            self.turns += 1
+            self.wait_seconds += time.perf_counter() - started
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+class Tab:
+    """One route's tab: its browser context and the window handles it owns (popups included)."""
+
+    def __init__(self, browser, handle, context_id=None):
+        self.browser = browser
+        self.context_id = context_id
+        self.current = handle
+        self.handles = {handle}
+        self.opened = time.perf_counter()
+
+
+class MultiplexedBrowser:
+    """One Chrome process and WebDriver session shared by many tabs."""
+
+    def __init__(self, browser_manager, max_contexts=6, async_poll_interval=0.05, async_timeout=60):
+        """
+        :param browser_manager: BrowserManager used to start Chrome.
+        :param max_contexts: Maximum number of tabs (contexts) open at the same time.
+        :param async_poll_interval: Seconds between polls of an async script's result.
+        :param async_timeout: Seconds after which a polled async script counts as timed out.
+        """
+        self.driver = browser_manager.create_driver()
+        self.max_contexts = max_contexts
+        self.async_poll_interval = async_poll_interval
+        self.async_timeout = async_timeout
+        self.scheduler = SessionScheduler()
+        self.tabs = []
+        self.isolated = True
+        self.contexts_opened = 0
+        # The first tab stays on about:blank: the session ends when its last window closes, and
+        # contexts are created from it so they never depend on a route's tab
+        self.blank_handle = self.driver.current_window_handle
+        self._current = self.blank_handle
+
+    def _raw(self, driver, driver_command, params=None):
+        """Send a command without tab switching (the class implementation, not a patched execute)."""
+        return type(self.driver).execute(driver, driver_command, params)
+
+    def _cdp(self, cmd, params=None):
+        return self._raw(self.driver, "executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
+
+    def _switch(self, handle):
+        """Point the session at a window; call while holding the session."""
+        if self._current != handle:
+            self._current = None  # Unknown until the switch succeeded
+            self._raw(self.driver, Command.SWITCH_TO_WINDOW, {"handle": handle})
+            self._current = handle
+
+    def _run(self, tab, driver, driver_command, params=None):
+        """Run one command in a tab."""
+        with self.scheduler.turn():
+            self._switch(tab.current)
+            return self._raw(driver, driver_command, params)
+
+    def _target_contexts(self):
+        """Map target ids (chromedriver window handles) to their browser context ids."""
+        try:
+            return {target["targetId"]: target.get("browserContextId")
+                    for target in self._cdp("Target.getTargets")["targetInfos"]}
+        except (WebDriverException, KeyError):
+            return {}
+
+    def handles_of(self, tab):
+        """
+        Window handles belonging to a tab, claiming windows it opened since the last call.
+        With isolated contexts a new window belongs to the tab of its context; with shared tabs it
+        belongs to the first tab asking for its handles.
+        """
+        with self.scheduler.turn():
+            handles = self._raw(self.driver, Command.W3C_GET_WINDOW_HANDLES)["value"]
+            contexts = self._target_contexts() if self.isolated else {}
+            owned = set().union(*(other.handles for other in self.tabs))
+            for handle in handles:
+                if handle not in owned and handle != self.blank_handle \
+                        and contexts.get(handle, tab.context_id) == tab.context_id:
+                    tab.handles.add(handle)
+            tab.handles &= set(handles)
+        return [handle for handle in handles if handle in tab.handles]
+
+    def _execute(self, tab, driver, driver_command, params=None):
+        """execute() of a tab driver: window commands are answered per tab, everything else runs in the tab."""
+        if driver_command == Command.QUIT:
+            self.close_context(tab)
+            return {"value": None}
+        if driver_command == Command.W3C_GET_CURRENT_WINDOW_HANDLE:
+            return {"value": tab.current}
+        if driver_command == Command.W3C_GET_WINDOW_HANDLES:
+            return {"value": self.handles_of(tab)}
+        if driver_command == Command.SWITCH_TO_WINDOW:
+            handle = (params or {}).get("handle")
+            if handle not in tab.handles and handle not in self.handles_of(tab):
+                raise NoSuchWindowException(f"Window {handle} does not belong to this tab")
+            tab.current = handle  # The session follows on the tab's next command
+            return {"value": None}
+        if driver_command == Command.W3C_EXECUTE_SCRIPT_ASYNC:
+            return self._execute_async(tab, driver, params)
+
+        response = self._run(tab, driver, driver_command, params)
+        if driver_command == Command.CLOSE:
+            tab.handles.discard(tab.current)
+            self._current = None
+            response["value"] = [handle for handle in response.get("value") or [] if handle in tab.handles]
+        return response
+
+    def _execute_async(self, tab, driver, params):
+        """Run an async script as a polled one, releasing the session between polls."""
+        key = f"__flightscraper_async_{uuid.uuid4().hex}"
+        script = ASYNC_SCRIPT_PREFIX + params["script"] + ASYNC_SCRIPT_SUFFIX
+        self._run(tab, driver, Command.W3C_EXECUTE_SCRIPT, {"script": script, "args": list(params.get("args", [])) + [key]})
+        deadline = time.monotonic() + self.async_timeout
+        while True:
+            time.sleep(self.async_poll_interval)  # ✅ Other tabs run their commands meanwhile
+            result = self._run(tab, driver, Command.W3C_EXECUTE_SCRIPT,
+                               {"script": ASYNC_RESULT_SCRIPT, "args": [key]})["value"]
+            if result is not None:
+                return {"value": result.get("value")}
+            if time.monotonic() > deadline:
+                raise TimeoutException(f"Async script did not call back within {self.async_timeout}s")
+
+    def _tab_driver(self, tab):
+        """A copy of the session's WebDriver bound to one tab (elements it finds are bound to it too)."""
+        driver = copy.copy(self.driver)
+        driver.tab = tab
+        driver._switch_to = SwitchTo(driver)
+        driver.execute = lambda driver_command, params=None: self._execute(tab, driver, driver_command, params)
+        driver.command_profiler = None
+        return driver
+
+    def has_room(self):
+        return len(self.tabs) < self.max_contexts
+
+    def open_context(self):
+        """
+        Open a tab in a new isolated browser context (or a plain tab if Chrome refuses) and return its driver.
+        """
+        with self.scheduler.turn():
+            if not self.has_room():
+                raise RuntimeError(f"Browser already hosts {self.max_contexts} contexts")
+            self._switch(self.blank_handle)
+            context_id = handle = None
+            if self.isolated:
+                try:
+                    context_id = self._cdp("Target.createBrowserContext")["browserContextId"]
+                    handle = self._cdp("Target.createTarget",
+                                       {"url": "about:blank", "browserContextId": context_id})["targetId"]
+                    if handle not in self._raw(self.driver, Command.W3C_GET_WINDOW_HANDLES)["value"]:
+                        raise WebDriverException("chromedriver does not list the new target")
+                except (WebDriverException, KeyError) as e:
+                    logger.warning(f"Isolated browser contexts unavailable ({e}); routes share cookies across tabs.")
+                    self.isolated = False
+                    self._dispose(handle, context_id)
+                    context_id = handle = None
+            if handle is None:
+                handle = self._raw(self.driver, Command.NEW_WINDOW, {"type": "tab"})["value"]["handle"]
+            tab = Tab(self, handle, context_id)
+            self.tabs.append(tab)
+            self.contexts_opened += 1
+
+        driver = self._tab_driver(tab)
+        profile = getattr(self.driver, "performance_profile", None)
+        if profile:
+            profile.apply(driver)  # CDP settings are per tab
+        return driver
+
+    def _dispose(self, handle, context_id):
+        """Close a target and dispose its context, ignoring errors; call while holding the session."""
+        if handle:
+            try:
+                self._cdp("Target.closeTarget", {"targetId": handle})
+            except WebDriverException:
+                pass
+        if context_id:
+            try:
+                self._cdp("Target.disposeBrowserContext", {"browserContextId": context_id})
+            except WebDriverException:
+                pass
+
+    def measure(self, driver):
+        """
+        Memory of one context's current page: JS heap in use, DOM nodes and documents (frames included).
+        """
+        try:
+            driver.execute_cdp_cmd("Performance.enable", {})
+            metrics = {metric["name"]: metric["value"]
+                       for metric in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+        except (WebDriverException, KeyError):
+            try:
+                metrics = driver.execute_script(MEMORY_SCRIPT) or {}
+            except WebDriverException:
+                metrics = {}
+        return {
+            "js_heap_mb": round(metrics.get("JSHeapUsedSize", 0) / 2 ** 20, 2),
+            "dom_nodes": int(metrics.get("Nodes", 0)),
+            "documents": int(metrics.get("Documents", 0)),
+        }
+
+    def close_context(self, tab):
+        """Close every window of a tab and dispose its browser context."""
+        with self.scheduler.turn():
+            if tab not in self.tabs:
+                return
+            self.tabs.remove(tab)
+            for handle in list(tab.handles):
+                try:
+                    self._switch(handle)
+                    self._raw(self.driver, Command.CLOSE)
+                except WebDriverException:
+                    pass
+                self._current = None
+            try:
+                self._switch(self.blank_handle)
+            except WebDriverException:
+                pass
+            self._dispose(None, tab.context_id)
+
+    def rss(self):
+        """Resident memory of chromedriver and every Chrome process of this browser, in bytes."""
+        process = getattr(getattr(self.driver, "service", None), "process", None)
+        return process_tree_rss([process.pid]) if process is not None else 0
+
+    def is_healthy(self):
+        try:
+            with self.scheduler.turn():
+                self._switch(self.blank_handle)
+                return self._raw(self.driver, Command.W3C_EXECUTE_SCRIPT, {"script": "return 1;", "args": []})["value"] == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        BrowserManager.close_driver(self.driver)
+
+
+class ContextPool:
+    """DriverPool-compatible pool handing out one tab (isolated context) of a shared Chrome per route."""
+
+    # Tabs in the background must keep their timers and rendering running at full speed
+    CHROME_ARGUMENTS = ["--disable-background-timer-throttling", "--disable-backgrounding-occluded-windows",
+                        "--disable-renderer-backgrounding"]
+
+    def __init__(self, browser_manager=None, max_contexts=6, browsers=1, max_rss_mb=None,
+                 max_contexts_per_browser=200):
+        """
+        Browsers are started lazily, up to `browsers` at a time.
+
+        :param browser_manager: BrowserManager used to start Chrome (default: headless, "none" page load
+            strategy so navigations return immediately and the flows' own waits take over).
+            CHROME_ARGUMENTS are added to its arguments.
+        :param max_contexts: Maximum number of contexts (routes) per Chrome process.
+        :param browsers: Maximum number of Chrome processes.
+        :param max_rss_mb: Open no new context in a browser whose processes use more memory than this.
+        :param max_contexts_per_browser: Restart a browser once it has hosted this many contexts.
+        """
+        self.browser_manager = browser_manager or BrowserManager(
+            headless=True, profile=PerformanceProfile(page_load_strategy="none"))
+        for argument in self.CHROME_ARGUMENTS:
+            if argument not in self.browser_manager.arguments:
+                self.browser_manager.arguments.append(argument)
+        self.max_contexts = max_contexts
+        self.max_browsers = browsers
+        self.max_rss_mb = max_rss_mb
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.browsers = []
+        self._starting = 0
+        self._reserved = {}
+        self._retiring = set()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Startup, checkout and memory statistics
+        self.startup_times = []
+        self.checkouts = 0
+        self.replaced = 0
+        self.total_wait = 0.0
+        self.peak_contexts = 0
+        self.peak_rss = 0
+        self.context_usage = []
+
+    @property
+    def capacity(self):
+        """Routes that can run at the same time (one scheduler worker each)."""
+        return self.max_contexts * self.max_browsers
+
+    def _over_memory(self, browser):
+        return self.max_rss_mb is not None and browser.rss() > self.max_rss_mb * 2 ** 20
+
+    def _pick(self):
+        """The live browser with the fewest contexts that still has room, or None; call with the lock held."""
+        candidates = [browser for browser in self.browsers
+                      if browser not in self._retiring
+                      and len(browser.tabs) + self._reserved[browser] < browser.max_contexts]
+        candidates.sort(key=lambda browser: len(browser.tabs) + self._reserved[browser])
+        for browser in candidates:
+            if not self._over_memory(browser):
+                return browser
+        return None
+
+    def _start_browser(self):
+        started = time.perf_counter()
+        browser = MultiplexedBrowser(self.browser_manager, self.max_contexts)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Started shared Chrome for up to {self.max_contexts} contexts in {elapsed:.2f}s.")
+        with self._condition:
+            self.startup_times.append(elapsed)
+            self.browsers.append(browser)
+            self._reserved[browser] = 0
+        return browser
+
+    def _retire(self, browser):
+        """Quit a browser once its last context is closed; call with the lock held."""
+        self._retiring.add(browser)
+        if not browser.tabs and not self._reserved[browser]:
+            self.browsers.remove(browser)
+            self._retiring.discard(browser)
+            del self._reserved[browser]
+            threading.Thread(target=browser.quit, name="quit-browser", daemon=True).start()
+            self._condition.notify_all()
+
+    def acquire(self, timeout=None):
+        """
+        Open a context in the least busy browser, starting a browser if all are full.
+
+        :param timeout: Seconds to wait for room (None waits forever).
+        :return: Tab driver of the new context.
+        """
+        started = time.perf_counter()
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("ContextPool is closed")
+                    browser = self._pick()
+                    if browser is not None:
+                        self._reserved[browser] += 1
+                        break
+                    if len(self.browsers) + self._starting < self.max_browsers:
+                        self._starting += 1
+                        break
+                    # ✅ Every browser is at its cap: wait for a route to release its context
+                    remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No browser context available in the pool")
+                    self._condition.wait(remaining)
+
+            if browser is None:
+                try:
+                    browser = self._start_browser()
+                finally:
+                    with self._condition:
+                        self._starting -= 1
+                with self._condition:
+                    self._reserved[browser] += 1
+
+            try:
+                driver = browser.open_context()
+            except Exception as e:
+                logger.warning(f"Replacing shared Chrome that could not open a context: {e}")
+                with self._condition:
+                    self._reserved[browser] -= 1
+                    self.replaced += 1
+                    self._retire(browser)
+                continue
+
+            with self._condition:
+                self._reserved[browser] -= 1
+                self.checkouts += 1
+                self.total_wait += time.perf_counter() - started
+                self.peak_contexts = max(self.peak_contexts, len(browser.tabs))
+                if browser.contexts_opened >= self.max_contexts_per_browser:
+                    self._retire(browser)  # ✅ Bound memory growth of long-lived Chrome processes
+            return driver
+
+    def release(self, driver):
+        """Record the context's memory, close it, and quit its browser if it is retiring or broken."""
+        tab = driver.tab
+        browser = tab.browser
+        usage = browser.measure(driver)
+        usage["seconds"] = round(time.perf_counter() - tab.opened, 3)
+        rss = browser.rss()
+        usage["browser_rss_mb"] = round(rss / 2 ** 20, 1)
+        usage["contexts"] = len(browser.tabs)
+        browser.close_context(tab)
+        healthy = browser.is_healthy()
+
+        with self._condition:
+            self.context_usage.append(usage)
+            self.peak_rss = max(self.peak_rss, rss)
+            if not healthy:
+                self.replaced += 1
+            if self._closed or not healthy or browser in self._retiring:
+                self._retire(browser)
+            self._condition.notify_all()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Context manager that acquires a context and always releases it."""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def stats(self):
+        """Return startup, checkout and per-context memory statistics."""
+        with self._condition:
+            started = len(self.startup_times)
+            usage = self.context_usage
+            # RSS of a browser divided by the contexts it hosted when it was measured
+            rss_per_context = [entry["browser_rss_mb"] / entry["contexts"] for entry in usage if entry["contexts"]]
+            return {
+                "browsers_started": started,
+                "avg_startup_seconds": round(sum(self.startup_times) / started, 3) if started else 0.0,
+                "max_contexts_per_browser": self.max_contexts,
+                "peak_contexts": self.peak_contexts,
+                "checkouts": self.checkouts,
+                "replaced": self.replaced,
+                "avg_checkout_wait_seconds": round(self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+                "avg_context_js_heap_mb": round(sum(entry["js_heap_mb"] for entry in usage) / len(usage), 2) if usage else 0.0,
+                "max_context_js_heap_mb": max((entry["js_heap_mb"] for entry in usage), default=0.0),
+                "avg_context_dom_nodes": round(sum(entry["dom_nodes"] for entry in usage) / len(usage)) if usage else 0,
+                "avg_rss_per_context_mb": round(sum(rss_per_context) / len(rss_per_context), 1) if rss_per_context else 0.0,
+                "peak_browser_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+                "session_turns": sum(browser.scheduler.turns for browser in self.browsers),
+                "session_wait_seconds": round(sum(browser.scheduler.wait_seconds for browser in self.browsers), 3),
+            }
+
+    def close(self):
+        """Quit every browser and report the pool statistics."""
+        with self._condition:
+            self._closed = True
+            browsers = list(self.browsers)
+        logger.info(f"Context pool closed: {self.stats()}")
+        for browser in browsers:
+            browser.quit()
+        with self._condition:
+            self.browsers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
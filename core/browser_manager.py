@@ -2,10 +2,13 @@
 
 """
 This module manages Selenium WebDriver setup, configurations, and optimizations.
-It includes options for headless mode, proxy handling, and user-agent rotation.
+It includes options for headless mode, proxy handling, user-agent rotation,
+a performance profile (resource blocking, eager page loads) and per-navigation load statistics.
 """
 
+import logging
 import random
+import threading
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -13,6 +16,127 @@ from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 
 
+logger = logging.getLogger(__name__)
+
+
+# Reads Navigation/Resource Timing for the current document. transferSize is 0 for cross-origin
+# resources without Timing-Allow-Origin, so bytes are a lower bound.
+NAVIGATION_STATS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+const ms = value => (value > 0 ? Math.round(value) : null);
+return {
+    url: location.href,
+    dom_content_loaded_ms: nav ? ms(nav.domContentLoadedEventEnd) : null,
+    load_ms: nav ? ms(nav.loadEventEnd) : null,
+    document_bytes: nav ? nav.transferSize : 0,
+    resource_bytes: resources.reduce((sum, entry) => sum + (entry.transferSize || 0), 0),
+    resources: resources.length
+};
+"""
+
+
+class PerformanceProfile:
+    """Browser settings that trade page fidelity for speed: blocked resources and an eager page load strategy."""
+
+    FONT_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+    IMAGE_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"]
+    STYLESHEET_PATTERNS = ["*.css"]
+    TRACKER_PATTERNS = [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*",
+        "*hotjar.com*", "*sentry.io*", "*bing.com/bat*", "*criteo.*", "*taboola.com*",
+    ]
+
+    def __init__(self, block_images=True, block_fonts=True, block_trackers=True, block_stylesheets=False,
+                 blocked_urls=None, page_load_strategy="eager"):
+        """
+        :param block_images: Disable images (Chrome pref) and block image URLs.
+        :param block_fonts: Block web fonts.
+        :param block_trackers: Block analytics/advertising hosts.
+        :param block_stylesheets: Block CSS (off by default: layout decides what is clickable).
+        :param blocked_urls: Extra URL patterns for Network.setBlockedURLs ("*" wildcards).
+        :param page_load_strategy: "normal", "eager" (return at DOMContentLoaded) or "none".
+        """
+        self.block_images = block_images
+        self.block_fonts = block_fonts
+        self.block_trackers = block_trackers
+        self.block_stylesheets = block_stylesheets
+        self.extra_blocked_urls = list(blocked_urls or [])
+        self.page_load_strategy = page_load_strategy
+
+    def blocked_urls(self):
+        """All URL patterns passed to Network.setBlockedURLs."""
+        patterns = []
+        if self.block_images:
+            patterns += self.IMAGE_PATTERNS
+        if self.block_fonts:
+            patterns += self.FONT_PATTERNS
+        if self.block_trackers:
+            patterns += self.TRACKER_PATTERNS
+        if self.block_stylesheets:
+            patterns += self.STYLESHEET_PATTERNS
+        return patterns + self.extra_blocked_urls
+
+    def configure_options(self, chrome_options):
+        """Apply the settings that must be set before Chrome starts."""
+        chrome_options.page_load_strategy = self.page_load_strategy
+        if self.block_images:
+            chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    def apply(self, driver):
+        """
+        Block the configured URLs in the current tab.
+        CDP settings are per tab, so call this again after switching to a newly opened tab.
+        """
+        patterns = self.blocked_urls()
+        if not patterns:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        except Exception as e:
+            logger.warning(f"Could not apply URL blocking: {e}")
+
+
+class NavigationLog:
+    """Bytes transferred and load times of the pages a scraper visited."""
+
+    def __init__(self):
+        self.entries = []
+
+    def record(self, driver, label):
+        """
+        Read the timing of the current document and store it under `label`.
+
+        :return: The recorded entry, or None if the page could not be measured.
+        """
+        try:
+            stats = driver.execute_script(NAVIGATION_STATS_SCRIPT)
+        except Exception as e:
+            logger.warning(f"Could not read navigation timing for {label}: {e}")
+            return None
+        entry = {"label": label, **stats, "bytes": stats["document_bytes"] + stats["resource_bytes"]}
+        self.entries.append(entry)
+        return entry
+
+    def totals(self):
+        return {
+            "navigations": len(self.entries),
+            "bytes": sum(entry["bytes"] for entry in self.entries),
+            "dom_content_loaded_ms": sum(entry["dom_content_loaded_ms"] or 0 for entry in self.entries),
+        }
+
+    def print_report(self, label=""):
+        """Print bytes and load times per navigation."""
+        logger.info(f"Navigations{f' for {label}' if label else ''}:")
+        for entry in self.entries:
+            load = f"{entry['load_ms']}ms" if entry["load_ms"] is not None else "pending"
+            logger.info(f"  {entry['label']}: {entry['bytes'] / 1024:.0f} KiB in {entry['resources']} resources, "
+                        f"DOMContentLoaded {entry['dom_content_loaded_ms']}ms, load {load}")
+        totals = self.totals()
+        logger.info(f"  total: {totals['bytes'] / 1024:.0f} KiB over {totals['navigations']} navigations")
+
+
 class BrowserManager:
     """Manages the Selenium WebDriver with customizable options."""
 
@@ -24,17 +148,28 @@ class BrowserManager:
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/120.0.0.0 Safari/537.36"
     ]
 
-    def __init__(self, headless=False, use_proxy=False, proxy_list=None):
+    # ChromeDriverManager().install() resolves (and may download) chromedriver; do it once per process
+    _driver_path = None
+    _driver_path_lock = threading.Lock()
+
+    def __init__(self, headless=False, use_proxy=False, proxy_list=None, capture_network=False, profile=None,
+                 arguments=None):
         """
         Initialize the browser manager with options.
 
         :param headless: Run Chrome in headless mode.
         :param use_proxy: Enable proxy support.
         :param proxy_list: List of proxy addresses to use.
+        :param capture_network: Enable Chrome's performance log so responses can be read (see NetworkCapture).
+        :param profile: PerformanceProfile to apply (None loads every resource with the normal strategy).
+        :param arguments: Extra Chrome command-line switches.
         """
         self.headless = headless
         self.use_proxy = use_proxy
         self.proxy_list = proxy_list if proxy_list else []
+        self.capture_network = capture_network
+        self.profile = profile
+        self.arguments = list(arguments or [])
 
     def get_random_user_agent(self):
         """Return a random user agent from the predefined list."""
@@ -46,6 +181,14 @@ class BrowserManager:
             return random.choice(self.proxy_list)
         return None
 
+    @classmethod
+    def get_driver_path(cls):
+        """Return the chromedriver path, installing it on first use only."""
+        with cls._driver_path_lock:
+            if cls._driver_path is None:
+                cls._driver_path = ChromeDriverManager().install()
+            return cls._driver_path
+
     def create_driver(self):
         """
         Create and configure the Selenium WebDriver with necessary options.
@@ -72,6 +215,17 @@ class BrowserManager:
         chrome_options.add_argument("--disable-extensions")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-gpu")
+        for argument in self.arguments:
+            chrome_options.add_argument(argument)
+
+        # Record network events (responses, request ids) in the performance log
+        if self.capture_network:
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+        # Block heavy resources and return from navigations at DOMContentLoaded
+        if self.profile:
+            self.profile.configure_options(chrome_options)
 
         # Handle proxy settings if enabled
         proxy = self.get_random_proxy()
@@ -79,11 +233,16 @@ class BrowserManager:
             chrome_options.add_argument(f"--proxy-server={proxy}")
 
         # Install WebDriver and initialize the browser
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        driver = webdriver.Chrome(service=Service(self.get_driver_path()), options=chrome_options)
 
         # Prevent detection by modifying WebDriver properties
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+        # Remember the profile on the driver so pooled drivers can re-apply it to new tabs
+        driver.performance_profile = self.profile
+        if self.profile:
+            self.profile.apply(driver)
+
         return driver
 
     @staticmethod
@@ -91,6 +250,6 @@ class BrowserManager:
         """Gracefully close the WebDriver instance."""
         try:
             driver.quit()
-            print("[INFO] WebDriver closed successfully.")
+            logger.info("WebDriver closed successfully.")
         except Exception as e:
-            print(f"[ERROR] Error while closing WebDriver: {e}")
\ No newline at end of file
+            logger.error(f"Error while closing WebDriver: {e}")
\ No newline at end of file
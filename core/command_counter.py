@@ -0,0 +1,44 @@
+# core/command_counter.py
+
+"""
+This module counts the WebDriver commands (HTTP round trips to chromedriver) issued by a driver.
+Every Selenium call, including WebElement methods, goes through driver.execute(), which is wrapped here.
+"""
+
+from collections import Counter
+
+
+class WebDriverCommandCounter:
+    """Context manager that counts WebDriver commands sent through a driver while active."""
+
+    def __init__(self, driver):
+        """
+        Initialize the counter.
+
+        :param driver: Selenium WebDriver instance to observe.
+        """
+        self.driver = driver
+        self.count = 0
+        self.by_command = Counter()
+        self._original_execute = None
+        self._patched_instance = False
+
+    def _counting_execute(self, driver_command, params=None):
+        """Record the command, then forward it to the original execute()."""
+        self.count += 1
+        self.by_command[driver_command] += 1
+        return self._original_execute(driver_command, params)
+
+    def __enter__(self):
+        # Counters may nest; remember whether execute() was already overridden on the instance
+        self._patched_instance = "execute" in vars(self.driver)
+        self._original_execute = self.driver.execute
+        self.driver.execute = self._counting_execute
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._patched_instance:
+            self.driver.execute = self._original_execute
+        else:
+            del self.driver.execute
+        return False
@@ -5,12 +5,15 @@ This module processes all flight cards, handles "Load more" button,
 manages modals, and saves scraped flight details to a JSON file.
 """
 
+import hashlib
 import json
+import logging
 import time
 import re
 import os
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     StaleElementReferenceException,
@@ -20,16 +23,93 @@ from selenium.common.exceptions import (
 from config.selectors import KiwiSelectors
 
 
-
+logger = logging.getLogger(__name__)
 
 
 def clean_location(location):
     """Remove unwanted characters (like Unicode symbols) from location names."""
     return re.sub(r'\s*\u2219\s*', '', location).strip()
 
-import random
-def click_all_boxes(driver):
-    """Clicks all expandable flight information boxes."""
+# Clicks every segment box at once and resolves when each box's container has changed (or the box
+# reports aria-expanded="true") and the DOM has been quiet for `quietMs`. Boxes whose content renders
+# elsewhere never count as changed, so a longer quiet period (or `timeoutMs`) also ends the wait.
+EXPAND_ALL_BOXES_SCRIPT = """
+const xpath = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const boxes = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) boxes.push(snapshot.snapshotItem(i));
+if (!boxes.length) return done({clicked: 0, expanded: 0, settled: true});
+
+const containers = boxes.map(box => box.parentElement || box);
+const expanded = new Set();
+let quietTimer = null, hardTimer = null;
+function finish(settled) {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(hardTimer);
+    boxes.forEach((box, i) => { if (box.getAttribute('aria-expanded') === 'true') expanded.add(i); });
+    done({clicked: boxes.length, expanded: expanded.size, settled: settled});
+}
+function armQuietTimer() {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => {
+        if (expanded.size === boxes.length) return finish(true);
+        quietTimer = setTimeout(() => finish(false), quietMs * 4);
+    }, quietMs);
+}
+const observer = new MutationObserver(mutations => {
+    for (const mutation of mutations) {
+        containers.forEach((container, i) => { if (container.contains(mutation.target)) expanded.add(i); });
+    }
+    armQuietTimer();
+});
+observer.observe(document.body, {childList: true, subtree: true, attributes: true, characterData: true});
+hardTimer = setTimeout(() => finish(false), timeoutMs);
+boxes.forEach(box => box.click());
+armQuietTimer();
+"""
+
+
+def expand_all_boxes(driver, timing=None, quiet_ms=200, timeout=10):
+    """
+    Expand every segment box with a single script call and wait once for all of them.
+
+    :return: (number of boxes expanded, seconds taken), or None if the script could not run.
+    """
+    timing = timing or FlowTiming()
+    started = time.perf_counter()
+    try:
+        with timing.waiting():
+            result = driver.execute_async_script(EXPAND_ALL_BOXES_SCRIPT, KiwiSelectors.BOX_ELEMENTS, quiet_ms,
+                                                 int(timeout * 1000))
+    except Exception as e:
+        logger.warning(f"Batch box expansion failed: {e}")
+        return None
+
+    elapsed = time.perf_counter() - started
+    if not result["settled"]:
+        logger.warning(f"Only {result['expanded']} of {result['clicked']} boxes expanded within {timeout}s.")
+    return result["expanded"], elapsed
+
+
+def click_all_boxes(driver, timing=None, batch=True):
+    """
+    Clicks all expandable flight information boxes.
+
+    :param batch: Expand every box with one script call (falls back to clicking one by one if it fails).
+    :return: (number of boxes expanded, seconds taken).
+    """
+    timing = timing or FlowTiming()
+    if batch:
+        expanded = expand_all_boxes(driver, timing)
+        if expanded is not None:
+            logger.info(f"Expanded {expanded[0]} boxes in {expanded[1]:.2f}s.")
+            timing.pause()  # Optional human-like jitter
+            return expanded
+
+    started = time.perf_counter()
+    expanded_count = 0
     try:
         original_scroll_position = driver.execute_script("return window.pageYOffset;")
         #print(f"[INFO] Saved original scroll position: {original_scroll_position}")
@@ -39,64 +119,90 @@ def click_all_boxes(driver):
             #print(f"[INFO] Clicking on Box {idx}...")
 
             try:
-                driver.execute_script("arguments[0].scrollIntoView({ behavior: 'smooth', block: 'center' });", box)
-                WebDriverWait(driver, 10).until(EC.element_to_be_clickable(box)).click()
-                delay = random.uniform(2.5, 3.5)  # Random delay between clicks
-                time.sleep(delay)
+                driver.execute_script("arguments[0].scrollIntoView({ block: 'center' });", box)
+                clickable_box = timing.wait_until(driver, EC.element_to_be_clickable(box))
+                if not clickable_box:
+                    raise TimeoutException("box not clickable")
+                clickable_box.click()
+                # ✅ Wait for the box to finish expanding instead of a fixed 2.5-3.5s sleep
+                timing.wait_for_dom_settled(driver, quiet_ms=200, timeout=5)
+                timing.pause()  # Optional human-like jitter
+                expanded_count += 1
 
             except Exception as e:
-                print(f"[ERROR] Could not click Box {idx}: {e}")
+                logger.error(f"Could not click Box {idx}: {e}")
 
         # Restore scroll position after clicking all boxes
         driver.execute_script(f"window.scrollTo(0, {original_scroll_position});")
 
 
     except Exception as e:
-        print(f"[ERROR] Could not complete clicking all boxes: {e}")
+        logger.error(f"Could not complete clicking all boxes: {e}")
 
+    return expanded_count, time.perf_counter() - started
 
 
-import traceback
 
-from config.save_data import save_flight_data, structure_flight_data
+from datetime import datetime, timezone
 
-import traceback
+from config.save_data import save_flight_data, structure_flight_data, structure_flight_data_in_browser
+from core.command_counter import WebDriverCommandCounter
+from core.page_parser import parse_flight_details
+from core.telemetry import span
+from core.timing import FlowTiming
 
-import traceback
-
-from config.selectors import KiwiSelectors
+# "script" reads a whole itinerary with one execute_script call, "html" parses driver.page_source
+# offline with lxml, "element" uses one WebDriver command per field
+EXTRACTION_MODES = ("script", "html", "element")
 
-import traceback
-from config.save_data import save_flight_data
 
-
-def scrape_information(driver):
+def scrape_information(driver, extraction_mode="script", parser_pool=None, sink=None, metadata=None):
     """
     Extracts, structures, and saves flight information immediately after scraping.
+
+    :param driver: Selenium WebDriver showing a flight detail page.
+    :param extraction_mode: "script" (single round trip), "html" (offline parse of the page source)
+                            or "element" (one command per field).
+    :param parser_pool: Optional ParserPool used to parse pages in "html" mode.
+    :param sink: Callable receiving each itinerary (default: save_flight_data).
+    :param metadata: Extra fields merged into the record (e.g. "price" and "search").
     """
     try:
-        # ✅ Step 1: Extract flight details
-        parents = driver.find_elements(By.XPATH, KiwiSelectors.FLIGHT_DETAILS_PARENT)
-
-        if not parents:
-            print("[ERROR] No flight details found.")
+        with WebDriverCommandCounter(driver) as command_counter:
+            if extraction_mode == "script":
+                # ✅ Step 1+2: Extract and structure everything inside the browser
+                flight_data = structure_flight_data_in_browser(driver)
+            elif extraction_mode == "html":
+                # ✅ Step 1: Fetch the page once, Step 2: parse it without touching the browser
+                page_source = driver.page_source
+                with span("structure_flight_data", mode="html"):
+                    if parser_pool:
+                        flight_data = parser_pool.parse(page_source)
+                    else:
+                        flight_data = parse_flight_details(page_source, verbose=True)
+            else:
+                # ✅ Step 1: Extract flight details
+                parents = driver.find_elements(By.XPATH, KiwiSelectors.FLIGHT_DETAILS_PARENT)
+
+                # ✅ Step 2: Structure the extracted data
+                flight_data = structure_flight_data(parents) if parents else None
+
+        if not flight_data:
+            logger.error("No flight details found.")
             return
 
-        #print(f"[INFO] Detected Flight Type: {'round trip' if len(parents) > 1 else 'one way'}")
+        logger.info(f"Itinerary extracted with {command_counter.count} WebDriver commands "
+                    f"({extraction_mode} mode).")
 
-        # ✅ Step 2: Structure the extracted data
-        flight_data = structure_flight_data(parents)
+        # ✅ Record where, when and at what price the itinerary was seen
+        flight_data.update(metadata or {})
+        flight_data["scraped_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-        # ✅ Debugging: Ensure structured data is correct before saving
-        #print("[DEBUG] Structured Flight Data:", flight_data)
-
-        # ✅ Step 3: Save data immediately after extracting a flight
-        save_flight_data(flight_data, output_file="json_data/flight_results.json")
-
-        #print("[SUCCESS] Flight data extraction, structuring, and saving completed.")
+        # ✅ Step 3: Hand the flight to the sink (e.g. BackgroundFlightWriter.submit) immediately
+        (sink or save_flight_data)(flight_data)
 
     except Exception as e:
-        print(f"[ERROR] Exception in scrape_information: {traceback.format_exc()}")
+        logger.exception("Exception in scrape_information")
 
 
 
@@ -105,87 +211,205 @@ def clean_location(location):
     return re.sub(r'\\s*\\u2219\\s*', '', location).strip()
 
 
-def process_all_cards(driver):
+# Returns the whitespace-normalized text of every card in one call; it identifies a card
+# independently of its position in the (re-rendering) result list.
+CARD_TEXTS_SCRIPT = "return arguments[0].map(card => card.innerText.split(/\\s+/).join(' ').trim());"
+
+
+def card_fingerprints(driver, cards):
+    """Return a stable content fingerprint (hash of the card's text) for every card."""
+    texts = driver.execute_script(CARD_TEXTS_SCRIPT, cards)
+    return [hashlib.sha1(text.encode("utf-8")).hexdigest()[:16] for text in texts]
+
+
+def find_card(driver, fingerprint):
+    """Re-locate a card by fingerprint after the result list re-rendered, or None."""
+    cards = driver.find_elements(By.CSS_SELECTOR, KiwiSelectors.FLIGHT_CARDS_WRAPPER)
+    if not cards:
+        return None
+    for card, card_fingerprint in zip(cards, card_fingerprints(driver, cards)):
+        if card_fingerprint == fingerprint:
+            return card
+    return None
+
+
+def load_more_results(driver, timing, card_count):
     """
-    Process all flight cards on the page, handle "Load more" button if available,
-    and save flight details to JSON in real-time.
+    Click "Load more" and wait for additional cards.
+
+    :return: True if more cards appeared.
     """
-    visited_indices = set()
-    flight_count = 0
-    max_flights = 3  # Limit the number of flights
+    buttons = driver.find_elements(By.XPATH, KiwiSelectors.LOAD_MORE_BUTTON)
+    if not buttons:
+        return False
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();", buttons[0])
+    except Exception as e:
+        logger.warning(f"Could not click 'Load more': {e}")
+        return False
+    return bool(timing.wait_until(
+        driver,
+        lambda d: len(d.find_elements(By.CSS_SELECTOR, KiwiSelectors.FLIGHT_CARDS_WRAPPER)) > card_count,
+        timeout=15
+    ))
 
+
+def open_full_details(driver):
+    """Click 'Show full details' in the opened detail view if the button exists."""
     try:
-        while flight_count < max_flights:
-            time.sleep(2)
-            cards = WebDriverWait(driver, 30).until(
-                lambda d: d.find_elements(By.CSS_SELECTOR, KiwiSelectors.FLIGHT_CARDS_WRAPPER)
-            )
-            #print(f"[INFO] Found {len(cards)} cards.")
-
-            for index, card in enumerate(cards):
-                if index in visited_indices or flight_count >= max_flights:
-                    continue  # Skip already visited cards or stop if limit reached
-
-                visited_indices.add(index)
-                flight_count += 1
-             #   print(f"[INFO] Processing flight {flight_count} of {max_flights}...")
-
-                retries = 3
-                while retries > 0:
-                    try:
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", card)
-                        time.sleep(2)
-                        WebDriverWait(driver, 20).until(EC.element_to_be_clickable(card)).click()
-
-                        # Fetch flight price
-                        try:
-                            time.sleep(2)
-                            price_element = card.find_element(By.XPATH, KiwiSelectors.RESULT_CARD_PRICE)
-                            flight_price = price_element.text.strip()
-                            print(flight_price)
-                        except Exception:
-                            flight_price = "Not Available"
-
-                        # Handle 'Show Full Details' button if available
-                        try:
-                            parent_card = driver.find_element(By.CSS_SELECTOR, KiwiSelectors.FULL_DETAILS_PARENT)
-                            if parent_card:
-                                try:
-                                    show_full_details_button = parent_card.find_element(
-                                        By.XPATH, KiwiSelectors.SHOW_FULL_DETAILS_BUTTON_1
-                                    )
-                                    time.sleep(1)
-                                    show_full_details_button.click()
-                                except NoSuchElementException:
-                                    try:
-                                        show_full_details_button = parent_card.find_element(
-                                            By.XPATH, KiwiSelectors.SHOW_FULL_DETAILS_BUTTON_2
-                                        )
-                                        time.sleep(1)
-                                        time.sleep(2)
-                                        show_full_details_button.click()
-                                    except NoSuchElementException:
-                                        print("[INFO] No 'Show full details' button found.")
-                        except NoSuchElementException:
-                            print("[INFO] No 'Show full details' button found.")
-
-                        click_all_boxes(driver)
-
-                        # ✅ Extract and Save Data Immediately After Scraping Each Flight
-                        scrape_information(driver)  # This call saves data in real-time
-
-                        #input("enter something to continue..")  # Pause to debug if needed
-
-                        driver.back()
-                        break
+        parent_card = driver.find_element(By.CSS_SELECTOR, KiwiSelectors.FULL_DETAILS_PARENT)
+        for by, selector in ((By.XPATH, KiwiSelectors.SHOW_FULL_DETAILS_BUTTON_1),
+                             (By.XPATH, KiwiSelectors.SHOW_FULL_DETAILS_BUTTON_2)):
+            try:
+                parent_card.find_element(by, selector).click()
+                return
+            except NoSuchElementException:
+                continue
+        logger.info("No 'Show full details' button found.")
+    except NoSuchElementException:
+        logger.info("No 'Show full details' button found.")
 
-                    except Exception as e:
-                        print(f"[ERROR] Exception in processing card {index + 1}: {e}")
 
-    except Exception as e:
-        print(f"[ERROR] Unexpected error: {e}")
+def close_detail_view(driver, timing, results_url):
+    """
+    Return to the result list without reloading it when possible.
 
+    :return: "closed" if the detail view was dismissed in place, "back" if a navigation was needed.
+    """
+    if driver.current_url == results_url:
+        # The detail view is an overlay on the result list: dismiss it instead of navigating
+        close_buttons = driver.find_elements(By.XPATH, KiwiSelectors.CLOSE_MODAL_BUTTON)
+        try:
+            if close_buttons:
+                driver.execute_script("arguments[0].click();", close_buttons[0])
+            else:
+                ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+        except Exception as e:
+            logger.warning(f"Could not close the detail view: {e}")
+        if timing.wait_until(driver, lambda d: not d.find_elements(By.XPATH, KiwiSelectors.FLIGHT_DETAILS_PARENT),
+                             timeout=5):
+            return "closed"
+
+    driver.back()
+    return "back"
+
+
+def process_card(driver, fingerprint, extraction_mode, parser_pool, sink, search, timing, retries=3, delta=None,
+                 journal=None):
+    """
+    Open one card, scrape its itinerary and return to the result list.
 
+    :param delta: Optional RouteDelta; the itinerary is then only saved if it is new or re-priced.
+    :param journal: Optional JournalRoute recording the card as saved.
+    :return: True if the itinerary was scraped.
+    """
+    results_url = driver.current_url
+    if delta is not None:
+        # ✅ Unchanged itineraries never reach the writer; the journal records their cards directly
+        sink = delta.sink(fingerprint, sink or save_flight_data,
+                          on_unchanged=journal.handled if journal is not None else None)
+    if journal is not None:
+        sink = journal.sink(fingerprint, sink or save_flight_data)
+    while retries > 0:
+        retries -= 1
+        try:
+            card = find_card(driver, fingerprint)
+            if card is None:
+                logger.warning(f"Card {fingerprint} is no longer in the result list.")
+                return False
+
+            # Fetch flight price
+            try:
+                flight_price = card.find_element(By.XPATH, KiwiSelectors.RESULT_CARD_PRICE).text.strip()
+                logger.debug(f"Card price: {flight_price}")
+            except Exception:
+                flight_price = "Not Available"
+
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", card)
+            clickable_card = timing.wait_until(driver, EC.element_to_be_clickable(card), timeout=20)
+            if not clickable_card:
+                raise TimeoutException("card not clickable")
+            clickable_card.click()
+            timing.wait_for_dom_settled(driver, timeout=5)
+
+            open_full_details(driver)
+            timing.wait_for_dom_settled(driver, timeout=5)
+            with timing.phase("click_all_boxes"):
+                click_all_boxes(driver, timing)
+
+            # ✅ Extract and Save Data Immediately After Scraping Each Flight
+            with timing.phase("scrape_information"):
+                scrape_information(driver, extraction_mode, parser_pool, sink,
+                                   metadata={"price": flight_price, "search": search})
+
+            if close_detail_view(driver, timing, results_url) == "back":
+                logger.info("Detail view replaced the result list; navigated back.")
+            return True
+
+        except Exception as e:
+            logger.error(f"Exception in processing card {fingerprint} ({retries} retries left): {e}")
+            if driver.current_url != results_url:
+                driver.back()
+
+    return False
+
+
+def process_all_cards(driver, extraction_mode="script", parser_pool=None, sink=None, search=None, timing=None,
+                      max_flights=3, delta=None, journal=None):
+    """
+    Process the flight cards on the page, following the "Load more" button when needed,
+    and save flight details to JSON in real-time.
 
+    Cards are identified by a fingerprint of their content, so re-rendering the list (after closing a
+    detail view or loading more results) never causes a card to be skipped or scraped twice.
+
+    :param driver: Selenium WebDriver showing the search results.
+    :param extraction_mode: Extraction mode passed to scrape_information().
+    :param parser_pool: Optional ParserPool for the "html" extraction mode.
+    :param sink: Callable receiving each itinerary, passed to scrape_information().
+    :param search: Search parameters (departure, destination, dates) stored with every itinerary.
+    :param timing: FlowTiming used for waits, jitter and phase accounting.
+    :param max_flights: Maximum number of cards to handle (None for every card); skipped cards count too.
+    :param delta: Optional RouteDelta: cards seen in earlier runs are skipped without opening them,
+                  and only new or re-priced itineraries are saved.
+    :param journal: Optional JournalRoute: cards saved by an interrupted attempt are skipped, new ones recorded.
+    :return: Number of cards handled.
+    """
+    timing = timing or FlowTiming()
+    visited = set()
+    flight_count = 0
+
+    try:
+        while max_flights is None or flight_count < max_flights:
+            timing.wait_for_dom_settled(driver, timeout=5)
+            cards = timing.wait_until(
+                driver, lambda d: d.find_elements(By.CSS_SELECTOR, KiwiSelectors.FLIGHT_CARDS_WRAPPER), timeout=30
+            )
+            if not cards:
+                raise TimeoutException("No flight cards found")
+
+            pending = [fingerprint for fingerprint in card_fingerprints(driver, cards) if fingerprint not in visited]
+            if not pending:
+                with timing.phase("load_more"):
+                    if not load_more_results(driver, timing, len(cards)):
+                        logger.info(f"No more results after {len(cards)} cards.")
+                        break
+                continue
+
+            fingerprint = pending[0]
+            visited.add(fingerprint)
+            if journal is not None and journal.is_saved(fingerprint):
+                flight_count += 1  # ✅ Saved before the previous run was interrupted
+                continue
+            if delta is not None and delta.known_card(fingerprint):
+                flight_count += 1  # ✅ Same list-level data (incl. price) as last time: nothing to expand
+                continue
+            with span("card", card=fingerprint):
+                if process_card(driver, fingerprint, extraction_mode, parser_pool, sink, search, timing, delta=delta,
+                                journal=journal):
+                    flight_count += 1
 
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
 
+    return flight_count
@@ -0,0 +1,308 @@
+# core/date_grid.py
+
+"""
+This module searches a grid of (departure date, return date) combinations of one route in one browser session.
+
+date_combinations() generates the combinations of two date windows lazily. The date picker of the landing
+page shows a price on every day: DateGridSearch reads all of them with one script per pair of displayed
+months, estimates every combination as the sum of its two day prices, and only scrapes the results of the
+cheapest combinations plus those whose day prices changed since the last harvest (CalendarPriceHistory).
+A ±3 day grid (49 combinations) then costs one form fill and a handful of searches instead of 49 sessions.
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from selenium.webdriver.common.by import By
+
+from config.save_data import save_flight_data
+from config.selectors import KiwiSelectors
+from core.scraper_engine import KiwiFlightScraper
+from core.search_url import slugify
+from core.sqlite_store import parse_price
+
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_PRICES_SCRIPT = """
+const prices = {};
+for (const cell of document.querySelectorAll(arguments[0])) {
+    const price = cell.querySelector(arguments[1]);
+    prices[cell.getAttribute('data-value')] = price ? price.textContent.trim() : null;
+}
+return prices;
+"""
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def date_range(start, end):
+    """Yield every YYYY-MM-DD date from start to end, both included."""
+    day, end = _as_date(start), _as_date(end)
+    while day <= end:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+def flexible_window(center, days):
+    """The window of ±days around a YYYY-MM-DD date, as a (start, end) tuple."""
+    center = _as_date(center)
+    return (center - timedelta(days=days)).isoformat(), (center + timedelta(days=days)).isoformat()
+
+
+def date_combinations(departure_window, return_window, min_stay=1, max_stay=None):
+    """
+    Lazily yield the (departure_date, return_date) pairs of two date windows.
+
+    :param departure_window: (start, end) YYYY-MM-DD dates, both included.
+    :param return_window: (start, end) YYYY-MM-DD dates, both included.
+    :param min_stay: Minimum nights between departure and return.
+    :param max_stay: Maximum nights between departure and return (None for no limit).
+    """
+    for departure_date in date_range(*departure_window):
+        for return_date in date_range(*return_window):
+            stay = (_as_date(return_date) - _as_date(departure_date)).days
+            if stay < min_stay or (max_stay is not None and stay > max_stay):
+                continue
+            yield departure_date, return_date
+
+
+def month_label(day):
+    """Date picker label of the month of a date ("2025-02-06" -> "February 2025")."""
+    return _as_date(day).strftime("%B %Y")
+
+
+def read_calendar_prices(driver):
+    """
+    Read the price of every day the date picker currently shows, in one script call.
+
+    :return: {YYYY-MM-DD: price or None}.
+    """
+    cells = driver.execute_script(CALENDAR_PRICES_SCRIPT, KiwiSelectors.CALENDAR_DAYS,
+                                  KiwiSelectors.CALENDAR_DAY_PRICE) or {}
+    return {day: parse_price(text)[0] for day, text in cells.items() if day}
+
+
+class CalendarPriceHistory:
+    """Day prices of the last harvest per route, persisted so the next run can spot changed cells."""
+
+    def __init__(self, history_file="json_data/calendar_prices.json"):
+        """
+        :param history_file: JSON file keeping the prices (None for memory only).
+        """
+        self.history_file = history_file
+        self._lock = threading.Lock()
+        self._prices = {}
+
+        if history_file and os.path.exists(history_file):
+            try:
+                with open(history_file, "r", encoding="utf-8") as file:
+                    self._prices = json.load(file)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable calendar price history {history_file}")
+
+    @staticmethod
+    def key(departure, destination):
+        return f"{slugify(departure)}|{slugify(destination)}"
+
+    def previous(self, departure, destination):
+        """Day prices of the last harvest of a route ({} if there was none)."""
+        with self._lock:
+            return dict(self._prices.get(self.key(departure, destination), {}))
+
+    def update(self, departure, destination, prices):
+        """Remember newly harvested day prices of a route (days not harvested keep their old price)."""
+        with self._lock:
+            self._prices.setdefault(self.key(departure, destination), {}).update(
+                {day: price for day, price in prices.items() if price is not None})
+            self._save()
+
+    def _save(self):
+        """Persist the history atomically."""
+        if not self.history_file:
+            return
+        directory = os.path.dirname(self.history_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.history_file + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._prices, file, indent=4, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_path, self.history_file)
+
+
+class DateGridSearch:
+    """Answers the whole date matrix of one route with one scraper and browser."""
+
+    # The date picker shows two months; moving further than a year ahead means the windows are wrong
+    MAX_MONTH_MOVES = 12
+
+    def __init__(self, departure, destination, departure_window, return_window, min_stay=1, max_stay=None,
+                 cheapest=3, max_searches=10, history=None, sink=None, **scraper_options):
+        """
+        :param departure: Departure location.
+        :param destination: Destination location.
+        :param departure_window: (start, end) YYYY-MM-DD departure dates (see flexible_window()).
+        :param return_window: (start, end) YYYY-MM-DD return dates.
+        :param min_stay: Minimum nights between departure and return.
+        :param max_stay: Maximum nights between departure and return (None for no limit).
+        :param cheapest: Combinations with the lowest calendar prices that are always scraped.
+        :param max_searches: Maximum result searches, cheapest and changed combinations included.
+        :param history: CalendarPriceHistory; combinations whose day prices changed are scraped too.
+        :param sink: Callable receiving each itinerary (default: save_flight_data).
+        :param scraper_options: Passed to KiwiFlightScraper (driver, search_mode, max_flights, ...).
+        """
+        self.departure = departure
+        self.destination = destination
+        self.departure_window = departure_window
+        self.return_window = return_window
+        self.min_stay = min_stay
+        self.max_stay = max_stay
+        self.cheapest = cheapest
+        self.max_searches = max_searches
+        self.history = history
+        self.sink = sink or save_flight_data
+        self.scraper_options = scraper_options
+        self.scraper = None
+        self.prices = {}
+        self.results = []
+        self._current = None
+
+    def combinations(self):
+        return date_combinations(self.departure_window, self.return_window, self.min_stay, self.max_stay)
+
+    def _collect(self, flight_data):
+        """Sink of the scraper: count the itineraries of the current combination, then pass them on."""
+        self._current["itineraries"] += 1
+        price = parse_price(flight_data.get("price"))[0]
+        if price is not None and (self._current["cheapest_price"] is None or price < self._current["cheapest_price"]):
+            self._current["cheapest_price"] = price
+        self.sink(flight_data)
+
+    def harvest_prices(self):
+        """Fill the places, open the date picker and read every day price of both windows."""
+        scraper = self.scraper
+        last_day = max(self.departure_window[1], self.return_window[1])
+        prices = {}
+        with scraper.timing.phase("harvest_calendar_prices"):
+            scraper.fill_places()
+            scraper.open_date_picker()
+            for _ in range(self.MAX_MONTH_MOVES):
+                displayed_months = scraper.displayed_months()
+                prices.update(read_calendar_prices(scraper.driver))
+                if prices and max(prices) >= last_day:
+                    break
+                scraper.click_element(By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_NEXT_BTN)
+                scraper.timing.wait_until(
+                    scraper.driver,
+                    lambda d: [elem.text.strip() for elem in d.find_elements(
+                        By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_MONTH_BUTTONS)] != displayed_months,
+                    timeout=5
+                )
+        return prices
+
+    def select(self, prices, previous=None):
+        """
+        Pick the combinations worth a full search: the cheapest by calendar price, then those whose
+        day prices changed since the previous harvest, at most max_searches in total.
+
+        :return: List of {"departure_date", "return_date", "calendar_price", "reason"}.
+        """
+        previous = previous or {}
+        cheapest, changed = [], []
+        priced = 0
+        for departure_date, return_date in self.combinations():
+            departure_price, return_price = prices.get(departure_date), prices.get(return_date)
+            if departure_price is None or return_price is None:
+                continue
+            priced += 1
+            estimate = departure_price + return_price
+            entry = (estimate, departure_date, return_date)
+            # ✅ Bounded max-heap: only the `cheapest` best combinations are kept while the grid is generated
+            heapq.heappush(cheapest, (-estimate, departure_date, return_date))
+            if len(cheapest) > self.cheapest:
+                heapq.heappop(cheapest)
+            if any(day in previous and previous[day] != prices[day] for day in (departure_date, return_date)):
+                changed.append(entry)
+
+        if not priced:
+            logger.warning(f"No calendar prices for {self.departure} -> {self.destination}; "
+                           f"searching the first {self.max_searches} combinations.")
+            return [{"departure_date": departure_date, "return_date": return_date, "calendar_price": None,
+                     "reason": "unpriced"}
+                    for (departure_date, return_date), _ in zip(self.combinations(), range(self.max_searches))]
+
+        selected = [{"departure_date": departure_date, "return_date": return_date, "calendar_price": -estimate,
+                     "reason": "cheapest"} for estimate, departure_date, return_date in sorted(cheapest, reverse=True)]
+        chosen = {(entry["departure_date"], entry["return_date"]) for entry in selected}
+        for estimate, departure_date, return_date in sorted(changed):
+            if (departure_date, return_date) not in chosen:
+                selected.append({"departure_date": departure_date, "return_date": return_date,
+                                 "calendar_price": estimate, "reason": "changed"})
+        return selected[:self.max_searches]
+
+    def search(self, combination):
+        """Run the result search and card scraping of one combination in the scraper's browser."""
+        scraper = self.scraper
+        self._current = dict(combination, itineraries=0, cheapest_price=None, error=None)
+        scraper.set_route(self.departure, self.destination, combination["departure_date"],
+                          combination["return_date"], month_label(combination["departure_date"]),
+                          month_label(combination["return_date"]))
+
+        # Results of the previous search may have opened in a second tab
+        handles = scraper.driver.window_handles
+        for handle in handles[1:]:
+            scraper.driver.switch_to.window(handle)
+            scraper.driver.close()
+        scraper.driver.switch_to.window(handles[0])
+
+        try:
+            scraper.run()
+        except Exception as e:
+            self._current["error"] = str(e) or type(e).__name__
+            logger.error(f"Date grid search {scraper.departure_date} / {scraper.return_date} failed: {e}")
+        self.results.append(self._current)
+
+    def run(self):
+        """
+        Harvest the calendar prices and search the selected combinations.
+
+        :return: One result per searched combination, with its calendar price, itinerary count and cheapest price.
+        """
+        first = next(self.combinations(), None)
+        if first is None:
+            raise ValueError("The date windows contain no valid (departure, return) combination")
+
+        self.scraper = KiwiFlightScraper(self.departure, self.destination, first[0], first[1],
+                                         month_label(first[0]), month_label(first[1]),
+                                         sink=self._collect, **self.scraper_options)
+        try:
+            self.prices = self.harvest_prices()
+            previous = self.history.previous(self.departure, self.destination) if self.history else {}
+            selected = self.select(self.prices, previous)
+            if self.history:
+                self.history.update(self.departure, self.destination, self.prices)
+            logger.info(f"{self.departure} -> {self.destination}: {len(self.prices)} calendar prices, "
+                        f"searching {len(selected)} date combinations.")
+            for combination in selected:
+                self.search(combination)
+        finally:
+            if self.scraper.owns_driver:
+                self.scraper.driver.quit()
+        self.print_report()
+        return self.results
+
+    def print_report(self):
+        """Log the searched combinations, cheapest scraped price first."""
+        logger.info(f"Date grid {self.departure} -> {self.destination}:")
+        for result in sorted(self.results, key=lambda result: (result["cheapest_price"] is None,
+                                                               result["cheapest_price"] or 0)):
+            error = f", failed: {result['error']}" if result["error"] else ""
+            logger.info(f"  {result['departure_date']} / {result['return_date']} ({result['reason']}, calendar "
+                        f"{result['calendar_price']}): {result['itineraries']} itineraries, cheapest "
+                        f"{result['cheapest_price']}{error}")
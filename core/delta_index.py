@@ -0,0 +1,192 @@
+# core/delta_index.py
+
+"""
+This module keeps a per-route index of the itineraries already seen, so continuously monitored
+routes only pay for (and store) what changed.
+
+Two fingerprints are kept per route:
+- card fingerprints (hash of a result card's list-level text, including its price): a known card
+  is skipped without opening its detail view;
+- itinerary keys (flight numbers, times and airports of every leg) mapped to the last seen price:
+  a scraped itinerary is only written when it is new or its price changed.
+
+Both maps remember the run of the route that last saw each fingerprint. Fingerprints not seen for
+max_idle_runs runs are dropped, and so are routes not run for max_idle_days (e.g. past travel dates),
+so the index stays as large as what is currently on sale.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from core.records import Itinerary
+
+
+logger = logging.getLogger(__name__)
+
+
+def itinerary_key(flight_data):
+    """Identity of an itinerary independent of its price: flight numbers, times and airports of every leg."""
+    legs = []
+    for flight in Itinerary.coerce(flight_data).flights:
+        legs.append([
+            flight.flight_label,
+            flight.departure_root,
+            flight.arrival_root,
+            flight.departure_time,
+            flight.arrival_time,
+            flight.flight_details.flight_number if flight.flight_details else None,
+            [[stop.departure_airport, stop.departure_date, stop.departure_time, stop.arrival_airport,
+              stop.arrival_time, stop.flight_details.flight_number]
+             for stop in flight.stops],
+        ])
+    canonical = json.dumps(legs, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class DeltaIndex:
+    """Card and itinerary fingerprints per route, persisted as JSON."""
+
+    def __init__(self, index_file="json_data/delta_index.json", max_idle_runs=10, max_idle_days=30):
+        """
+        :param index_file: JSON file persisting the index (None for memory only).
+        :param max_idle_runs: Runs of a route after which a card or itinerary it no longer lists is forgotten.
+        :param max_idle_days: Days after which a route that was not run again is forgotten.
+        """
+        self.index_file = index_file
+        self.max_idle_runs = max_idle_runs
+        self.max_idle_days = max_idle_days
+        self._routes = {}
+        self._lock = threading.Lock()
+
+        if index_file and os.path.exists(index_file):
+            try:
+                with open(index_file, "r", encoding="utf-8") as file:
+                    self._routes = json.load(file)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable delta index {index_file}")
+
+    @staticmethod
+    def route_key(search):
+        """Index key of a route's search parameters."""
+        return "|".join(str(search.get(field) or "").strip().lower()
+                        for field in ("departure", "destination", "departure_date", "return_date"))
+
+    def route(self, search):
+        """Return the RouteDelta tracking one run of a route."""
+        with self._lock:
+            entry = self._routes.setdefault(self.route_key(search), {"cards": {}, "itineraries": {}})
+            # Entries written before fingerprints were aged start their clock now
+            entry.setdefault("runs", 0)
+            entry.setdefault("last_run", time.time())
+            entry.setdefault("card_runs", dict.fromkeys(entry["cards"], entry["runs"]))
+            entry.setdefault("itinerary_runs", dict.fromkeys(entry["itineraries"], entry["runs"]))
+        return RouteDelta(self, entry)
+
+    def prune(self, entry, run):
+        """
+        Close a run of a route: drop its fingerprints not seen for max_idle_runs runs.
+
+        :return: Number of fingerprints dropped.
+        """
+        oldest = run - self.max_idle_runs
+        with self._lock:
+            entry["runs"] = run
+            entry["last_run"] = time.time()
+            dropped = 0
+            for name, runs_name in (("cards", "card_runs"), ("itineraries", "itinerary_runs")):
+                fingerprints, runs = entry[name], entry[runs_name]
+                for fingerprint in [fingerprint for fingerprint in fingerprints if runs.get(fingerprint, run) <= oldest]:
+                    del fingerprints[fingerprint]
+                    runs.pop(fingerprint, None)
+                    dropped += 1
+        return dropped
+
+    def save(self):
+        """Persist the index atomically."""
+        if not self.index_file:
+            return
+        with self._lock:
+            now = time.time()
+            for route_key in [route_key for route_key, entry in self._routes.items()
+                              if now - entry.get("last_run", now) > self.max_idle_days * 86400]:
+                del self._routes[route_key]
+            directory = os.path.dirname(self.index_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.index_file + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._routes, file, ensure_ascii=False)
+            os.replace(temp_path, self.index_file)
+
+
+class RouteDelta:
+    """Per-run view of one route's fingerprints, counting skipped and fully scraped cards."""
+
+    def __init__(self, index, entry):
+        self.index = index
+        self.entry = entry
+        self.run = entry["runs"] + 1
+        self.counts = {"skipped": 0, "scraped": 0, "new": 0, "changed": 0, "unchanged": 0, "pruned": 0}
+
+    def known_card(self, card_fingerprint):
+        """True if a card with exactly this list-level content was scraped before."""
+        with self.index._lock:
+            key = self.entry["cards"].get(card_fingerprint)
+            known = key is not None
+            if known:
+                self.entry["card_runs"][card_fingerprint] = self.run
+                if key in self.entry["itineraries"]:
+                    self.entry["itinerary_runs"][key] = self.run
+        if known:
+            self.counts["skipped"] += 1
+        return known
+
+    def record(self, card_fingerprint, flight_data):
+        """
+        Register a scraped itinerary.
+
+        :return: "new", "changed" (price differs from the last run) or "unchanged".
+        """
+        key = itinerary_key(flight_data)
+        price = flight_data.get("price")
+        with self.index._lock:
+            itineraries = self.entry["itineraries"]
+            if key not in itineraries:
+                status = "new"
+            else:
+                status = "unchanged" if itineraries[key] == price else "changed"
+            itineraries[key] = price
+            self.entry["itinerary_runs"][key] = self.run
+            if card_fingerprint:
+                self.entry["cards"][card_fingerprint] = key
+                self.entry["card_runs"][card_fingerprint] = self.run
+
+        self.counts["scraped"] += 1
+        self.counts[status] += 1
+        return status
+
+    def sink(self, card_fingerprint, sink, on_unchanged=None):
+        """
+        Wrap a sink so only new or re-priced itineraries reach storage.
+
+        :param on_unchanged: Callable receiving the itineraries that are dropped (e.g. JournalRoute.handled).
+        """
+        def write_changes(flight_data):
+            if self.record(card_fingerprint, flight_data) != "unchanged":
+                sink(flight_data)
+            elif on_unchanged is not None:
+                on_unchanged(flight_data)
+        return write_changes
+
+    def finish(self, label=""):
+        """Drop stale fingerprints, persist the index and print how many cards were skipped versus fully scraped."""
+        self.counts["pruned"] = self.index.prune(self.entry, self.run)
+        self.index.save()
+        logger.info(f"Delta{f' for {label}' if label else ''}: {self.counts['skipped']} cards skipped, "
+                    f"{self.counts['scraped']} scraped ({self.counts['new']} new, {self.counts['changed']} re-priced, "
+                    f"{self.counts['unchanged']} unchanged), {self.counts['pruned']} stale fingerprints dropped")
+        return self.counts
@@ -0,0 +1,220 @@
+# core/driver_pool.py
+
+"""
+This module keeps a pool of reusable Chrome WebDriver instances created by BrowserManager.
+Drivers are checked out for a route and checked back in afterwards; between routes their state is
+reset (extra tabs closed, cookies and storage cleared) instead of paying for a new Chrome process.
+"""
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from core.browser_manager import BrowserManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """Bounded pool of WebDriver instances shared by scraper threads."""
+
+    # Origins whose cookies/storage are wiped when a driver is checked back in
+    RESET_ORIGINS = ["https://www.kiwi.com"]
+
+    def __init__(self, browser_manager=None, size=2, max_uses=50):
+        """
+        Initialize the pool. Drivers are created lazily, up to `size` at a time.
+
+        :param browser_manager: BrowserManager used to create drivers (default: BrowserManager()).
+        :param size: Maximum number of live drivers.
+        :param max_uses: Recycle a driver after this many routes to bound memory growth.
+        """
+        self.browser_manager = browser_manager or BrowserManager()
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._live = 0
+        self._uses = {}
+        self._closed = False
+
+        # Startup/reuse statistics
+        self.startup_times = []
+        self.checkouts = 0
+        self.reuses = 0
+        self.replaced = 0
+        self.total_wait = 0.0
+
+    def _create(self):
+        """Start a new driver and record how long Chrome took to come up."""
+        started = time.perf_counter()
+        driver = self.browser_manager.create_driver()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.startup_times.append(elapsed)
+            self._uses[id(driver)] = 0
+        logger.info(f"Started new WebDriver in {elapsed:.2f}s ({self._live}/{self.size} live).")
+        return driver
+
+    def _discard(self, driver):
+        """Quit a driver and free its slot."""
+        BrowserManager.close_driver(driver)
+        with self._lock:
+            self._live -= 1
+            self._uses.pop(id(driver), None)
+
+    @staticmethod
+    def is_healthy(driver):
+        """Check that the browser and its chromedriver session still respond."""
+        try:
+            return bool(driver.window_handles) and driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def reset(self, driver):
+        """
+        Clear the state a route left behind: extra tabs, cookies, local/session storage.
+
+        :return: True if the driver was reset successfully.
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+
+            driver.delete_all_cookies()
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass  # Pages such as about:blank have no storage
+
+            # ✅ Wipe storage for the target site regardless of the page currently loaded
+            for origin in self.RESET_ORIGINS:
+                try:
+                    driver.execute_cdp_cmd("Storage.clearDataForOrigin",
+                                           {"origin": origin, "storageTypes": "all"})
+                except Exception:
+                    pass
+
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not reset WebDriver: {e}")
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Check out a driver, reusing an idle one or starting a new one if the pool is not full.
+
+        :param timeout: Seconds to wait for a free driver (None waits forever).
+        :return: WebDriver instance.
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+
+        started = time.perf_counter()
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = None
+
+            if driver is not None:
+                if self.is_healthy(driver):
+                    with self._lock:
+                        self.reuses += 1
+                    break
+                logger.warning("Replacing unhealthy WebDriver.")
+                with self._lock:
+                    self.replaced += 1
+                self._discard(driver)
+                continue
+
+            with self._lock:
+                can_create = self._live < self.size
+                if can_create:
+                    self._live += 1
+            if can_create:
+                try:
+                    driver = self._create()
+                except Exception:
+                    with self._lock:
+                        self._live -= 1
+                    raise
+                break
+
+            # ✅ Pool is full: wait for another thread to check a driver back in
+            remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("No WebDriver available in the pool")
+            try:
+                driver = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError("No WebDriver available in the pool")
+            self._idle.put(driver)
+
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += time.perf_counter() - started
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+        return driver
+
+    def release(self, driver):
+        """Reset a driver and return it to the pool, replacing it if it is broken or worn out."""
+        with self._lock:
+            worn_out = self._uses.get(id(driver), 0) >= self.max_uses
+
+        if self._closed or worn_out or not self.reset(driver):
+            if not self._closed and not worn_out:
+                with self._lock:
+                    self.replaced += 1
+            self._discard(driver)
+            return
+
+        self._idle.put(driver)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Context manager that acquires a driver and always releases it."""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def stats(self):
+        """Return startup and reuse statistics for comparing against one-Chrome-per-route."""
+        with self._lock:
+            started = len(self.startup_times)
+            return {
+                "drivers_started": started,
+                "avg_startup_seconds": round(sum(self.startup_times) / started, 3) if started else 0.0,
+                "total_startup_seconds": round(sum(self.startup_times), 3),
+                "checkouts": self.checkouts,
+                "reuses": self.reuses,
+                "replaced": self.replaced,
+                "avg_checkout_wait_seconds": round(self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+    def close(self):
+        """Quit every idle driver and report the pool statistics."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+        logger.info(f"Driver pool closed: {self.stats()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
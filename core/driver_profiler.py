@@ -0,0 +1,270 @@
+# core/driver_profiler.py
+
+"""
+This module profiles the WebDriver commands a scraper issues.
+
+DriverProfiler wraps driver.execute() (like WebDriverCommandCounter) and records every command
+(findElement, executeScript, clickElement, get, goBack, ...) with its wall time, the scraper
+function that issued it and the selector it used, named after its KiwiSelectors attribute.
+FlowTiming.wait_until reports its WebDriverWait polls to the profiler, so the time spent polling
+for optional elements that never appear (e.g. the pre-filled departure chip) is visible.
+
+At the end of a route print_report() ranks the hot paths and dump_folded() writes a
+flamegraph-compatible file (folded stacks, values in microseconds):
+    flamegraph.pl json_data/profiles/chicago-london.folded > profile.svg
+"""
+
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from selenium.webdriver.remote.webelement import WebElement
+
+from config.selectors import KiwiSelectors
+
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames of these files are plumbing; the caller is the first project frame outside them
+_PLUMBING_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_ROOT, "core", "timing.py"),
+                   os.path.join(PROJECT_ROOT, "core", "command_counter.py")}
+
+FIND_COMMANDS = ("findElement", "findElements", "findChildElement", "findChildElements")
+
+
+def _selector_names():
+    """Map every KiwiSelectors value to its attribute name (templates are matched by prefix)."""
+    names, templates = {}, []
+    for name, value in vars(KiwiSelectors).items():
+        if name.startswith("_"):
+            continue
+        if isinstance(value, str):
+            if "{}" in value:
+                templates.append((value.split("{}")[0], name))
+            else:
+                names.setdefault(value, name)
+        elif isinstance(value, dict):
+            for key, selector in value.items():
+                names.setdefault(selector, f"{name}[{key}]")
+    return names, templates
+
+
+_SELECTOR_NAMES, _SELECTOR_TEMPLATES = _selector_names()
+
+
+def selector_name(selector):
+    """KiwiSelectors attribute name of a selector, or the selector itself (shortened)."""
+    if selector in _SELECTOR_NAMES:
+        return _SELECTOR_NAMES[selector]
+    for prefix, name in _SELECTOR_TEMPLATES:
+        if prefix and selector.startswith(prefix):
+            return name
+    return selector if len(selector) <= 60 else selector[:57] + "..."
+
+
+def script_name(script):
+    """Name of a *_SCRIPT constant of the project holding this script, or its first words."""
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith(("core.", "config.")):
+            continue
+        for name, value in list(vars(module).items()):
+            if name.endswith("_SCRIPT") and value == script:
+                return name
+    first_line = " ".join(script.split())
+    return first_line if len(first_line) <= 40 else first_line[:37] + "..."
+
+
+def condition_name(condition):
+    """Describe a wait condition: expected_conditions factory plus its locator, or the lambda's origin."""
+    qualname = getattr(condition, "__qualname__", type(condition).__name__)
+    factory = qualname.split(".<locals>")[0]
+    for cell in getattr(condition, "__closure__", None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            continue
+        if isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], str):
+            return f"{factory}({selector_name(value[1])})"
+    code = getattr(condition, "__code__", None)
+    if factory == "<lambda>" and code is not None:
+        return f"lambda@{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+    return factory
+
+
+class DriverProfiler:
+    """Context manager recording the WebDriver commands and waits of one driver while active."""
+
+    def __init__(self, driver):
+        """
+        :param driver: Selenium WebDriver to profile (e.g. KiwiFlightScraper.driver).
+        """
+        self.driver = driver
+        self.commands = []
+        self.waits = []
+        self.folded = defaultdict(float)
+        self._element_names = {}
+        self._active_waits = []
+        self._original_execute = None
+        self._patched_instance = False
+        self._previous_profiler = None
+        self._started = None
+        self.elapsed = 0.0
+
+    def _stack(self):
+        """
+        Return (caller, stack) for the current command: the innermost project function outside the
+        plumbing, and every project frame from the outermost in (for the folded stacks).
+        """
+        frames = []
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if filename.startswith(PROJECT_ROOT) and os.sep + "site-packages" + os.sep not in filename:
+                frames.append((filename, frame.f_code.co_name))
+            frame = frame.f_back
+        caller = next((f"{os.path.splitext(os.path.basename(filename))[0]}.{function}"
+                       for filename, function in frames
+                       if filename not in _PLUMBING_FILES and filename != os.path.abspath(__file__)), "?")
+        stack = [f"{os.path.splitext(os.path.basename(filename))[0]}.{function}" for filename, function
+                 in reversed(frames) if filename != os.path.abspath(__file__)]
+        return caller, stack
+
+    def _target(self, driver_command, params):
+        params = params or {}
+        if driver_command in FIND_COMMANDS:
+            return selector_name(params.get("value", ""))
+        if "script" in params:
+            return script_name(params["script"])
+        if driver_command == "get":
+            return params.get("url", "")
+        if "id" in params:
+            return self._element_names.get(params["id"], "element")
+        return ""
+
+    def _remember_elements(self, target, response):
+        value = response.get("value") if isinstance(response, dict) else None
+        elements = value if isinstance(value, list) else [value]
+        for element in elements:
+            if isinstance(element, WebElement):
+                self._element_names[element.id] = target
+
+    def _profiled_execute(self, driver_command, params=None):
+        """Time the command, attribute it to its caller and selector, then return its response."""
+        caller, stack = self._stack()
+        target = self._target(driver_command, params)
+        started = time.perf_counter()
+        try:
+            response = self._original_execute(driver_command, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            poll = bool(self._active_waits)
+            self.commands.append({"command": driver_command, "target": target, "caller": caller,
+                                  "seconds": elapsed, "poll": poll})
+            self.folded[";".join(stack + [f"{driver_command} {target.replace(';', ',')}".strip()])] += elapsed
+            for wait in self._active_waits:
+                wait["polls"] += 1
+                wait["command_seconds"] += elapsed
+        if driver_command in FIND_COMMANDS:
+            self._remember_elements(target, response)
+        return response
+
+    @contextmanager
+    def wait(self, condition, timeout):
+        """
+        Record one FlowTiming.wait_until call; set the yielded record's "timed_out" when it times out.
+        """
+        caller, stack = self._stack()
+        record = {"caller": caller, "condition": condition_name(condition), "timeout": timeout, "polls": 0,
+                  "command_seconds": 0.0, "seconds": 0.0, "timed_out": False}
+        self._active_waits.append(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - started
+            self._active_waits.remove(record)
+            self.waits.append(record)
+            # Time between polls belongs to the wait, not to any command
+            sleeping = max(0.0, record["seconds"] - record["command_seconds"])
+            self.folded[";".join(stack + [f"wait {record['condition']}", "poll interval"])] += sleeping
+
+    def __enter__(self):
+        # Profilers and command counters may nest; remember whether execute() was already overridden
+        self._patched_instance = "execute" in vars(self.driver)
+        self._original_execute = self.driver.execute
+        self.driver.execute = self._profiled_execute
+        self._previous_profiler = getattr(self.driver, "command_profiler", None)
+        self.driver.command_profiler = self  # Lets FlowTiming.wait_until report its waits
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.elapsed += time.perf_counter() - self._started
+        if self._patched_instance:
+            self.driver.execute = self._original_execute
+        else:
+            del self.driver.execute
+        self.driver.command_profiler = self._previous_profiler
+        return False
+
+    def hot_paths(self, limit=15):
+        """Commands grouped by (caller, command, target), ranked by total wall time."""
+        groups = {}
+        for command in self.commands:
+            key = (command["caller"], command["command"], command["target"])
+            group = groups.setdefault(key, {"caller": key[0], "command": key[1], "target": key[2], "count": 0,
+                                            "polls": 0, "seconds": 0.0})
+            group["count"] += 1
+            group["polls"] += command["poll"]
+            group["seconds"] += command["seconds"]
+        return sorted(groups.values(), key=lambda group: group["seconds"], reverse=True)[:limit]
+
+    def timed_out_waits(self):
+        """Waits that ran into their timeout, grouped by (caller, condition) and ranked by total time."""
+        groups = {}
+        for wait in self.waits:
+            if not wait["timed_out"]:
+                continue
+            key = (wait["caller"], wait["condition"])
+            group = groups.setdefault(key, {"caller": key[0], "condition": key[1], "timeout": wait["timeout"],
+                                            "count": 0, "polls": 0, "seconds": 0.0})
+            group["count"] += 1
+            group["polls"] += wait["polls"]
+            group["seconds"] += wait["seconds"]
+        return sorted(groups.values(), key=lambda group: group["seconds"], reverse=True)
+
+    def print_report(self, label="", limit=15):
+        """Print the ranked hot paths and the time lost to waits that timed out."""
+        command_seconds = sum(command["seconds"] for command in self.commands)
+        wait_seconds = sum(wait["seconds"] for wait in self.waits)
+        logger.info(f"WebDriver profile{f' for {label}' if label else ''}: {len(self.commands)} commands taking "
+                    f"{command_seconds:.2f}s of {self.elapsed:.2f}s, {len(self.waits)} waits taking {wait_seconds:.2f}s")
+        for group in self.hot_paths(limit):
+            share = group["seconds"] / command_seconds if command_seconds else 0.0
+            polls = f", {group['polls']} while waiting" if group["polls"] else ""
+            logger.info(f"  {group['seconds']:7.3f}s {share:5.1%} {group['count']:4}x  {group['caller']}  "
+                        f"{group['command']} {group['target']}{polls}")
+
+        timed_out = self.timed_out_waits()
+        if timed_out:
+            lost = sum(group["seconds"] for group in timed_out)
+            logger.info(f"  Waits that timed out (optional elements): {lost:.2f}s")
+            for group in timed_out:
+                logger.info(f"  {group['seconds']:7.3f}s {group['count']:4}x  {group['caller']}  {group['condition']} "
+                            f"(timeout {group['timeout']}s, {group['polls']} polls)")
+
+    def dump_folded(self, path):
+        """Write the folded stacks ("frame;frame;command value" per line, microseconds) for flamegraph tools."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, seconds in sorted(self.folded.items()):
+                microseconds = int(seconds * 1e6)
+                if microseconds:
+                    file.write(f"{stack.replace(' ', '_')} {microseconds}\n")
+        return path
@@ -0,0 +1,136 @@
+# core/flight_stream.py
+
+"""
+This module turns a sink-driven scrape into a stream of itineraries.
+
+The scraping code hands every itinerary to a sink as soon as scrape_information() builds it.
+iter_stream() runs such a scrape in a background thread with FlightStream.put as its sink and yields
+the itineraries to the caller; astream() does the same for asyncio code. The hand-over queue is
+bounded, so the scrape pauses while the consumer is max_pending itineraries behind, and memory stays
+constant however many itineraries a route has. Leaving the loop early cancels the scrape at its next
+itinerary; an exception of the scrape is raised in the consumer.
+"""
+
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ScrapeCancelled(BaseException):
+    """
+    Raised in the scraping thread by FlightStream.put once the consumer stopped iterating.
+    A BaseException, so the `except Exception` retry and logging blocks of the card loop let it through.
+    """
+
+
+class FlightStream:
+    """Bounded hand-over of itineraries from one scraping thread to one consumer."""
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, max_pending=16):
+        """
+        :param max_pending: Itineraries buffered before the scrape waits for the consumer (0 for no limit).
+        """
+        self._queue = queue.Queue(max_pending)
+        self._cancelled = threading.Event()
+        self.error = None
+        self.count = 0
+
+    def put(self, flight_data):
+        """Sink of the scrape: queue an itinerary, waiting while the buffer is full."""
+        while True:
+            if self._cancelled.is_set():
+                raise ScrapeCancelled()
+            try:
+                self._queue.put(flight_data, timeout=self.POLL_INTERVAL)
+                self.count += 1
+                return
+            except queue.Full:
+                continue
+
+    def get(self):
+        """Next itinerary, or _DONE once the scrape finished or the stream was cancelled."""
+        while True:
+            try:
+                return self._queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if self._cancelled.is_set():
+                    return _DONE
+
+    def run(self, produce):
+        """Thread target: run produce(sink) and mark the end of the stream."""
+        try:
+            produce(self.put)
+        except ScrapeCancelled:
+            logger.info(f"Scrape cancelled by the consumer after {self.count} itineraries.")
+        except BaseException as e:
+            self.error = e
+        finally:
+            while not self._cancelled.is_set():
+                try:
+                    self._queue.put(_DONE, timeout=self.POLL_INTERVAL)
+                    break
+                except queue.Full:
+                    continue
+
+    def cancel(self):
+        """Stop the scrape at its next itinerary (no-op once it finished)."""
+        self._cancelled.set()
+
+    def start(self, produce, name="flight-stream"):
+        # The scrape runs in the caller's context, so its spans stay labelled with the caller's route
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(self.run, produce), name=name, daemon=True)
+        thread.start()
+        return thread
+
+
+def iter_stream(produce, max_pending=16, name="flight-stream"):
+    """
+    Run produce(sink) in a background thread and yield every itinerary it passes to the sink.
+
+    :param produce: Callable running a scrape that hands each itinerary to the sink it receives.
+    :param max_pending: Itineraries buffered ahead of the consumer (0 for no limit).
+    :param name: Name of the scraping thread.
+    """
+    stream = FlightStream(max_pending)
+    thread = stream.start(produce, name)
+    try:
+        while True:
+            flight_data = stream.get()
+            if flight_data is _DONE:
+                break
+            yield flight_data
+    finally:
+        stream.cancel()
+        thread.join()
+    if stream.error is not None:
+        raise stream.error
+
+
+async def astream(produce, max_pending=16, name="flight-stream"):
+    """
+    Async variant of iter_stream(): the scrape still runs in its own thread, the event loop only
+    waits for the next itinerary.
+    """
+    stream = FlightStream(max_pending)
+    thread = stream.start(produce, name)
+    try:
+        while True:
+            flight_data = await asyncio.to_thread(stream.get)
+            if flight_data is _DONE:
+                break
+            yield flight_data
+    finally:
+        stream.cancel()
+        await asyncio.to_thread(thread.join)
+    if stream.error is not None:
+        raise stream.error
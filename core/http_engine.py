@@ -0,0 +1,415 @@
+# core/http_engine.py
+
+"""
+This module searches flights over plain HTTP with asyncio, without starting Chrome.
+Every host gets a pool of keep-alive connections, so hundreds of route/date queries can run
+concurrently in one process. Responses are mapped with map_search_response(), which produces
+the same record schema as structure_flight_data(), and records go to the usual sinks
+(save_flight_data, BackgroundFlightWriter.submit, ...).
+
+The engine can be pointed at core.stub_server.ReplayServer to run against recorded payloads:
+    python -m core.http_engine --api-url http://127.0.0.1:8765/umbrella/v2/graphql?featureName={feature}
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import ssl
+import time
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from config.selectors import KiwiSelectors
+from config.save_data import save_flight_data
+from core.network_capture import map_search_response
+from core.search_url import LocationResolver, slugify
+from core.telemetry import configure_logging, span
+
+
+logger = logging.getLogger(__name__)
+
+
+# Fields read by map_search_response(); both itinerary queries select the same sector shape
+_SECTOR_FIELDS = """
+    duration
+    sectorSegments {
+      segment {
+        source { localTime station { code name city { name } } }
+        destination { localTime station { code name city { name } } }
+        code
+        duration
+        carrier { name code }
+        operatingCarrier { name code }
+      }
+    }
+"""
+
+SEARCH_QUERIES = {
+    "SearchReturnItinerariesQuery": """
+query SearchReturnItinerariesQuery($search: SearchReturnInput, $options: ItinerariesOptionsInput) {
+  returnItineraries(search: $search, options: $options) {
+    ... on Itineraries {
+      itineraries {
+        ... on ItineraryReturn {
+          id
+          price { amount formattedValue }
+          outbound {%s}
+          inbound {%s}
+        }
+      }
+    }
+  }
+}""" % (_SECTOR_FIELDS, _SECTOR_FIELDS),
+    "SearchOneWayItinerariesQuery": """
+query SearchOneWayItinerariesQuery($search: SearchOnewayInput, $options: ItinerariesOptionsInput) {
+  onewayItineraries(search: $search, options: $options) {
+    ... on Itineraries {
+      itineraries {
+        ... on ItineraryOneWay {
+          id
+          price { amount formattedValue }
+          sector {%s}
+        }
+      }
+    }
+  }
+}""" % _SECTOR_FIELDS,
+}
+
+
+class HttpError(Exception):
+    """Raised for non-2xx responses and malformed HTTP messages."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _HostPool:
+    """Keep-alive connections to one (scheme, host, port), at most `limit` open at a time."""
+
+    def __init__(self, scheme, host, port, limit, ssl_context):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._slots = asyncio.Semaphore(limit)
+        self.opened = 0
+
+    async def _connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port,
+                                             ssl=self.ssl_context if self.scheme == "https" else None)
+
+    async def request(self, method, target, headers, body):
+        """
+        Send one request, reusing an idle connection when possible.
+
+        :return: (status, headers dict with lower-case names, body bytes).
+        """
+        async with self._slots:
+            # A pooled connection may have been closed by the server meanwhile; retry once on a fresh one
+            for attempt in range(2):
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._connect()
+                try:
+                    status, response_headers, response_body, keep_alive = await _exchange(
+                        reader, writer, method, target, self.host, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise HttpError(f"Connection to {self.host} failed: {e}") from e
+                except BaseException:
+                    writer.close()  # Timeouts/cancellation leave the connection in an unknown state
+                    raise
+
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, response_headers, response_body
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+async def _exchange(reader, writer, method, target, host, headers, body):
+    """Write an HTTP/1.1 request and read the complete response."""
+    lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", "Connection: keep-alive",
+             "Accept-Encoding: gzip, deflate", f"Content-Length: {len(body)}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed before the response")
+    parts = status_line.decode("latin-1").split(" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise HttpError(f"Malformed status line: {status_line!r}")
+    status = int(parts[1])
+
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+
+    if response_headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                await reader.readline()  # Trailer terminator (trailers are not used)
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        response_body = b"".join(chunks)
+    elif "content-length" in response_headers:
+        response_body = await reader.readexactly(int(response_headers["content-length"]))
+    else:
+        response_body = await reader.read()  # Body ends when the server closes the connection
+        response_headers["connection"] = "close"
+
+    encoding = response_headers.get("content-encoding", "").lower()
+    if encoding == "gzip":
+        response_body = gzip.decompress(response_body)
+    elif encoding == "deflate":
+        response_body = zlib.decompress(response_body)
+
+    keep_alive = response_headers.get("connection", "").lower() != "close"
+    return status, response_headers, response_body, keep_alive
+
+
+class AsyncHttpClient:
+    """Minimal asyncio HTTP/1.1 client with a keep-alive connection pool per host."""
+
+    def __init__(self, limit_per_host=16, timeout=30, headers=None):
+        """
+        :param limit_per_host: Maximum open connections per host.
+        :param timeout: Seconds allowed for one request (including waiting for a free connection).
+        :param headers: Headers sent with every request.
+        """
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.requests = 0
+        self.bytes_received = 0
+        self._pools = {}
+        self._ssl_context = ssl.create_default_context()
+
+    def _pool(self, scheme, host, port):
+        key = (scheme, host, port)
+        if key not in self._pools:
+            self._pools[key] = _HostPool(scheme, host, port, self.limit_per_host, self._ssl_context)
+        return self._pools[key]
+
+    async def request(self, method, url, body=b"", headers=None):
+        """
+        :return: (status, headers, body bytes).
+        :raises HttpError: On connection failures and non-2xx responses.
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        pool = self._pool(parts.scheme, parts.hostname, port)
+
+        status, response_headers, response_body = await asyncio.wait_for(
+            pool.request(method, target, {**self.headers, **(headers or {})}, body), self.timeout)
+        self.requests += 1
+        self.bytes_received += len(response_body)
+        if not 200 <= status < 300:
+            raise HttpError(f"{method} {url} returned HTTP {status}", status)
+        return status, response_headers, response_body
+
+    async def post_json(self, url, payload, headers=None):
+        """POST a JSON payload and decode the JSON response."""
+        body = json.dumps(payload).encode("utf-8")
+        _, _, response_body = await self.request(
+            "POST", url, body, {"Content-Type": "application/json", "Accept": "application/json", **(headers or {})})
+        return json.loads(response_body)
+
+    def stats(self):
+        """Requests sent and connections opened (requests / connections shows the keep-alive reuse)."""
+        return {
+            "requests": self.requests,
+            "connections_opened": sum(pool.opened for pool in self._pools.values()),
+            "bytes_received": self.bytes_received,
+        }
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+
+class HttpSearchEngine:
+    """Runs route searches against the search API concurrently, without a browser."""
+
+    def __init__(self, sink=None, location_resolver=None, api_url=KiwiSelectors.SEARCH_API_URL,
+                 concurrency=100, limit_per_host=16, timeout=30, rate_limiter=None):
+        """
+        :param sink: Callable receiving each itinerary (default: save_flight_data).
+        :param location_resolver: LocationResolver mapping place names to location slugs.
+        :param api_url: Search endpoint with a {feature} placeholder for the query name.
+        :param concurrency: Maximum routes searched at the same time.
+        :param limit_per_host: Keep-alive connections per host.
+        :param timeout: Seconds allowed per request.
+        :param rate_limiter: Optional TokenBucket; one token is taken before each route starts.
+        """
+        self.sink = sink or save_flight_data
+        self.location_resolver = location_resolver or LocationResolver()
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.results = []
+
+    def location_id(self, name):
+        """GraphQL location id for a place name (e.g. "City:london-united-kingdom")."""
+        return f"City:{self.location_resolver.resolve(name)}"
+
+    def search_payload(self, departure, destination, departure_date, return_date=None):
+        """Return (feature name, GraphQL request body) for one route."""
+        feature = "SearchReturnItinerariesQuery" if return_date else "SearchOneWayItinerariesQuery"
+        itinerary = {
+            "source": {"ids": [self.location_id(departure)]},
+            "destination": {"ids": [self.location_id(destination)]},
+            "outboundDepartureDate": {"start": f"{departure_date}T00:00:00",
+                                      "end": f"{departure_date}T23:59:59"},
+        }
+        if return_date:
+            itinerary["inboundDepartureDate"] = {"start": f"{return_date}T00:00:00", "end": f"{return_date}T23:59:59"}
+        variables = {
+            "search": {"itinerary": itinerary, "passengers": {"adults": 1}, "cabinClass": {"cabinClass": "ECONOMY"}},
+            "options": {"sortBy": "QUALITY", "currency": "eur", "locale": "en"},
+        }
+        return feature, {"query": SEARCH_QUERIES[feature], "variables": variables}
+
+    async def _acquire_rate_limit(self):
+        """Wait for a rate-limit token without blocking the event loop."""
+        if self.rate_limiter is None:
+            return 0.0
+        started = time.monotonic()
+        while not self.rate_limiter.try_acquire():
+            await asyncio.sleep(1 / self.rate_limiter.rate / 4)
+        return time.monotonic() - started
+
+    async def search(self, client, departure, destination, departure_date, return_date=None, *_):
+        """
+        Search one route and send its itineraries to the sink.
+        Extra positional values (the form-mode month labels of a route tuple) are ignored.
+
+        :return: List of flight records.
+        """
+        search = {"departure": departure, "destination": destination,
+                  "departure_date": departure_date, "return_date": return_date}
+        # ✅ An uncached place name costs a blocking lookup; keep it off the event loop shared by every route
+        feature, payload = await asyncio.to_thread(self.search_payload, departure, destination, departure_date,
+                                                   return_date)
+        response = await client.post_json(self.api_url.format(feature=feature), payload)
+        if response.get("errors"):
+            raise HttpError(f"Search API errors: {response['errors']}")
+
+        records = map_search_response(response, search)
+        scraped_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        for flight_data in records:
+            flight_data["scraped_at"] = scraped_at
+        # ✅ The default sink writes files; hand the route's records over in a worker thread
+        await asyncio.to_thread(self._deliver, records)
+        return records
+
+    def _deliver(self, records):
+        for flight_data in records:
+            self.sink(flight_data)
+
+    async def _run_route(self, client, slots, route):
+        result = {"route": list(route[:2]), "status": "pending", "itineraries": 0, "error": None}
+        async with slots:
+            result["rate_limit_wait"] = round(await self._acquire_rate_limit(), 3)
+            started = time.monotonic()
+            try:
+                with span("route", route=f"{route[0]} -> {route[1]}"):
+                    result["itineraries"] = len(await self.search(client, *route))
+                result["status"] = "done"
+            except Exception as e:
+                result["status"] = "failed"
+                result["error"] = str(e) or type(e).__name__
+                logger.error(f"Route {tuple(route[:2])} failed: {result['error']}")
+            result["runtime"] = round(time.monotonic() - started, 3)
+        return result
+
+    async def run(self, routes):
+        """
+        Search every route concurrently over shared keep-alive connections.
+
+        :param routes: Iterable of route tuples (departure, destination, departure_date, return_date, ...).
+        :return: Run report.
+        """
+        client = AsyncHttpClient(self.limit_per_host, self.timeout)
+        slots = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+        try:
+            self.results = await asyncio.gather(*(self._run_route(client, slots, route) for route in routes))
+        finally:
+            stats = client.stats()
+            client.close()
+
+        return {
+            "wall_seconds": round(time.monotonic() - started, 3),
+            "routes": self.results,
+            "status_counts": {status: sum(1 for result in self.results if result["status"] == status)
+                              for status in sorted({result["status"] for result in self.results})},
+            "itineraries": sum(result["itineraries"] for result in self.results),
+            **stats,
+        }
+
+    def run_routes(self, routes):
+        """Blocking wrapper around run() for thread-based callers like main()."""
+        report = asyncio.run(self.run(routes))
+        self.print_report(report)
+        return report
+
+    @staticmethod
+    def print_report(report):
+        """Print a readable summary of a run report."""
+        logger.info(f"HTTP engine finished {len(report['routes'])} routes in {report['wall_seconds']}s: "
+                    f"{report['status_counts']}, {report['itineraries']} itineraries")
+        logger.info(f"{report['requests']} requests over {report['connections_opened']} connections, "
+                    f"{report['bytes_received']} bytes received")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search routes over HTTP without a browser.")
+    parser.add_argument("--api-url", default=KiwiSelectors.SEARCH_API_URL,
+                        help="Search endpoint with a {feature} placeholder (e.g. a local ReplayServer).")
+    parser.add_argument("--route", nargs="+", action="append", metavar="VALUE",
+                        help="DEPARTURE DESTINATION DEPARTURE_DATE [RETURN_DATE]; repeatable.")
+    parser.add_argument("--repeat", type=int, default=1, help="Search every route this many times.")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Count itineraries without saving them.")
+    args = parser.parse_args()
+    configure_logging()
+
+    routes = [tuple(route) for route in args.route or [("Chicago", "London", "2025-02-06", "2025-03-01")]]
+    engine = HttpSearchEngine(
+        sink=(lambda flight_data: None) if args.dry_run else None,
+        location_resolver=LocationResolver(cache_file=None, lookup=slugify) if args.dry_run else None,
+        api_url=args.api_url,
+        concurrency=args.concurrency,
+    )
+    engine.run_routes(routes * args.repeat)
+
+
+if __name__ == "__main__":
+    main()
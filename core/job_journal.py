@@ -0,0 +1,315 @@
+# core/job_journal.py
+
+"""
+This module keeps a crash-safe journal of a route list run, so a restarted run resumes instead of
+starting over. Every state change (route pending/running/done/failed, card saved) is appended as one
+JSON line and flushed before the scrape continues; replaying the file rebuilds the state after a crash.
+
+A restarted run skips routes that are done and resumes partial ones: cards recorded as saved are not
+opened again, so no itinerary is written twice. Cards handed to a BackgroundFlightWriter are only
+recorded once the writer has stored them (pass JobJournal.written as its on_written callback).
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from core.delta_index import itinerary_key
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """Append-only JSONL journal of route states and saved cards."""
+
+    def __init__(self, journal_file="json_data/job_journal.jsonl", fsync=True, deferred=False, flush=None):
+        """
+        Open the journal and replay the events of an interrupted run.
+
+        :param journal_file: JSONL file holding the events.
+        :param fsync: fsync every event (survives power loss, not only process crashes).
+        :param deferred: Records go through a BackgroundFlightWriter created with on_written=journal.written;
+                         cards are then recorded as saved only once their batch is stored.
+        :param flush: Callable blocking until every record submitted so far is stored
+                      (e.g. BackgroundFlightWriter.flush); with deferred, finish() calls it so a route is only closed once its records are written.
+                      A route finishes after its last record was submitted, so only that record and the ones
+                      queued before it are waited for.
+        """
+        self.journal_file = journal_file
+        self.fsync = fsync
+        self.deferred = deferred
+        self.flush = flush
+        self.routes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(journal_file):
+            self._replay()
+        directory = os.path.dirname(journal_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(journal_file, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write("\n")  # Terminate a line torn by a crash so new events start cleanly
+
+    def _ends_with_newline(self):
+        with open(self.journal_file, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b"\n"
+
+    @staticmethod
+    def key(route):
+        """Journal key of a route tuple (departure, destination, departure_date, return_date, ...)."""
+        return "|".join(str(value or "") for value in route[:4])
+
+    def _entry(self, key):
+        return self.routes.setdefault(key, {"status": "pending", "attempts": 0, "reason": None, "saved": set()})
+
+    def _apply(self, event):
+        entry = self._entry(event["key"])
+        if event["event"] == "saved":
+            entry["saved"].add(event["card"])
+            return
+        entry["status"] = event["status"]
+        entry["reason"] = event.get("reason")
+        if event["status"] == "running":
+            entry["attempts"] += 1
+
+    def _replay(self):
+        with open(self.journal_file, "r", encoding="utf-8") as file:
+            for line_number, line in enumerate(file, start=1):
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    # Only the last line can be torn by a crash; everything before it was flushed
+                    logger.warning(f"Ignoring damaged journal line {line_number} in {self.journal_file}")
+
+        interrupted = [key for key, entry in self.routes.items() if entry["status"] == "running"]
+        if self.routes:
+            logger.info(f"Resuming from {self.journal_file}: {self.counts()}"
+                        f"{f', {len(interrupted)} interrupted' if interrupted else ''}")
+
+    def _write(self, event):
+        """Apply an event and make it durable before returning."""
+        event["ts"] = time.time()
+        with self._lock:
+            self._apply(event)
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def add(self, route):
+        """Register a route as pending unless the journal already knows it."""
+        key = self.key(route)
+        with self._lock:
+            known = key in self.routes
+        if not known:
+            self._write({"event": "route", "key": key, "status": "pending"})
+        return key
+
+    def status(self, route):
+        with self._lock:
+            entry = self.routes.get(self.key(route))
+            return entry["status"] if entry else None
+
+    def start(self, route):
+        """Mark a route as running (increments its attempt count) and return its JournalRoute."""
+        key = self.key(route)
+        with self._lock:
+            resumed = bool(self._entry(key)["saved"])
+        self._write({"event": "route", "key": key, "status": "running"})
+        return JournalRoute(self, key, self.deferred, resumed)
+
+    def finish(self, route, error=None):
+        """
+        Mark a route as done, or failed with the error as reason.
+        Deferred records of the route still pending after flush are forgotten: the writer failed on them
+        or they were never submitted (a consumer left the stream early), so their cards stay unsaved.
+        """
+        key = self.key(route)
+        if self.deferred and self.flush is not None:
+            self.flush()
+        if error is None:
+            self._write({"event": "route", "key": key, "status": "done"})
+        else:
+            self._write({"event": "route", "key": key, "status": "failed",
+                         "reason": str(error) or type(error).__name__})
+        with self._lock:
+            dropped = [record_id for record_id, (_, pending_key, _) in self._pending.items() if pending_key == key]
+            for record_id in dropped:
+                del self._pending[record_id]
+        if dropped:
+            logger.warning(f"{key}: {len(dropped)} records were never written; their cards stay unsaved.")
+
+    def is_saved(self, key, card):
+        with self._lock:
+            return card in self._entry(key)["saved"]
+
+    def saved(self, key, card):
+        """Record that a card's itinerary is stored."""
+        self._write({"event": "saved", "key": key, "card": card})
+
+    def defer(self, record, key, card):
+        """Remember which card a record queued in a background writer belongs to."""
+        with self._lock:
+            # Keeping the record referenced guarantees its id is not reused while it is pending
+            self._pending[id(record)] = (record, key, card)
+
+    def written(self, records):
+        """BackgroundFlightWriter on_written callback: record the cards of a stored batch as saved."""
+        for record in records:
+            with self._lock:
+                pending = self._pending.get(id(record))
+                if pending and pending[0] is record:
+                    del self._pending[id(record)]
+                else:
+                    pending = None
+            if pending:
+                self.saved(pending[1], pending[2])
+
+    def counts(self):
+        with self._lock:
+            statuses = [entry["status"] for entry in self.routes.values()]
+        return {status: statuses.count(status) for status in sorted(set(statuses))}
+
+    def print_report(self):
+        """Print every route's state, attempts and failure reason."""
+        with self._lock:
+            routes = {key: dict(entry) for key, entry in self.routes.items()}
+        logger.info(f"Job journal {self.journal_file}: {self.counts()}")
+        for key, entry in routes.items():
+            reason = f" ({entry['reason']})" if entry["reason"] else ""
+            logger.info(f"  {key}: {entry['status']}{reason}, {entry['attempts']} attempts, "
+                        f"{len(entry['saved'])} cards saved")
+
+    def close(self, archive_if_complete=True):
+        """
+        Close the journal. When every route is done the file is archived, so the next run starts fresh;
+        otherwise it is kept and the next run retries what is left.
+        """
+        with self._lock:
+            self._file.close()
+            complete = bool(self.routes) and all(entry["status"] == "done" for entry in self.routes.values())
+        if archive_if_complete and complete:
+            os.replace(self.journal_file, f"{self.journal_file}.{time.strftime('%Y%m%d-%H%M%S')}.done")
+        return complete
+
+
+class JournalRoute:
+    """Journal view of one running route, used by process_all_cards to skip and record cards."""
+
+    def __init__(self, journal, key, deferred=False, resumed=False):
+        """
+        :param resumed: An earlier attempt saved cards of this route; they are skipped, so this attempt
+                        only returns the rest.
+        """
+        self.journal = journal
+        self.key = key
+        self.deferred = deferred
+        self.resumed = resumed
+
+    def is_saved(self, card):
+        """True if the card was saved by an earlier attempt of this route."""
+        return self.journal.is_saved(self.key, card)
+
+    def handled(self, flight_data):
+        """
+        Record an itinerary that is deliberately not written (e.g. unchanged in a delta run) as saved
+        right away; a deferred journal would otherwise wait for a batch that never comes.
+        """
+        self.journal.written([flight_data])
+
+    def sink(self, card, sink):
+        """
+        Wrap a sink so each itinerary is written once and recorded as saved.
+        Inside it, a delta filter should report dropped itineraries to handled().
+
+        :param card: Card fingerprint, or None to key the record by its itinerary (network results).
+        """
+        def write_once(flight_data):
+            card_key = card or itinerary_key(flight_data)
+            if self.journal.is_saved(self.key, card_key):
+                return
+            if self.deferred:
+                self.journal.defer(flight_data, self.key, card_key)
+                sink(flight_data)
+            else:
+                sink(flight_data)
+                self.journal.saved(self.key, card_key)
+        return write_once
+
+
+class _WarningCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def check_delta_run(fixture_dir="fixtures/detail_pages"):
+    """
+    Run the fixture itineraries twice through the sink chain of a delta run (delta filter inside a
+    deferred journal, BackgroundFlightWriter behind both) and check that the second, unchanged run
+    writes nothing, saves every card and leaves no record pending.
+
+    :param fixture_dir: Directory containing expected itineraries as *.json.
+    :return: True if both runs behaved as expected.
+    """
+    from core.background_writer import BackgroundFlightWriter
+    from core.delta_index import DeltaIndex
+    from core.jsonl_store import JsonlFlightStore
+
+    records = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as file:
+            records.append(json.load(file))
+    route = ("Vienna", "Barcelona", "2025-03-01", "2025-03-08")
+    warnings = _WarningCounter()
+    logger.addHandler(warnings)
+    all_ok = True
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            delta_index = DeltaIndex(os.path.join(directory, "delta_index.json"))
+            for run in ("first", "unchanged"):
+                store = JsonlFlightStore(os.path.join(directory, "segments"))
+                writer = BackgroundFlightWriter(store).start()
+                journal = JobJournal(os.path.join(directory, f"journal-{run}.jsonl"), fsync=False,
+                                     deferred=True, flush=writer.flush)
+                writer.on_written = journal.written
+                journal.add(route)
+                journal_route = journal.start(route)
+                delta = delta_index.route({"departure": route[0], "destination": route[1],
+                                           "departure_date": route[2], "return_date": route[3]})
+                for idx, flight_data in enumerate(records):
+                    card = f"{run}-card-{idx}"
+                    sink = delta.sink(card, writer.submit, on_unchanged=journal_route.handled)
+                    journal_route.sink(card, sink)(flight_data)
+                journal.finish(route)
+                writer.close()
+                store.close()
+
+                expected_written = len(records) if run == "first" else 0
+                saved = len(journal.routes[journal.key(route)]["saved"])
+                ok = (writer.records_written == expected_written and saved == len(records)
+                      and not journal._pending and not warnings.messages)
+                all_ok = all_ok and ok
+                print(f"[{'OK' if ok else 'MISMATCH'}] {run} run: {writer.records_written} written, "
+                      f"{saved}/{len(records)} cards saved, {len(journal._pending)} pending, "
+                      f"{len(warnings.messages)} warnings")
+                journal.close()
+    finally:
+        logger.removeHandler(warnings)
+    return all_ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_delta_run(sys.argv[1] if len(sys.argv) > 1 else "fixtures/detail_pages") else 1)
@@ -0,0 +1,400 @@
+# core/jsonl_store.py
+
+"""
+This module implements an append-only, newline-delimited JSON (JSONL) store for scraped flights.
+Each itinerary is written as one line in O(1); segments are rotated atomically by size or age,
+and can be compacted or exported to the legacy {"flights": [...]} JSON file.
+
+A store holds an exclusive lock on its directory (.lock) while it is open, so only one process
+appends, seals or compacts at a time; `export` only reads and works next to a running scraper.
+
+Usage:
+    python -m core.jsonl_store export [--dir json_data/flight_segments] [--output json_data/flight_results.json]
+    python -m core.jsonl_store compact [--dir json_data/flight_segments]
+    python -m core.jsonl_store import-legacy json_data/flight_results.json [--dir json_data/flight_segments]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from core.records import Itinerary
+
+
+logger = logging.getLogger(__name__)
+
+
+def _fsync_directory(directory):
+    """Persist a rename in the directory entry (no-op where directories can't be opened)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StoreLockedError(RuntimeError):
+    """The store directory is held by another process (a running scraper or a maintenance command)."""
+
+
+class DirectoryLock:
+    """Exclusive lock on a store directory shared by every process: a lock file held with flock/msvcrt."""
+
+    LOCK_FILE = ".lock"
+
+    def __init__(self, directory, timeout=10.0):
+        """
+        :param directory: Store directory.
+        :param timeout: Seconds to wait for another holder before raising StoreLockedError.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, self.LOCK_FILE)
+        self.timeout = timeout
+        self._file = None
+
+    def _try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        """Take the lock (no-op if this instance holds it already)."""
+        if self._file is not None:
+            return
+        self._file = open(self.path, "a+", encoding="utf-8")
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                self._file.close()
+                self._file = None
+                raise StoreLockedError(f"{self.directory} is in use by another process (lock file {self.path})")
+            time.sleep(0.1)
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+class JsonlFlightStore:
+    """Append-only flight store made of sealed JSONL segments plus one active segment."""
+
+    ACTIVE_SEGMENT = "active.jsonl"
+    SEGMENT_PATTERN = "segment-*.jsonl"
+
+    def __init__(self, directory="json_data/flight_segments", max_segment_bytes=64 * 1024 * 1024,
+                 max_segment_age=3600, fsync=False, lock_timeout=10.0):
+        """
+        Initialize the store.
+
+        :param directory: Directory holding the segment files.
+        :param max_segment_bytes: Rotate the active segment once it reaches this size.
+        :param max_segment_age: Rotate the active segment after this many seconds (None to disable).
+        :param fsync: fsync the active segment after every append.
+        :param lock_timeout: Seconds to wait for the directory lock held by another process.
+        :raises StoreLockedError: Another process keeps the store open.
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_size = 0
+        self._segment_opened_at = 0.0
+        self._sequence = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        # ✅ Held until close(): sealing, naming and compacting segments is only safe for one process
+        self._directory_lock = DirectoryLock(self.directory, lock_timeout)
+        self._directory_lock.acquire()
+        sealed = self._sealed_segments()
+        if sealed:
+            # segment-<timestamp>-<sequence>.jsonl: continue numbering after the newest segment
+            self._sequence = int(os.path.basename(sealed[-1])[:-len(".jsonl")].rsplit("-", 1)[1])
+
+        # ✅ A leftover active segment means the previous run stopped without closing; seal it
+        if os.path.exists(self.active_path):
+            self._seal_active()
+
+    @property
+    def active_path(self):
+        """Path of the segment currently being appended to."""
+        return os.path.join(self.directory, self.ACTIVE_SEGMENT)
+
+    def _sealed_segments(self):
+        """Return sealed segment paths in write order."""
+        return sorted(glob.glob(os.path.join(self.directory, self.SEGMENT_PATTERN)))
+
+    def _next_segment_path(self):
+        """Build a unique, sortable name for the next sealed segment."""
+        self._sequence += 1
+        timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        return os.path.join(self.directory, f"segment-{timestamp}-{self._sequence:06d}.jsonl")
+
+    def _open_active(self):
+        """Open (or reopen) the active segment for appending."""
+        self._directory_lock.acquire()  # Re-taken when the store is used again after close()
+        self._file = open(self.active_path, "a", encoding="utf-8")
+        self._segment_size = self._file.tell()
+        self._segment_opened_at = time.time()
+
+    def _seal_active(self):
+        """Close the active segment and atomically rename it into a sealed segment."""
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+        if os.path.exists(self.active_path) and os.path.getsize(self.active_path) > 0:
+            os.replace(self.active_path, self._next_segment_path())
+            _fsync_directory(self.directory)
+
+    def _should_rotate(self):
+        """Check the size and age limits of the active segment."""
+        if self._segment_size >= self.max_segment_bytes:
+            return True
+        if self.max_segment_age is not None and time.time() - self._segment_opened_at >= self.max_segment_age:
+            return True
+        return False
+
+    def append(self, record):
+        """Append a single itinerary record."""
+        self.append_many([record])
+
+    def append_many(self, records, fsync=None):
+        """
+        Append several records with a single write.
+
+        :param records: Iterable of Itinerary objects or JSON-serializable itinerary dicts.
+        :param fsync: Override the store's fsync setting for this write.
+        :return: Number of records written.
+        """
+        lines = [(record.to_json() if isinstance(record, Itinerary) else json.dumps(record, ensure_ascii=False)) + "\n"
+                 for record in records]
+        if not lines:
+            return 0
+
+        data = "".join(lines)
+        with self._lock:
+            if self._file and self._should_rotate():
+                self._seal_active()
+            if not self._file:
+                self._open_active()
+
+            # ✅ One write per batch: a crash can only leave a partial line at the very end
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync if fsync is None else fsync:
+                os.fsync(self._file.fileno())
+            self._segment_size += len(data.encode("utf-8"))
+
+        return len(lines)
+
+    def sync(self):
+        """fsync the active segment."""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Seal the active segment now."""
+        with self._lock:
+            self._seal_active()
+
+    def close(self):
+        """Flush and close the active segment (it is sealed on next open) and release the directory."""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            self._directory_lock.release()
+
+    @staticmethod
+    def _read_segment(path):
+        """Yield the records of one segment, skipping a torn trailing line."""
+        with open(path, "r", encoding="utf-8") as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {line_number} in {path}")
+
+    def iter_records(self):
+        """Yield every stored record in write order without loading the whole store into memory."""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+            paths = self._sealed_segments()
+            if os.path.exists(self.active_path):
+                paths.append(self.active_path)
+
+        for path in paths:
+            yield from self._read_segment(path)
+
+    @classmethod
+    def read_directory(cls, directory):
+        """
+        Yield the records of a store directory in write order without opening the store.
+        Nothing is sealed or renamed, so this is safe on a directory a running writer is appending to.
+        """
+        paths = sorted(glob.glob(os.path.join(directory, cls.SEGMENT_PATTERN)))
+        active_path = os.path.join(directory, cls.ACTIVE_SEGMENT)
+        if os.path.exists(active_path):
+            paths.append(active_path)
+        for path in paths:
+            yield from cls._read_segment(path)
+
+    def iter_itineraries(self):
+        """Like iter_records(), but yield compact Itinerary objects (see core.records)."""
+        for record in self.iter_records():
+            yield Itinerary.from_dict(record)
+
+    def compact(self):
+        """
+        Merge all sealed segments into a single sealed segment.
+        (Call it on an open store: the directory lock keeps other writers out meanwhile.)
+
+        :return: Number of records in the compacted segment.
+        """
+        with self._lock:
+            self._directory_lock.acquire()
+            self._seal_active()
+            segments = self._sealed_segments()
+            if len(segments) < 2:
+                return sum(1 for path in segments for _ in self._read_segment(path))
+
+            compacted_path = self._next_segment_path()
+            temp_path = compacted_path + ".tmp"
+            count = 0
+            with open(temp_path, "w", encoding="utf-8") as file:
+                for path in segments:
+                    for record in self._read_segment(path):
+                        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        count += 1
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(temp_path, compacted_path)
+            _fsync_directory(self.directory)
+            for path in segments:
+                os.remove(path)
+
+        return count
+
+    def export_legacy(self, output_file="json_data/flight_results.json"):
+        """
+        Write the legacy {"flights": [...]} file for downstream consumers.
+        The file is streamed to a temporary path and atomically renamed into place.
+
+        :param output_file: Destination of the legacy JSON file.
+        :return: Number of exported records.
+        """
+        return self.write_legacy(self.iter_records(), output_file)
+
+    @staticmethod
+    def write_legacy(records, output_file="json_data/flight_results.json"):
+        """Stream records into a legacy {"flights": [...]} file (see export_legacy())."""
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        temp_path = output_file + ".tmp"
+        count = 0
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write('{\n    "flights": [')
+            for record in records:
+                body = json.dumps(record, indent=4).replace("\n", "\n        ")
+                file.write(("," if count else "") + "\n        " + body)
+                count += 1
+            file.write("\n    ]\n}" if count else "]\n}")
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, output_file)
+        return count
+
+    def import_legacy(self, legacy_file):
+        """
+        Append every itinerary of a legacy {"flights": [...]} file to the store.
+
+        :param legacy_file: Path of the legacy JSON file.
+        :return: Number of imported records.
+        """
+        with open(legacy_file, "r", encoding="utf-8") as file:
+            records = json.load(file).get("flights", [])
+        return self.append_many(records, fsync=True)
+
+
+def main():
+    """Command-line entry point for exporting, compacting and importing the store."""
+    parser = argparse.ArgumentParser(description="Manage the append-only flight result store.")
+    parser.add_argument("--dir", default="json_data/flight_segments", help="Segment directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the legacy {\"flights\": [...]} file.")
+    export_parser.add_argument("--output", default="json_data/flight_results.json")
+    commands.add_parser("compact", help="Merge sealed segments into one.")
+    import_parser = commands.add_parser("import-legacy", help="Append a legacy JSON file to the store.")
+    import_parser.add_argument("legacy_file")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        # ✅ Read-only: a scraper may be appending to this store right now
+        count = JsonlFlightStore.write_legacy(JsonlFlightStore.read_directory(args.dir), args.output)
+        print(f"[SUCCESS] Exported {count} flights to {args.output}")
+        return 0
+
+    try:
+        store = JsonlFlightStore(args.dir)
+    except StoreLockedError as e:
+        print(f"[ERROR] {e}; stop the scraper writing to it first.")
+        return 1
+    try:
+        if args.command == "compact":
+            count = store.compact()
+            print(f"[SUCCESS] Compacted store into {count} flights")
+        else:
+            count = store.import_legacy(args.legacy_file)
+            print(f"[SUCCESS] Imported {count} flights from {args.legacy_file}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+# core/lease_queue.py
+
+"""
+This module shares a route queue between scraper workers on several processes or hosts.
+Workers claim routes with a time-limited lease and extend it with heartbeats while they scrape;
+a lease that expires (crashed or stuck worker) puts the route back on the queue. Results and
+per-worker throughput are stored next to the jobs.
+
+The backend is a SQLite file in WAL mode, so it runs anywhere the file can be shared
+(one box with several worker processes, or a network filesystem with proper locking).
+
+Usage:
+    python -m core.lease_queue status json_data/job_queue.db
+    python -m core.lease_queue requeue-expired json_data/job_queue.db
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.telemetry import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    route TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    error TEXT,
+    result TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL,
+    last_heartbeat REAL,
+    jobs_done INTEGER NOT NULL DEFAULT 0,
+    jobs_failed INTEGER NOT NULL DEFAULT 0,
+    itineraries INTEGER NOT NULL DEFAULT 0,
+    busy_seconds REAL NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_jobs_route ON jobs (route, status);
+"""
+
+
+class LeaseQueue:
+    """SQLite-backed job queue with leases; every process opens its own LeaseQueue on the same file."""
+
+    def __init__(self, path="json_data/job_queue.db", lease_seconds=300):
+        """
+        :param path: SQLite database file shared by the coordinator and the workers.
+        :param lease_seconds: How long a claim stays valid without a heartbeat.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def _transaction(self, work):
+        """Run work(connection) in an IMMEDIATE transaction (one writer across all processes)."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._connection)
+                self._connection.execute("COMMIT")
+                return result
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    # ------------------------------------------------------------------ coordinator
+
+    def enqueue(self, route, priority=0, options=None, max_attempts=3):
+        """
+        Add a route unless it already has a pending, leased or done job (a restarted coordinator
+        must not scrape its routes twice); failed routes get a new job.
+
+        :return: (job id, True if the job was created or False if an existing job was kept).
+        """
+        route_json = json.dumps(list(route))
+
+        def work(db):
+            existing = db.execute("SELECT id FROM jobs WHERE route = ? AND status IN ('pending', 'leased', 'done')"
+                                  " ORDER BY id LIMIT 1", (route_json,)).fetchone()
+            if existing:
+                return existing["id"], False
+            return db.execute(
+                "INSERT INTO jobs (route, options, priority, max_attempts, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (route_json, json.dumps(options or {}), priority, max_attempts, time.time()),
+            ).lastrowid, True
+        return self._transaction(work)
+
+    def requeue_expired(self):
+        """Put routes whose lease expired back on the queue; returns how many were requeued."""
+        return self._transaction(self._requeue_expired)
+
+    @staticmethod
+    def _requeue_expired(db):
+        now = time.time()
+        # Out of attempts: the route failed for good
+        db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', finished_at = ?, worker_id = NULL"
+                   " WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+        return db.execute("UPDATE jobs SET status = 'pending', worker_id = NULL, lease_expires = NULL"
+                          " WHERE status = 'leased' AND lease_expires < ?", (now,)).rowcount
+
+    # ------------------------------------------------------------------ workers
+
+    def register_worker(self, worker_id):
+        now = time.time()
+        self._transaction(lambda db: db.execute(
+            "INSERT OR REPLACE INTO workers (worker_id, host, pid, started_at, last_heartbeat) VALUES (?, ?, ?, ?, ?)",
+            (worker_id, socket.gethostname(), os.getpid(), now, now)))
+
+    def claim(self, worker_id):
+        """
+        Lease the next route (highest priority first).
+
+        :return: (job id, route tuple, options dict), or None if nothing is pending.
+        """
+        def work(db):
+            self._requeue_expired(db)
+            row = db.execute("SELECT id, route, options FROM jobs WHERE status = 'pending'"
+                             " ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            db.execute("UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1,"
+                       " started_at = ? WHERE id = ?", (worker_id, now + self.lease_seconds, now, row["id"]))
+            db.execute("UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?", (now, worker_id))
+            return row["id"], tuple(json.loads(row["route"])), json.loads(row["options"])
+        return self._transaction(work)
+
+    def heartbeat(self, job_id, worker_id):
+        """
+        Extend a lease.
+
+        :return: False if the lease was lost (expired and re-claimed); the worker should stop reporting.
+        """
+        def work(db):
+            now = time.time()
+            db.execute("UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?", (now, worker_id))
+            return db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                              (now + self.lease_seconds, job_id, worker_id)).rowcount == 1
+        return self._transaction(work)
+
+    def complete(self, job_id, worker_id, result=None, busy_seconds=0.0):
+        """Mark a leased job as done; returns False if the lease had been lost."""
+        def work(db):
+            updated = db.execute("UPDATE jobs SET status = 'done', result = ?, finished_at = ?, lease_expires = NULL"
+                                 " WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                                 (json.dumps(result), time.time(), job_id, worker_id)).rowcount == 1
+            if updated:
+                db.execute("UPDATE workers SET jobs_done = jobs_done + 1, itineraries = itineraries + ?,"
+                           " busy_seconds = busy_seconds + ? WHERE worker_id = ?",
+                           ((result or {}).get("itineraries", 0), busy_seconds, worker_id))
+            return updated
+        return self._transaction(work)
+
+    def fail(self, job_id, worker_id, error, busy_seconds=0.0):
+        """Release a failed job: back to pending while attempts remain, failed otherwise."""
+        def work(db):
+            row = db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ?"
+                             " AND status = 'leased'", (job_id, worker_id)).fetchone()
+            if row is None:
+                return False
+            if row["attempts"] < row["max_attempts"]:
+                db.execute("UPDATE jobs SET status = 'pending', worker_id = NULL, lease_expires = NULL, error = ?"
+                           " WHERE id = ?", (error, job_id))
+            else:
+                db.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires = NULL"
+                           " WHERE id = ?", (error, time.time(), job_id))
+            db.execute("UPDATE workers SET jobs_failed = jobs_failed + 1, busy_seconds = busy_seconds + ?"
+                       " WHERE worker_id = ?", (busy_seconds, worker_id))
+            return True
+        return self._transaction(work)
+
+    # ------------------------------------------------------------------ reporting
+
+    def counts(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def is_drained(self):
+        """True when no job is pending or leased."""
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
+
+    def report(self):
+        """Job counts, per-job results and per-worker throughput."""
+        with self._lock:
+            jobs = [dict(row) for row in self._connection.execute(
+                "SELECT id, route, status, worker_id, attempts, error, result, started_at, finished_at FROM jobs"
+                " ORDER BY id")]
+            workers = [dict(row) for row in self._connection.execute("SELECT * FROM workers ORDER BY worker_id")]
+
+        now = time.time()
+        for worker in workers:
+            elapsed = max((worker["last_heartbeat"] or now) - (worker["started_at"] or now), 1e-9)
+            worker["routes_per_hour"] = round(worker["jobs_done"] * 3600 / elapsed, 2)
+            worker["itineraries_per_hour"] = round(worker["itineraries"] * 3600 / elapsed, 2)
+            worker["utilization"] = round(min(1.0, worker["busy_seconds"] / elapsed), 3)
+        for job in jobs:
+            job["route"] = json.loads(job["route"])
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+        return {"counts": self.counts(), "jobs": jobs, "workers": workers}
+
+    @staticmethod
+    def print_report(report):
+        logger.info(f"Job queue: {report['counts']}")
+        for job in report["jobs"]:
+            outcome = job["error"] if job["status"] == "failed" else (job["result"] or {}).get("itineraries", "-")
+            logger.info(f"  #{job['id']} {job['route'][0]} -> {job['route'][1]}: {job['status']} "
+                        f"({job['attempts']} attempts, worker {job['worker_id']}): {outcome}")
+        for worker in report["workers"]:
+            logger.info(f"  worker {worker['worker_id']} ({worker['host']}, pid {worker['pid']}): "
+                        f"{worker['jobs_done']} done, {worker['jobs_failed']} failed, "
+                        f"{worker['routes_per_hour']} routes/h, {worker['itineraries_per_hour']} itineraries/h, "
+                        f"utilization {worker['utilization']}")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class LeaseWorker:
+    """Claims routes from a LeaseQueue and runs them, heartbeating while each route runs."""
+
+    def __init__(self, lease_queue, worker_fn, worker_id=None, heartbeat_interval=None, poll_interval=2.0):
+        """
+        :param lease_queue: LeaseQueue opened by this process.
+        :param worker_fn: Callable invoked as worker_fn(*route, **options) returning the number of itineraries
+                          (e.g. run_scraper) or the itineraries themselves.
+        :param worker_id: Unique name of this worker (default: host-pid-random).
+        :param heartbeat_interval: Seconds between heartbeats (default: a third of the lease).
+        :param poll_interval: Seconds to wait when nothing is pending but leased routes may come back.
+        """
+        self.queue = lease_queue
+        self.worker_fn = worker_fn
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval or lease_queue.lease_seconds / 3
+        self.poll_interval = poll_interval
+
+    def _heartbeat(self, job_id, done):
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if not self.queue.heartbeat(job_id, self.worker_id):
+                    logger.warning(f"Worker {self.worker_id} lost the lease on job #{job_id}.")
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job #{job_id} failed: {e}")
+
+    def run_one(self):
+        """
+        Claim and run one route.
+
+        :return: False if nothing was pending.
+        """
+        claimed = self.queue.claim(self.worker_id)
+        if claimed is None:
+            return False
+
+        job_id, route, options = claimed
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True)
+        heartbeat.start()
+        started = time.monotonic()
+        try:
+            result = self.worker_fn(*route, **options)
+            itineraries = result if isinstance(result, int) else len(result or [])
+            self.queue.complete(job_id, self.worker_id, {"itineraries": itineraries},
+                                busy_seconds=time.monotonic() - started)
+        except Exception as e:
+            logger.exception(f"Route {route[:2]} failed on {self.worker_id}")
+            self.queue.fail(job_id, self.worker_id, str(e) or type(e).__name__,
+                            busy_seconds=time.monotonic() - started)
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def run(self, stop_when_drained=True):
+        """Process routes until the queue is drained (or forever if stop_when_drained is False)."""
+        self.queue.register_worker(self.worker_id)
+        logger.info(f"Worker {self.worker_id} started on {self.queue.path}")
+        while True:
+            if self.run_one():
+                continue
+            if stop_when_drained and self.queue.is_drained():
+                break
+            time.sleep(self.poll_interval)  # Leased routes may still come back if their worker dies
+        logger.info(f"Worker {self.worker_id} finished: queue {self.queue.counts()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or maintain the shared route queue.")
+    parser.add_argument("command", choices=["status", "requeue-expired"])
+    parser.add_argument("path", nargs="?", default="json_data/job_queue.db")
+    args = parser.parse_args()
+    configure_logging()
+
+    lease_queue = LeaseQueue(args.path)
+    if args.command == "requeue-expired":
+        logger.info(f"Requeued {lease_queue.requeue_expired()} routes with expired leases.")
+    LeaseQueue.print_report(lease_queue.report())
+    lease_queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# core/network_capture.py
+
+"""
+This module captures search results from the network instead of scraping the DOM.
+Chrome's performance log (enabled by BrowserManager(capture_network=True)) records every response;
+the search API responses are fetched with Network.getResponseBody and mapped to the same flight
+record schema that structure_flight_data() produces, so one page load yields every itinerary.
+
+Run as a module, it checks the capture end to end against a recorded results page:
+    python -m core.network_capture fixtures/network
+"""
+
+import base64
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from config.selectors import KiwiSelectors
+from config.save_data import build_flight_data
+from core.records import Itinerary
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds):
+    """Format a duration in seconds like the detail page does ("7h 40m")."""
+    if seconds is None:
+        return None
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return f"{hours}h {minutes}m" if hours else f"{minutes}m"
+
+
+def _split_local_time(local_time):
+    """Split "2025-02-10T19:30:00" into ("19:30", "Mon, 10 Feb")."""
+    if not local_time:
+        return None, None
+    moment = datetime.fromisoformat(local_time.replace("Z", ""))
+    return moment.strftime("%H:%M"), f"{moment.strftime('%a')}, {moment.day} {moment.strftime('%b')}"
+
+
+def _endpoint_values(endpoint):
+    """Return (time, date, location, airport, city) of a segment's source or destination."""
+    endpoint = endpoint or {}
+    station = endpoint.get("station") or {}
+    city = (station.get("city") or {}).get("name")
+    clock, date = _split_local_time(endpoint.get("localTime"))
+    location = f"{city} ∙ {station.get('code')}" if city and station.get("code") else city
+    return clock, date, location, station.get("name"), city
+
+
+def _carrier_flight_number(segment):
+    """Build "AY 5760" from the carrier code and the segment's flight code."""
+    code = segment.get("code")
+    carrier_code = (segment.get("carrier") or {}).get("code")
+    if code and carrier_code and not str(code).startswith(carrier_code):
+        return f"{carrier_code} {code}"
+    return code
+
+
+def _sector_to_raw_parent(sector):
+    """Convert one API sector (outbound or inbound) into build_flight_data()'s raw parent shape."""
+    segments = [item.get("segment") or {} for item in sector.get("sectorSegments") or []]
+    if not segments:
+        return {"error": "sector has no segments"}
+
+    boxes = []
+    for segment in segments:
+        dep_time, dep_date, dep_location, dep_airport, _ = _endpoint_values(segment.get("source"))
+        arr_time, arr_date, arr_location, arr_airport, _ = _endpoint_values(segment.get("destination"))
+        info = {key: None for key in KiwiSelectors.FLIGHT_INFO_TEMPLATE}
+        info["Airline"] = (segment.get("carrier") or {}).get("name")
+        info["Operating Airline"] = (segment.get("operatingCarrier") or segment.get("carrier") or {}).get("name")
+        info["Flight Number"] = _carrier_flight_number(segment)
+        boxes.append({
+            "info": info,
+            "times": {
+                "Departure Time": dep_time, "Departure Date": dep_date,
+                "Departure Location": dep_location, "Departure Airport": dep_airport,
+                "Arrival Time": arr_time, "Arrival Date": arr_date,
+                "Arrival Location": arr_location, "Arrival Airport": arr_airport,
+            },
+        })
+
+    departure_city = _endpoint_values(segments[0].get("source"))[4]
+    arrival_city = _endpoint_values(segments[-1].get("destination"))[4]
+    return {
+        "departure_root": departure_city or "N/A",
+        "arrival_root": arrival_city or "N/A",
+        "total_duration": format_duration(sector.get("duration")),
+        "boxes": boxes,
+    }
+
+
+def _format_price(price):
+    """Render an API price object the way result cards show it."""
+    price = price or {}
+    if price.get("formattedValue"):
+        return price["formattedValue"]
+    if price.get("amount") is None:
+        return "Not Available"
+    currency = price.get("currency") or ""
+    return f"{price['amount']} {currency}".strip()
+
+
+def map_search_response(payload, search=None):
+    """
+    Map a recorded/captured search API response to flight records.
+
+    The payload follows the GraphQL search response shape:
+    data.{returnItineraries|onewayItineraries}.itineraries[] with price, outbound/inbound (or sector),
+    each holding duration and sectorSegments[].segment{source, destination, code, carrier, operatingCarrier}.
+
+    :param payload: Decoded JSON response body.
+    :param search: Search parameters stored with every record.
+    :return: List of flight records.
+    """
+    data = (payload or {}).get("data") or {}
+    container = data.get("returnItineraries") or data.get("onewayItineraries") or {}
+    records = []
+
+    for itinerary in container.get("itineraries") or []:
+        sectors = [sector for sector in (itinerary.get("outbound") or itinerary.get("sector"),
+                                         itinerary.get("inbound")) if sector]
+        flight_data = build_flight_data([_sector_to_raw_parent(sector) for sector in sectors], len(sectors),
+                                        verbose=False)
+        if not flight_data["flights"]:
+            continue
+        flight_data["price"] = _format_price(itinerary.get("price"))
+        if search is not None:
+            flight_data["search"] = search
+        records.append(flight_data)
+
+    return records
+
+
+class NetworkCapture:
+    """Reads search API responses out of Chrome's performance log."""
+
+    def __init__(self, driver, url_pattern=KiwiSelectors.SEARCH_API_PATTERN):
+        """
+        :param driver: WebDriver created with BrowserManager(capture_network=True).
+        :param url_pattern: Regex matching the URLs of search result responses.
+        """
+        self.driver = driver
+        self.url_pattern = re.compile(url_pattern)
+        self._pending = {}
+
+    def reset(self):
+        """Discard log entries recorded so far (call before navigating to a new search)."""
+        self.driver.get_log("performance")
+        self._pending.clear()
+
+    def drain(self):
+        """
+        Consume the performance log and return the bodies of finished matching responses.
+
+        :return: List of (url, decoded JSON body) tuples.
+        """
+        responses = []
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+
+            if method == "Network.responseReceived":
+                url = params.get("response", {}).get("url", "")
+                if self.url_pattern.search(url):
+                    self._pending[params["requestId"]] = url
+
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                url = self._pending.pop(params["requestId"])
+                try:
+                    body = self.driver.execute_cdp_cmd("Network.getResponseBody",
+                                                       {"requestId": params["requestId"]})
+                    text = base64.b64decode(body["body"]).decode("utf-8") if body.get("base64Encoded") \
+                        else body["body"]
+                    responses.append((url, json.loads(text)))
+                except Exception as e:
+                    logger.warning(f"Could not read response body of {url}: {e}")
+
+        return responses
+
+    def wait_for_responses(self, timeout=30, settle=2.0, poll_interval=0.25):
+        """
+        Collect matching responses until none arrived for `settle` seconds (or the timeout expires).
+
+        :return: List of (url, decoded JSON body) tuples.
+        """
+        responses = []
+        deadline = time.monotonic() + timeout
+        last_response_at = None
+        while time.monotonic() < deadline:
+            new_responses = self.drain()
+            if new_responses:
+                responses.extend(new_responses)
+                last_response_at = time.monotonic()
+            elif last_response_at is not None and time.monotonic() - last_response_at >= settle:
+                break
+            time.sleep(poll_interval)
+        return responses
+
+    def collect_itineraries(self, search=None, timeout=30):
+        """
+        Wait for the search responses of the current page and map them to flight records.
+
+        :return: List of flight records (empty if nothing was captured).
+        """
+        records = []
+        for url, payload in self.wait_for_responses(timeout):
+            records.extend(map_search_response(payload, search))
+        return records
+
+
+def check_capture(fixture_dir="fixtures/network", timeout=30, headless=True):
+    """
+    Load the recorded results page of a fixture directory from a ReplayServer in Chrome with
+    capture_network=True and compare the captured itineraries with the recorded API response.
+
+    :param fixture_dir: Directory with results.html, the recorded response and their routes.json.
+    :param timeout: Seconds to wait for the search responses.
+    :param headless: Run Chrome headless.
+    :return: True if the captured records match the records mapped from the recorded response.
+    """
+    from core.browser_manager import BrowserManager
+    from core.stub_server import ReplayServer
+
+    with ReplayServer(fixture_dir) as server:
+        response_file = server.resolve("/umbrella/v2/graphql")
+        with open(os.path.join(fixture_dir, response_file), "r", encoding="utf-8") as file:
+            expected = [Itinerary.coerce(record).to_dict() for record in map_search_response(json.load(file))]
+
+        driver = BrowserManager(headless=headless, capture_network=True).create_driver()
+        try:
+            capture = NetworkCapture(driver)
+            capture.reset()
+            start = time.perf_counter()
+            driver.get(f"{server.base_url}/")
+            captured = [Itinerary.coerce(record).to_dict() for record in capture.collect_itineraries(timeout=timeout)]
+            elapsed = time.perf_counter() - start
+        finally:
+            BrowserManager.close_driver(driver)
+
+    ok = bool(expected) and captured == expected
+    print(f"[{'OK' if ok else 'MISMATCH'}] {fixture_dir}: {len(captured)} of {len(expected)} itineraries captured "
+          f"in {elapsed:.1f} s")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_capture(sys.argv[1] if len(sys.argv) > 1 else "fixtures/network") else 1)
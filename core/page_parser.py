@@ -0,0 +1,151 @@
+# core/page_parser.py
+
+"""
+This module parses flight detail pages offline from their HTML (driver.page_source) with lxml.
+The KiwiSelectors XPaths are compiled once at import, so parsing is pure CPU work that can run
+in a process pool, independently of the browsers that produced the HTML.
+
+Run `python -m core.page_parser fixtures/detail_pages` to check the parser against the saved
+fixture pages (and their expected .json output) without network access.
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree, html as lxml_html
+
+from config.selectors import KiwiSelectors
+from config.save_data import build_flight_data
+
+
+# ✅ Compile every selector once; etree.XPath objects are reusable across documents
+PARENTS_XPATH = etree.XPath(KiwiSelectors.FLIGHT_DETAILS_PARENT)
+DEPARTURE_ROOT_XPATH = etree.XPath(KiwiSelectors.DEPARTURE_ROOT)
+ARRIVAL_ROOT_XPATH = etree.XPath(KiwiSelectors.ARRIVAL_ROOT)
+TOTAL_DURATION_XPATH = etree.XPath(KiwiSelectors.TOTAL_DURATION)
+INFO_BOXES_XPATH = etree.XPath(KiwiSelectors.INFO_BOXES)
+FLIGHT_INFO_XPATHS = {key: etree.XPath(xpath) for key, xpath in KiwiSelectors.FLIGHT_INFO_TEMPLATE.items()}
+TIME_XPATHS = {key: etree.XPath(xpath) for key, xpath in KiwiSelectors.TIME_SELECTORS.items()}
+
+
+def _text(compiled_xpath, context):
+    """Return the whitespace-normalized text of the first match, or None if nothing matches."""
+    matches = compiled_xpath(context)
+    if not matches:
+        return None
+    # Collapse whitespace the way the browser's innerText does for inline content
+    return " ".join(matches[0].text_content().split())
+
+
+def _read_parent(parent):
+    """Read the raw values of one departure/return parent element."""
+    departure_root = _text(DEPARTURE_ROOT_XPATH, parent)
+    arrival_root = _text(ARRIVAL_ROOT_XPATH, parent)
+    if departure_root is None or arrival_root is None:
+        missing = KiwiSelectors.DEPARTURE_ROOT if departure_root is None else KiwiSelectors.ARRIVAL_ROOT
+        return {"error": f"no such element: Unable to locate element: {missing}"}
+
+    boxes = []
+    for box in INFO_BOXES_XPATH(parent):
+        boxes.append({
+            "info": {key: _text(xpath, box) for key, xpath in FLIGHT_INFO_XPATHS.items()},
+            "times": {key: _text(xpath, box) for key, xpath in TIME_XPATHS.items()},
+        })
+
+    return {
+        "departure_root": departure_root,
+        "arrival_root": arrival_root,
+        "total_duration": _text(TOTAL_DURATION_XPATH, parent),
+        "boxes": boxes,
+    }
+
+
+def parse_flight_details(page_source, verbose=False):
+    """
+    Parse a flight detail page into the same Itinerary that structure_flight_data() produces.
+
+    :param page_source: HTML of the detail page (e.g. driver.page_source).
+    :param verbose: Print the structured data like the live extraction does.
+    :return: Itinerary, or None if the page has no flight details.
+    """
+    document = lxml_html.fromstring(page_source)
+    parents = PARENTS_XPATH(document)
+    if not parents:
+        return None
+
+    raw_parents = [_read_parent(parent) for parent in parents[:2]]
+    return build_flight_data(raw_parents, len(parents), verbose=verbose)
+
+
+class ParserPool:
+    """Process pool that parses detail pages away from the scraper threads driving the browsers."""
+
+    def __init__(self, workers=None):
+        """
+        Initialize the parser pool.
+
+        :param workers: Number of parser processes (default: number of CPUs).
+        """
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, page_source):
+        """Queue a page for parsing and return a Future with the structured flight data."""
+        return self.executor.submit(parse_flight_details, page_source)
+
+    def parse(self, page_source):
+        """Parse a page in a worker process and wait for the result."""
+        return self.submit(page_source).result()
+
+    def map(self, page_sources, chunksize=1):
+        """Parse many pages in parallel, yielding results in input order."""
+        return self.executor.map(parse_flight_details, page_sources, chunksize=chunksize)
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+def check_fixtures(fixture_dir, repeat=100):
+    """
+    Parse every saved page in a fixture directory, compare it with the expected .json next to it
+    and report the average parse time.
+
+    :param fixture_dir: Directory containing *.html pages (and optional *.json expectations).
+    :param repeat: Number of timed parses per page.
+    :return: True if every page with an expectation matched.
+    """
+    all_ok = True
+    for page_path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(page_path, "r", encoding="utf-8") as file:
+            page_source = file.read()
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            flight_data = parse_flight_details(page_source)
+        elapsed_us = (time.perf_counter() - start) / repeat * 1e6
+
+        expected_path = os.path.splitext(page_path)[0] + ".json"
+        if os.path.exists(expected_path):
+            with open(expected_path, "r", encoding="utf-8") as file:
+                status = "OK" if flight_data is not None and json.load(file) == flight_data.to_dict() else "MISMATCH"
+        else:
+            status = "NO EXPECTATION"
+        all_ok = all_ok and status != "MISMATCH"
+
+        print(f"[{status}] {os.path.basename(page_path)}: {elapsed_us:.0f} µs per parse")
+
+    return all_ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_fixtures(sys.argv[1] if len(sys.argv) > 1 else "fixtures/detail_pages") else 1)
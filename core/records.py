@@ -0,0 +1,354 @@
+# core/records.py
+
+"""
+This module defines the in-memory types of a scraped itinerary: Itinerary -> Leg -> Stop, with the
+FlightDetails and SeatingInfo of every flown segment.
+
+The classes use __slots__ (no per-instance __dict__) and intern their repeated strings (airports,
+airlines, cities, times, "N/A", ...), so a million loaded itineraries share one copy of each value.
+to_dict() reproduces the JSON record of build_flight_data() key for key, and from_dict() reads it back,
+so the stored format does not change. For code written against the dict records, Itinerary also
+supports item access on its top-level fields (record["price"], record.get("search"), record.update(...)).
+Top-level fields can be replaced that way, but nested values are read-only: record["flights"] and
+record["search"] return read-only views, so record["flights"][0]["price"] = x raises a TypeError
+instead of silently changing nothing. Edit legs through record.flights.
+"""
+
+import json
+import sys
+from types import MappingProxyType
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# JSON keys of the flight_details fields (from KiwiSelectors.FLIGHT_INFO_TEMPLATE) and their attributes
+DETAIL_FIELDS = (("airline", "airline"), ("operating_airline", "operating_airline"),
+                 ("flight_number", "flight_number"), ("audio_video_on_demand", "audio_video_on_demand"))
+SEATING_FIELDS = (("seat_pitch", "seat_pitch"), ("seat_width", "seat_width"), ("seat_recline", "seat_recline"),
+                  ("in-seat_power", "in_seat_power"), ("wi-fi_on_board", "wi_fi_on_board"))
+# Template order, which decides the key order of flight_details
+FLIGHT_DETAILS_ORDER = ("airline", "operating_airline", "flight_number", "seat_pitch", "seat_width",
+                        "seat_recline", "audio_video_on_demand", "in-seat_power", "wi-fi_on_board")
+TIME_FIELDS = ("time", "date", "location", "airport")
+
+# Attribute of every flight_details / seating_info JSON key
+DETAIL_ATTRIBUTES = dict(DETAIL_FIELDS)
+SEATING_ATTRIBUTES = dict(SEATING_FIELDS)
+
+def _frozen(value):
+    """Read-only view of a JSON value: dicts become mappingproxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+# Records of one search share its parameters (read-only, as the mapping is shared by every such record)
+_SHARED_SEARCHES = {}
+_MAX_SHARED_SEARCHES = 10_000
+
+
+def _shared_search(search):
+    """Return a read-only mapping of the search parameters, shared by every record with equal ones."""
+    if search is None:
+        return None
+    try:
+        key = tuple(search.items())
+        shared = _SHARED_SEARCHES.get(key)
+    except TypeError:  # Unhashable values
+        return _frozen(dict(search))
+    if shared is None:
+        shared = MappingProxyType({_intern(name): _intern(value) for name, value in search.items()})
+        if len(_SHARED_SEARCHES) < _MAX_SHARED_SEARCHES:
+            _SHARED_SEARCHES[key] = shared
+    return shared
+
+
+class SeatingInfo:
+    """
+    Seating fields of one flown segment.
+    None means the detail page has no such row; it is stored as "N/A" next to seating_info, like
+    build_flight_data() does.
+    """
+
+    __slots__ = ("seat_pitch", "seat_width", "seat_recline", "in_seat_power", "wi_fi_on_board")
+
+    def __init__(self, seat_pitch=None, seat_width=None, seat_recline=None, in_seat_power=None, wi_fi_on_board=None):
+        self.seat_pitch = _intern(seat_pitch)
+        self.seat_width = _intern(seat_width)
+        self.seat_recline = _intern(seat_recline)
+        self.in_seat_power = _intern(in_seat_power)
+        self.wi_fi_on_board = _intern(wi_fi_on_board)
+
+    def to_dict(self):
+        """The seating_info dict: only the rows the page has."""
+        return {key: getattr(self, attribute) for key, attribute in SEATING_FIELDS
+                if getattr(self, attribute) is not None}
+
+    def __eq__(self, other):
+        return isinstance(other, SeatingInfo) and all(getattr(self, name) == getattr(other, name)
+                                                      for name in self.__slots__)
+
+    def __repr__(self):
+        return f"SeatingInfo({self.to_dict()!r})"
+
+
+class FlightDetails:
+    """Airline, flight number and seating of one flown segment (None: field not in the record)."""
+
+    __slots__ = ("airline", "operating_airline", "flight_number", "audio_video_on_demand", "seating_info")
+
+    def __init__(self, airline=None, operating_airline=None, flight_number=None, audio_video_on_demand=None,
+                 seating_info=None):
+        self.airline = _intern(airline)
+        self.operating_airline = _intern(operating_airline)
+        self.flight_number = _intern(flight_number)
+        self.audio_video_on_demand = _intern(audio_video_on_demand)
+        self.seating_info = seating_info if seating_info is not None else SeatingInfo()
+
+    @classmethod
+    def from_dict(cls, data):
+        seating = data.get("seating_info") or {}
+        seating_info = SeatingInfo(**{attribute: seating.get(key) for key, attribute in SEATING_FIELDS})
+        return cls(data.get("airline"), data.get("operating_airline"), data.get("flight_number"),
+                   data.get("audio_video_on_demand"), seating_info)
+
+    def to_dict(self):
+        details = {"seating_info": self.seating_info.to_dict()}
+        for key in FLIGHT_DETAILS_ORDER:
+            if key in SEATING_ATTRIBUTES:
+                if getattr(self.seating_info, SEATING_ATTRIBUTES[key]) is None:
+                    details[key] = "N/A"  # Row missing on the page
+            else:
+                value = getattr(self, DETAIL_ATTRIBUTES[key])
+                if value is not None:
+                    details[key] = value
+        return details
+
+    def __eq__(self, other):
+        return isinstance(other, FlightDetails) and all(getattr(self, name) == getattr(other, name)
+                                                        for name in self.__slots__)
+
+    def __repr__(self):
+        return f"FlightDetails({self.to_dict()!r})"
+
+
+class Stop:
+    """One flown segment of a multi-stop leg."""
+
+    __slots__ = ("stop_number", "departure_time", "departure_date", "departure_location", "departure_airport",
+                 "arrival_time", "arrival_date", "arrival_location", "arrival_airport", "flight_details")
+
+    def __init__(self, stop_number, departure_time=None, departure_date=None, departure_location=None,
+                 departure_airport=None, arrival_time=None, arrival_date=None, arrival_location=None,
+                 arrival_airport=None, flight_details=None):
+        self.stop_number = stop_number
+        self.departure_time = _intern(departure_time)
+        self.departure_date = _intern(departure_date)
+        self.departure_location = _intern(departure_location)
+        self.departure_airport = _intern(departure_airport)
+        self.arrival_time = _intern(arrival_time)
+        self.arrival_date = _intern(arrival_date)
+        self.arrival_location = _intern(arrival_location)
+        self.arrival_airport = _intern(arrival_airport)
+        self.flight_details = flight_details if flight_details is not None else FlightDetails()
+
+    @classmethod
+    def from_dict(cls, data):
+        departure, arrival = data.get("departure") or {}, data.get("arrival") or {}
+        return cls(data.get("stop_number"),
+                   *(departure.get(field) for field in TIME_FIELDS),
+                   *(arrival.get(field) for field in TIME_FIELDS),
+                   FlightDetails.from_dict(data.get("flight_details") or {}))
+
+    def to_dict(self):
+        return {
+            "stop_number": self.stop_number,
+            "departure": {field: value for field, value in zip(TIME_FIELDS, (
+                self.departure_time, self.departure_date, self.departure_location, self.departure_airport))
+                if value is not None},
+            "arrival": {field: value for field, value in zip(TIME_FIELDS, (
+                self.arrival_time, self.arrival_date, self.arrival_location, self.arrival_airport))
+                if value is not None},
+            "flight_details": self.flight_details.to_dict(),
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Stop) and all(getattr(self, name) == getattr(other, name)
+                                               for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Stop({self.to_dict()!r})"
+
+
+class Leg:
+    """
+    The departure or return flight of an itinerary.
+    Direct legs carry flight_details and departure/arrival times themselves; multi-stop legs carry stops.
+    """
+
+    __slots__ = ("flight_label", "departure_root", "arrival_root", "total_duration", "stops", "is_direct",
+                 "flight_details", "departure_time", "arrival_time")
+
+    def __init__(self, flight_label, departure_root, arrival_root, total_duration, stops=None, is_direct=None,
+                 flight_details=None, departure_time=None, arrival_time=None):
+        self.flight_label = _intern(flight_label)
+        self.departure_root = _intern(departure_root)
+        self.arrival_root = _intern(arrival_root)
+        self.total_duration = _intern(total_duration)
+        self.stops = stops or []
+        self.is_direct = not self.stops if is_direct is None else is_direct
+        self.flight_details = flight_details
+        self.departure_time = _intern(departure_time)
+        self.arrival_time = _intern(arrival_time)
+
+    @property
+    def num_stops(self):
+        return len(self.stops)
+
+    @property
+    def first_segment(self):
+        """FlightDetails of the first flown segment (the leg's own for direct legs)."""
+        if self.is_direct:
+            return self.flight_details or FlightDetails()
+        return self.stops[0].flight_details if self.stops else FlightDetails()
+
+    @classmethod
+    def from_dict(cls, data):
+        details = data.get("flight_details")
+        return cls(data.get("flight_label"), data.get("departure_root"), data.get("arrival_root"),
+                   data.get("total_duration"), [Stop.from_dict(stop) for stop in data.get("stops") or []],
+                   data.get("is_direct"), FlightDetails.from_dict(details) if details is not None else None,
+                   data.get("departure_time"), data.get("arrival_time"))
+
+    def to_dict(self):
+        leg = {
+            "flight_label": self.flight_label,
+            "departure_root": self.departure_root,
+            "arrival_root": self.arrival_root,
+            "total_duration": self.total_duration,
+            "stops": [stop.to_dict() for stop in self.stops],
+            "num_stops": self.num_stops,
+            "is_direct": self.is_direct,
+        }
+        if self.flight_details is not None:
+            leg["flight_details"] = self.flight_details.to_dict()
+        if self.departure_time is not None:
+            leg["departure_time"] = self.departure_time
+        if self.arrival_time is not None:
+            leg["arrival_time"] = self.arrival_time
+        return leg
+
+    def __eq__(self, other):
+        return isinstance(other, Leg) and all(getattr(self, name) == getattr(other, name)
+                                              for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Leg({self.to_dict()!r})"
+
+
+class Itinerary:
+    """
+    One scraped itinerary: its legs plus where, when and at what price it was seen.
+    Fields other than these are kept in `extra`.
+    """
+
+    __slots__ = ("flight_type", "flights", "price", "search", "scraped_at", "extra")
+
+    _FIELDS = ("flight_type", "flights", "price", "search", "scraped_at")
+
+    def __init__(self, flight_type, flights=None, price=None, search=None, scraped_at=None, extra=None):
+        self.flight_type = _intern(flight_type)
+        self.flights = flights or []
+        self.price = _intern(price)
+        self.search = _shared_search(search)
+        self.scraped_at = scraped_at
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an Itinerary from a stored record."""
+        extra = {key: value for key, value in data.items() if key not in cls._FIELDS}
+        return cls(data.get("flight_type"), [Leg.from_dict(leg) for leg in data.get("flights") or []],
+                   data.get("price"), data.get("search"),
+                   data.get("scraped_at"), extra or None)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def coerce(cls, record):
+        """Return a record as an Itinerary (dict records are converted)."""
+        return record if isinstance(record, cls) else cls.from_dict(record)
+
+    def to_dict(self):
+        """The stored record, key for key as build_flight_data() produces it."""
+        record = {"flight_type": self.flight_type, "flights": [leg.to_dict() for leg in self.flights]}
+        if self.price is not None:
+            record["price"] = self.price
+        if self.search is not None:
+            record["search"] = dict(self.search)
+        if self.scraped_at is not None:
+            record["scraped_at"] = self.scraped_at
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    def to_json(self, **options):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **options)
+
+    # Dict-style access to the top-level fields, for sinks and metadata written against dict records.
+    # Fields are replaced with __setitem__; the nested values __getitem__ returns are read-only views.
+
+    def __getitem__(self, key):
+        if key == "flights":
+            return tuple(_frozen(leg.to_dict()) for leg in self.flights)
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "flights":
+            self.flights = [Leg.from_dict(leg) if isinstance(leg, dict) else leg for leg in value]
+        elif key == "search":
+            self.search = _shared_search(value)
+        elif key in self._FIELDS:
+            setattr(self, key, _intern(value))
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key in self._FIELDS:
+            return getattr(self, key) is not None
+        return bool(self.extra) and key in self.extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return isinstance(other, Itinerary) and all(getattr(self, name) == getattr(other, name)
+                                                    for name in self.__slots__)
+
+    def __repr__(self):
+        legs = ", ".join(f"{leg.departure_root} -> {leg.arrival_root}" for leg in self.flights)
+        return f"Itinerary({self.flight_type}: {legs}, price={self.price!r})"
@@ -0,0 +1,245 @@
+# core/scheduler.py
+
+"""
+This module schedules routes onto a fixed set of worker threads.
+Workers pull routes from a priority queue continuously (no batch barriers), route starts are paced
+by a token-bucket rate limit for the target site, and every job reports its queue wait and runtime.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        """
+        Initialize the bucket (it starts full).
+
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of tokens that can accumulate.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available without waiting."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Block until the tokens are available, then take them.
+
+        :return: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+                missing = tokens - self._tokens
+            time.sleep(missing / self.rate)
+
+
+class RouteJob:
+    """A route waiting in (or processed by) the scheduler."""
+
+    _sequence = itertools.count()
+
+    def __init__(self, route, priority=0, deadline=None, options=None):
+        """
+        :param route: Tuple of arguments passed to the worker function.
+        :param options: Keyword arguments passed to the worker function for this route only.
+        :param priority: Higher values run first.
+        :param deadline: Epoch seconds by which the job must start; later jobs are skipped as expired.
+        """
+        self.route = route
+        self.options = options or {}
+        self.priority = priority
+        self.deadline = deadline
+        self.sequence = next(self._sequence)
+        self.status = "pending"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rate_limit_wait = 0.0
+
+    def sort_key(self):
+        """Highest priority first, then earliest deadline, then submission order."""
+        return (-self.priority, self.deadline if self.deadline is not None else float("inf"), self.sequence)
+
+    def __lt__(self, other):
+        return self.sort_key() < other.sort_key()
+
+    @property
+    def queue_wait(self):
+        """Seconds between submission and start (including the rate-limit wait)."""
+        return (self.started_at or self.finished_at or time.time()) - self.submitted_at
+
+    @property
+    def runtime(self):
+        """Seconds the worker spent on the job."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    def to_dict(self):
+        return {
+            "route": list(self.route),
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "queue_wait": round(self.queue_wait, 3),
+            "rate_limit_wait": round(self.rate_limit_wait, 3),
+            "runtime": round(self.runtime, 3),
+        }
+
+
+# Stop marker for worker threads; the lowest possible priority keeps it behind every real job
+_STOP = RouteJob(route=(), priority=float("-inf"))
+
+
+class RouteScheduler:
+    """Runs route jobs on N workers that pull continuously from a shared priority queue."""
+
+    def __init__(self, worker_fn, workers=2, rate_limiter=None):
+        """
+        Initialize the scheduler.
+
+        :param worker_fn: Callable invoked as worker_fn(*job.route, **job.options) for every job.
+        :param workers: Number of worker threads.
+        :param rate_limiter: Optional TokenBucket; one token is taken before each route starts.
+        """
+        self.worker_fn = worker_fn
+        self.workers = workers
+        self.rate_limiter = rate_limiter
+        self.jobs = []
+        self._queue = queue.PriorityQueue()
+        self._busy_seconds = {}
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._finished_at = None
+
+    def submit(self, route, priority=0, deadline=None, options=None):
+        """
+        Queue a route. Can be called before or while the scheduler runs.
+
+        :param options: Per-route keyword arguments for the worker function (e.g. {"search_mode": "url"}).
+        :return: The RouteJob tracking the route.
+        """
+        job = RouteJob(route, priority, deadline, options)
+        with self._lock:
+            self.jobs.append(job)
+        self._queue.put(job)
+        return job
+
+    def _worker(self, name):
+        """Pull jobs until the stop marker arrives."""
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                self._queue.task_done()
+                return
+
+            try:
+                if job.deadline is not None and time.time() > job.deadline:
+                    job.status = "expired"
+                    job.finished_at = time.time()
+                    logger.warning(f"Skipping {job.route[:2]}: deadline passed before it could start.")
+                    continue
+
+                if self.rate_limiter:
+                    job.rate_limit_wait = self.rate_limiter.acquire()
+
+                job.status = "running"
+                job.started_at = time.time()
+                try:
+                    self.worker_fn(*job.route, **job.options)
+                    job.status = "done"
+                except Exception as e:
+                    job.status = "failed"
+                    job.error = str(e)
+                    logger.exception(f"Route {job.route[:2]} failed")
+                finally:
+                    job.finished_at = time.time()
+                    with self._lock:
+                        self._busy_seconds[name] = self._busy_seconds.get(name, 0.0) + job.runtime
+            finally:
+                self._queue.task_done()
+
+    def run(self):
+        """
+        Process every queued job and return the run report.
+        Workers stay busy until the queue is empty; there is no barrier between routes.
+        """
+        self._started_at = time.time()
+        threads = []
+        for index in range(self.workers):
+            name = f"worker-{index + 1}"
+            self._busy_seconds.setdefault(name, 0.0)
+            thread = threading.Thread(target=self._worker, args=(name,), name=name, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+        self._finished_at = time.time()
+
+        report = self.report()
+        self.print_report(report)
+        return report
+
+    def report(self):
+        """Queue wait, runtime and worker utilization for sizing concurrency."""
+        wall = max((self._finished_at or time.time()) - (self._started_at or time.time()), 1e-9)
+        with self._lock:
+            jobs = [job.to_dict() for job in self.jobs]
+            utilization = {name: round(busy / wall, 3) for name, busy in self._busy_seconds.items()}
+
+        waits = sorted(job["queue_wait"] for job in jobs)
+        return {
+            "wall_seconds": round(wall, 3),
+            "jobs": jobs,
+            "status_counts": {status: sum(1 for job in jobs if job["status"] == status)
+                              for status in sorted({job["status"] for job in jobs})},
+            "median_queue_wait": waits[len(waits) // 2] if waits else 0.0,
+            "max_queue_wait": waits[-1] if waits else 0.0,
+            "worker_utilization": utilization,
+            "mean_utilization": round(sum(utilization.values()) / len(utilization), 3) if utilization else 0.0,
+        }
+
+    @staticmethod
+    def print_report(report):
+        """Print a readable summary of a run report."""
+        logger.info(f"Scheduler finished in {report['wall_seconds']}s: {report['status_counts']}")
+        for job in report["jobs"]:
+            logger.info(f"  {job['route'][0]} -> {job['route'][1]}: {job['status']}, "
+                        f"waited {job['queue_wait']}s (rate limit {job['rate_limit_wait']}s), ran {job['runtime']}s")
+        logger.info(f"Queue wait median/max: {report['median_queue_wait']}s / {report['max_queue_wait']}s")
+        logger.info(f"Worker utilization: {report['worker_utilization']} (mean {report['mean_utilization']})")
@@ -6,10 +6,12 @@ It interacts with the webpage using Selenium, handles modals, clicks elements,
 extracts flight details, and processes all flight cards.
 """
 
-import time
 import json
+import logging
+import os
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     TimeoutException,
@@ -17,20 +19,28 @@ from selenium.common.exceptions import (
     StaleElementReferenceException,
     ElementClickInterceptedException
 )
-from core.browser_manager import BrowserManager
+from core.browser_manager import BrowserManager, NavigationLog
 from config.selectors import KiwiSelectors
-from core.data_handler import process_all_cards  # Importing original process_all_cards function
-import random
-
+from core.data_handler import process_all_cards, EXTRACTION_MODES  # Importing original process_all_cards function
+from core.timing import FlowTiming
+from core.driver_profiler import DriverProfiler
+from core.search_url import LocationResolver, build_search_url
+from core.network_capture import NetworkCapture
+from core.flight_stream import astream, iter_stream
+from config.save_data import save_flight_data
 
 
+logger = logging.getLogger(__name__)
 
 
 class KiwiFlightScraper:
     """Selenium-based flight search scraper for Kiwi.com."""
 
     def __init__(self, departure, destination, departure_date, return_date, departure_month, return_month,
-                 headless=True):
+                 headless=True, extraction_mode="script", parser_pool=None, sink=None, driver=None,
+                 jitter=None, search_mode="form", location_resolver=None, results_mode="cards", profile=None,
+                 max_flights=3, delta_index=None, journal=None, base_url=KiwiSelectors.BASE_URL,
+                 profile_commands=None):
         """
         Initialize the scraper with required parameters.
 
@@ -41,68 +51,118 @@ class KiwiFlightScraper:
         :param departure_month: Departure month.
         :param return_month: Return month.
         :param headless: Run browser in headless mode (default=False).
+        :param extraction_mode: "script" extracts each itinerary with one execute_script call,
+                                "html" parses the page source offline, "element" queries every field separately.
+        :param parser_pool: Optional ParserPool shared between scrapers for the "html" mode.
+        :param sink: Callable receiving each itinerary, e.g. a shared BackgroundFlightWriter.submit
+                     (default: save_flight_data).
+        :param driver: Existing WebDriver to use (e.g. from a DriverPool); a new one is created if omitted.
+        :param jitter: JitterPolicy for human-like pauses (default: from FLIGHTSCRAPER_JITTER* env vars).
+        :param search_mode: "form" fills the search form, "url" opens the results page directly
+                            (falling back to the form if that fails).
+        :param location_resolver: LocationResolver shared between scrapers for the "url" mode.
+        :param results_mode: "cards" scrapes the result cards, "network" reads the search API responses
+                             (needs a driver created with capture_network=True; falls back to cards).
+        :param profile: PerformanceProfile for the browser created when no driver is given.
+        :param max_flights: Maximum itineraries scraped from the result cards (None for all of them).
+        :param delta_index: DeltaIndex shared between scrapers; known cards are skipped and only
+                            new or re-priced itineraries are saved.
+        :param journal: JournalRoute of this route; cards saved by an interrupted attempt are not scraped again.
+        :param base_url: Landing page opened by the search form (e.g. a local fixture site for benchmarks).
+        :param profile_commands: Record every WebDriver command of run() in self.command_profiler
+                                 (default: FLIGHTSCRAPER_PROFILE_COMMANDS=1).
         """
+        if search_mode not in ("form", "url"):
+            raise ValueError(f"Unknown search mode: {search_mode}")
+        if results_mode not in ("cards", "network"):
+            raise ValueError(f"Unknown results mode: {results_mode}")
+        if extraction_mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {extraction_mode}")
+
         self.departure = departure
         self.destination = destination
         self.departure_date = departure_date
         self.return_date = return_date
         self.departure_month = departure_month
         self.return_month = return_month
-        self.browser_manager = BrowserManager(headless=headless)
-        self.driver = self.browser_manager.create_driver()
+        self.extraction_mode = extraction_mode
+        self.parser_pool = parser_pool
+        self.sink = sink
+        self.timing = FlowTiming(jitter)
+        self.search_mode = search_mode
+        self.location_resolver = location_resolver
+        self.results_mode = results_mode
+        self.max_flights = max_flights
+        self.delta_index = delta_index
+        self.journal = journal
+        self.base_url = base_url
+        self.browser_manager = BrowserManager(headless=headless, capture_network=results_mode == "network",
+                                              profile=profile)
+        self.owns_driver = driver is None
+        self.driver = driver if driver is not None else self.browser_manager.create_driver()
+        self.network_capture = NetworkCapture(self.driver) if results_mode == "network" else None
+        self.navigations = NavigationLog()
+        if profile_commands is None:
+            profile_commands = os.environ.get("FLIGHTSCRAPER_PROFILE_COMMANDS", "0").lower() in ("1", "true", "yes")
+        self.command_profiler = DriverProfiler(self.driver) if profile_commands else None
 
-    def random_delay(self, min_delay=2, max_delay=3):
-        """Introduce a random delay to simulate human behavior."""
-        time.sleep(random.uniform(min_delay, max_delay))
+    def random_delay(self, min_delay=None, max_delay=None):
+        """Introduce a random delay to simulate human behavior (skipped when jitter is disabled)."""
+        self.timing.pause(min_delay, max_delay)
 
     def open_website(self):
         """Open Kiwi website and handle pop-ups."""
-        self.driver.get(KiwiSelectors.BASE_URL)
-        self.random_delay()
+        with self.timing.phase("open_website"):
+            self.driver.get(self.base_url)
+            self.timing.wait_for_network_idle(self.driver)
+            self.navigations.record(self.driver, "landing page")
+            self.random_delay()
 
     def close_pre_fetched_departure(self):
         """Remove any pre-filled departure location if present."""
-        try:
-            svg_element = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, KiwiSelectors.REMOVE_PRE_FETCHED_DEPARTURE))
-            )
+        svg_element = self.timing.wait_until(
+            self.driver, EC.element_to_be_clickable((By.CSS_SELECTOR, KiwiSelectors.REMOVE_PRE_FETCHED_DEPARTURE))
+        )
+        if svg_element:
             svg_element.click()
             #print("[INFO] Removed pre-filled departure location.")
-        except TimeoutException:
-            print("[INFO] No pre-filled departure location found.")
+        else:
+            logger.info("No pre-filled departure location found.")
 
     def enter_text(self, by, value, text, timeout=10):
         """Enter text into a field with error handling."""
-        try:
-            input_element = WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable((by, value)))
-            input_element.clear()
-            input_element.send_keys(text)
-            return True
-        except TimeoutException:
+        input_element = self.timing.wait_until(self.driver, EC.element_to_be_clickable((by, value)), timeout)
+        if not input_element:
             return False
+        input_element.clear()
+        input_element.send_keys(text)
+        return True
 
     def click_element(self, by, value, timeout=10):
         """Click an element, handling common exceptions."""
+        element = self.timing.wait_until(self.driver, EC.element_to_be_clickable((by, value)), timeout)
+        if not element:
+            logger.error(f"Element {value} not found.")
+            return False
         try:
-            element = WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable((by, value)))
             element.click()
             return True
         except (ElementClickInterceptedException, StaleElementReferenceException):
-            time.sleep(2)
-        except TimeoutException:
-            print(f"[ERROR] Element {value} not found.")
-            return False
+            # ✅ Something is animating over the element; let the DOM settle before the caller moves on
+            self.timing.wait_for_dom_settled(self.driver, timeout=2)
         return False
 
     def accept_terms(self):
         """Accept Kiwi.com terms if the button exists."""
-        return self.click_element(By.XPATH, KiwiSelectors.COOKIE_ACCEPT_BTN)
+        with self.timing.phase("accept_terms"):
+            return self.click_element(By.XPATH, KiwiSelectors.COOKIE_ACCEPT_BTN)
 
     def add_place(self):
 
-        """Click the 'Add place' button after a random delay."""
-        self.random_delay(min_delay=2, max_delay=3)  # Random delay before clicking
-        self.click_element(By.XPATH, KiwiSelectors.ADD_PLACE_BUTTON)# Using selector from selectors.py
+        """Click the 'Add place' button (after an optional human-like pause)."""
+        with self.timing.phase("add_place"):
+            self.random_delay()  # Jitter only; click_element already waits for the button
+            self.click_element(By.XPATH, KiwiSelectors.ADD_PLACE_BUTTON)# Using selector from selectors.py
             # print("[INFO] Clicked the 'Add place' button successfully.")
 
 
@@ -110,24 +170,36 @@ class KiwiFlightScraper:
 
     def set_departure(self):
         """Set the departure location."""
-        self.click_element(By.XPATH, KiwiSelectors.DEPARTURE_INPUT)
-        self.close_pre_fetched_departure()
-        self.enter_text(By.XPATH, KiwiSelectors.DEPARTURE_INPUT, self.departure)
+        with self.timing.phase("set_departure"):
+            self.click_element(By.XPATH, KiwiSelectors.DEPARTURE_INPUT)
+            self.close_pre_fetched_departure()
+            self.enter_text(By.XPATH, KiwiSelectors.DEPARTURE_INPUT, self.departure)
         #print(f"[INFO] Entered departure: {self.departure}")
 
     def set_destination(self):
         """Set the destination location."""
-        self.click_element(By.XPATH, KiwiSelectors.DESTINATION_INPUT)
-        self.enter_text(By.XPATH, KiwiSelectors.DESTINATION_INPUT, self.destination)
+        with self.timing.phase("set_destination"):
+            self.click_element(By.XPATH, KiwiSelectors.DESTINATION_INPUT)
+            self.enter_text(By.XPATH, KiwiSelectors.DESTINATION_INPUT, self.destination)
         #print(f"[INFO] Entered destination: {self.destination}")
 
+    def displayed_months(self, timeout=10):
+        """Return the month labels currently shown by the date picker."""
+        month_buttons = self.timing.wait_until(
+            self.driver,
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_MONTH_BUTTONS)),
+            timeout
+        )
+        if not month_buttons:
+            raise TimeoutException("Date picker months not displayed")
+        return [elem.text.strip() for elem in month_buttons]
+
     def select_date(self, target_month, target_date):
         """Select a departure or return date from the calendar."""
         attempts = 0
         while attempts < 5:
             try:
-                displayed_months = [elem.text.strip() for elem in WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_MONTH_BUTTONS)))]
+                displayed_months = self.displayed_months()
 
                 if target_month in displayed_months:
                     day_selector = KiwiSelectors.CALENDAR_DAY_SELECTOR.format(target_date)
@@ -136,33 +208,222 @@ class KiwiFlightScraper:
                     break
                 else:
                     self.click_element(By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_NEXT_BTN)
-                    time.sleep(2)
+                    # ✅ Wait for the calendar to actually move instead of sleeping
+                    self.timing.wait_until(
+                        self.driver,
+                        lambda d: [elem.text.strip() for elem in d.find_elements(
+                            By.CSS_SELECTOR, KiwiSelectors.DATE_PICKER_MONTH_BUTTONS)] != displayed_months,
+                        timeout=5
+                    )
                     attempts += 1
             except Exception as e:
-                print(f"[ERROR] Could not select date {target_date}: {e}")
+                logger.error(f"Could not select date {target_date}: {e}")
                 break
 
-    def set_dates(self):
-        """Click the date input field and set departure and return dates."""
+    def open_date_picker(self):
+        """Click the date input field until the date picker is open."""
         self.click_element(By.XPATH, KiwiSelectors.DATE_INPUT_FIELD)
-        time.sleep(1)
+        self.timing.wait_for_dom_settled(self.driver, timeout=3)
         self.click_element(By.XPATH, KiwiSelectors.DATE_INPUT_FIELD)
-        self.select_date(self.departure_month, self.departure_date)
-        time.sleep(2)
-        self.select_date(self.return_month, self.return_date)
-        self.click_element(By.XPATH, KiwiSelectors.SET_DATES_BUTTON)
+
+    def set_dates(self):
+        """Click the date input field and set departure and return dates."""
+        with self.timing.phase("set_dates"):
+            self.open_date_picker()
+            self.select_date(self.departure_month, self.departure_date)
+            self.timing.wait_for_dom_settled(self.driver, timeout=3)
+            self.select_date(self.return_month, self.return_date)
+            self.click_element(By.XPATH, KiwiSelectors.SET_DATES_BUTTON)
 
     def search_flights(self):
         """Click the search button to find flights."""
-        self.click_element(By.XPATH, KiwiSelectors.SEARCH_BUTTON)
-        #print("[INFO] Search initiated.")
-        time.sleep(5)  # Ensure page load
+        with self.timing.phase("search_flights"):
+            self.reset_network_capture()
+            self.click_element(By.XPATH, KiwiSelectors.SEARCH_BUTTON)
+            #print("[INFO] Search initiated.")
 
-        # **Switch to second tab if available**
-        self.change_driver_position()
+            # ✅ Results open in a second tab or replace the page; wait for whichever happens first
+            self.timing.wait_until(
+                self.driver,
+                lambda d: len(d.window_handles) > 1 or d.find_elements(By.CSS_SELECTOR,
+                                                                        KiwiSelectors.FLIGHT_CARDS_WRAPPER),
+                timeout=15
+            )
+
+            # **Switch to second tab if available**
+            self.change_driver_position()
+            self.navigations.record(self.driver, "search results")
 
         # **Process all flight cards**
-        process_all_cards(self.driver)
+        self.process_results()
+
+    def search_url(self):
+        """Build the results-page URL for this route."""
+        resolver = self.location_resolver or LocationResolver()
+        return build_search_url(resolver.resolve(self.departure), resolver.resolve(self.destination),
+                                self.departure_date, self.return_date)
+
+    def open_search_results(self):
+        """
+        Navigate straight to the results page, skipping the search form.
+
+        :return: True if flight cards appeared, False if the caller should fall back to the form.
+        """
+        with self.timing.phase("open_search_results"):
+            try:
+                url = self.search_url()
+            except LookupError as e:
+                logger.warning(f"{e}; falling back to the search form.")
+                return False
+
+            self.reset_network_capture()
+            self.driver.get(url)
+            self.accept_terms()
+            cards = self.timing.wait_until(
+                self.driver, lambda d: d.find_elements(By.CSS_SELECTOR, KiwiSelectors.FLIGHT_CARDS_WRAPPER),
+                timeout=30
+            )
+            if not cards:
+                logger.warning(f"No results at {url}; falling back to the search form.")
+                return False
+            self.navigations.record(self.driver, "search results")
+            return True
+
+    def fill_places(self):
+        """Open the landing page and fill departure and destination."""
+        self.open_website()
+        self.accept_terms()
+        self.set_departure()
+        self.random_delay()
+        self.add_place()
+        self.set_destination()
+        self.random_delay()
+        self.add_place()
+
+    def fill_search_form(self):
+        """Open the landing page and fill departure, destination and dates."""
+        self.fill_places()
+        self.set_dates()
+
+    def run(self):
+        """Run the whole search for this route using the configured search mode."""
+        with self.command_profiler or nullcontext():
+            if self.search_mode == "url" and self.open_search_results():
+                self.process_results()
+                return
+
+            self.fill_search_form()
+            self.search_flights()
+
+    def set_route(self, departure, destination, departure_date, return_date, departure_month, return_month):
+        """Point the scraper (and its browser) at another route for the next search."""
+        self.departure = departure
+        self.destination = destination
+        self.departure_date = departure_date
+        self.return_date = return_date
+        self.departure_month = departure_month
+        self.return_month = return_month
+
+    def _stream_search(self, sink):
+        """Run the search with `sink` in place of the configured sink."""
+        configured_sink = self.sink
+        self.sink = sink
+        try:
+            self.run()
+        finally:
+            self.sink = configured_sink
+
+    def iter_flights(self, route=None, max_pending=16):
+        """
+        Run the search and yield every itinerary as soon as it is scraped:
+            for flight_data in scraper.iter_flights(route):
+                alert_if_cheap(flight_data)
+
+        The search runs in a background thread; the configured sink is not called, storing the
+        itineraries is up to the consumer. The delta index records an itinerary once it is handed to
+        the stream. The job journal does too, unless it is deferred (as in main.py): its card then only
+        counts as saved once the consumer submitted that same object to the BackgroundFlightWriter
+        reporting to journal.written, and cards never submitted stay unsaved when the route finishes.
+        Breaking out of the loop stops the search at its next itinerary; errors of the search are
+        raised in the loop.
+
+        :param route: (departure, destination, departure_date, return_date, departure_month, return_month)
+                      to search instead of the scraper's current route.
+        :param max_pending: Itineraries scraped ahead of the consumer before the search waits (0 for no limit).
+        """
+        if route is not None:
+            self.set_route(*route)
+        return iter_stream(self._stream_search, max_pending, name=f"scrape {self.departure} -> {self.destination}")
+
+    def aiter_flights(self, route=None, max_pending=16):
+        """
+        Async variant of iter_flights():
+            async for flight_data in scraper.aiter_flights(route):
+                await publish(flight_data)
+        """
+        if route is not None:
+            self.set_route(*route)
+        return astream(self._stream_search, max_pending, name=f"scrape {self.departure} -> {self.destination}")
+
+    def reset_network_capture(self):
+        """Drop responses recorded so far so only the upcoming search is captured."""
+        if self.network_capture is None:
+            return
+        try:
+            self.network_capture.reset()
+        except Exception as e:
+            logger.warning(f"Network capture unavailable ({e}); scraping result cards instead.")
+            self.network_capture = None
+
+    def collect_network_results(self, delta=None):
+        """
+        Save every itinerary found in the captured search API responses.
+
+        :param delta: Optional RouteDelta; only new or re-priced itineraries are then saved.
+        :return: Number of itineraries captured (0 means the caller should scrape the cards).
+        """
+        with self.timing.phase("network_capture"):
+            try:
+                with self.timing.waiting():
+                    records = self.network_capture.collect_itineraries(self.search_params())
+            except Exception as e:
+                logger.warning(f"Reading captured responses failed: {e}")
+                return 0
+
+            sink = self.sink or save_flight_data
+            if delta is not None:
+                sink = delta.sink(None, sink, on_unchanged=self.journal.handled if self.journal is not None else None)
+            if self.journal is not None:
+                sink = self.journal.sink(None, sink)
+            scraped_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for flight_data in records:
+                flight_data["scraped_at"] = scraped_at
+                sink(flight_data)
+
+        logger.info(f"Captured {len(records)} itineraries from the search API responses.")
+        return len(records)
+
+    def process_results(self):
+        """Save the results of the current search, from the network responses or the flight cards."""
+        delta = self.delta_index.route(self.search_params()) if self.delta_index is not None else None
+
+        if self.network_capture is None or not self.collect_network_results(delta):
+            with self.timing.phase("process_all_cards"):
+                process_all_cards(self.driver, self.extraction_mode, self.parser_pool, self.sink,
+                                  self.search_params(), timing=self.timing, max_flights=self.max_flights, delta=delta,
+                                  journal=self.journal)
+
+        if delta is not None:
+            delta.finish(f"{self.departure} -> {self.destination}")
+
+    def search_params(self):
+        """Return the search parameters recorded with every scraped itinerary."""
+        return {
+            "departure": self.departure,
+            "destination": self.destination,
+            "departure_date": self.departure_date,
+            "return_date": self.return_date,
+        }
 
     def change_driver_position(self):
         """Switch to second tab after search."""
@@ -170,6 +431,11 @@ class KiwiFlightScraper:
         if len(window_handles) > 1:
             self.driver.switch_to.window(window_handles[1])
             #print(f"[INFO] Switched to the second tab. Current URL: {self.driver.current_url}")
+
+            # URL blocking is configured per tab
+            profile = getattr(self.driver, "performance_profile", None)
+            if profile:
+                profile.apply(self.driver)
         else:
-            print("[INFO] No second tab found. Continuing on the current page.")
+            logger.info("No second tab found. Continuing on the current page.")
 
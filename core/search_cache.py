@@ -0,0 +1,184 @@
+# core/search_cache.py
+
+"""
+This module caches search results per (departure, destination, departure_date, return_date).
+Entries live for a per-route TTL, the cache is bounded by LRU eviction and persisted to disk so it
+survives restarts. Expired entries can still be served for a grace period while a refresh is queued
+(stale-while-revalidate), so a route only costs a browser session when its data is actually needed.
+An entry remembers how many itineraries its scrape was limited to and only answers requests for as many.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from core.records import Itinerary
+
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCache:
+    """Thread-safe TTL + LRU cache of scraped itineraries, persisted as JSON."""
+
+    def __init__(self, cache_file="json_data/search_cache.json", ttl=3600, stale_ttl=6 * 3600, max_entries=500,
+                 refresh_timeout=1800):
+        """
+        Initialize the cache and load the entries persisted by a previous run.
+
+        :param cache_file: JSON file persisting the entries (None for memory only).
+        :param ttl: Default seconds an entry is fresh.
+        :param stale_ttl: Seconds after expiry during which the entry is still served while it is refreshed.
+        :param max_entries: Maximum number of routes kept; the least recently used are evicted.
+        :param refresh_timeout: Seconds after which a refresh that never reported back may be queued again.
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.refresh_timeout = refresh_timeout
+        self._entries = OrderedDict()
+        self._refreshing = {}  # key -> time the refresh was queued
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                         "refreshes_queued": 0}
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as file:
+                    for entry in json.load(file):
+                        self._entries[tuple(entry["key"])] = entry
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logger.warning(f"Ignoring unreadable search cache {cache_file}")
+
+    @staticmethod
+    def key(departure, destination, departure_date, return_date=None, *_):
+        """Cache key of a route; extra route values (month labels) do not change the search."""
+        return (departure.strip().lower(), destination.strip().lower(), departure_date, return_date)
+
+    def _save(self):
+        """Persist the entries (in LRU order) atomically."""
+        if not self.cache_file:
+            return
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.cache_file + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(list(self._entries.values()), file, ensure_ascii=False)
+        os.replace(temp_path, self.cache_file)
+
+    @staticmethod
+    def _covers(entry, limit):
+        """True if an entry holds the first `limit` itineraries of its route (None: all of them)."""
+        if "limit" not in entry:
+            return False  # Stored before entries recorded their limit
+        return entry["limit"] is None or (limit is not None and limit <= entry["limit"])
+
+    def _state(self, entry, now):
+        age = now - entry["stored_at"]
+        if age <= entry["ttl"]:
+            return "fresh"
+        if age <= entry["ttl"] + self.stale_ttl:
+            return "stale"
+        return "expired"
+
+    def get(self, key, limit=None):
+        """
+        Look up a route.
+
+        :param limit: Number of itineraries needed (None for all); an entry scraped with a lower limit is a miss.
+        :return: (records, state) where state is "fresh", "stale" or "miss" (records is None on a miss).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._covers(entry, limit):
+                self.counters["misses"] += 1
+                return None, "miss"
+
+            state = self._state(entry, time.time())
+            if state == "expired":
+                del self._entries[key]
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None, "miss"
+
+            self._entries.move_to_end(key)
+            self.counters["hits" if state == "fresh" else "stale_hits"] += 1
+            return entry["records"][:limit], state
+
+    def put(self, key, records, ttl=None, limit=None):
+        """
+        Store the itineraries of a route, evicting the least recently used routes if needed.
+
+        :param limit: Maximum itineraries the scrape was allowed to return (None if it returned all of them).
+        """
+        # Cached entries are persisted as JSON, so hits always return stored dicts
+        records = [record.to_dict() if isinstance(record, Itinerary) else record for record in records]
+        with self._lock:
+            self._entries[key] = {"key": list(key), "records": records, "stored_at": time.time(),
+                                  "ttl": self.ttl if ttl is None else ttl, "limit": limit}
+            self._entries.move_to_end(key)
+            self._refreshing.pop(key, None)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._save()
+
+    def end_refresh(self, key):
+        """Report a queued refresh as finished (whether or not it stored anything), so it can be queued again."""
+        with self._lock:
+            self._refreshing.pop(key, None)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def fetch(self, key, loader, refresh=None, ttl=None, store=True, limit=None):
+        """
+        Return the itineraries of a route, loading them only when the cache cannot answer.
+
+        :param loader: Callable returning the route's records (e.g. a scrape); called on a miss.
+        :param refresh: Callable queuing a background reload; called once per stale entry. The reload must
+                        call end_refresh() (or put()) when it finishes, or it is re-queued after refresh_timeout.
+        :param ttl: TTL for records stored by this call.
+        :param store: Cache the loaded records (False when the loader returns a filtered subset of the route).
+        :param limit: Itineraries needed, and the limit the loader scrapes with (None for all).
+        :return: (records, state) like get(); state "miss" means the records were just loaded.
+        """
+        records, state = self.get(key, limit)
+        if state == "fresh":
+            return records, state
+
+        if state == "stale" and refresh is not None:
+            now = time.time()
+            with self._lock:
+                queued_at = self._refreshing.get(key)
+                queue_refresh = queued_at is None or now - queued_at > self.refresh_timeout
+                if queue_refresh:
+                    self._refreshing[key] = now
+                    self.counters["refreshes_queued"] += 1
+            if queue_refresh:
+                try:
+                    refresh()
+                except Exception:
+                    self.end_refresh(key)
+                    raise
+            return records, state
+
+        records = loader()
+        if records and store:  # Failed or empty scrapes are retried next time instead of being cached
+            self.put(key, records, ttl, limit)
+        return records, "miss"
+
+    def stats(self):
+        """Counters plus the current size; hit rate counts stale hits as hits."""
+        with self._lock:
+            counters = dict(self.counters, entries=len(self._entries))
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 3) if lookups else 0.0
+        return counters
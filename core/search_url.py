@@ -0,0 +1,130 @@
+# core/search_url.py
+
+"""
+This module builds Kiwi.com search-result URLs directly from a route and its dates,
+so a search can skip the form (departure/destination inputs and the month-by-month calendar).
+City names are mapped to Kiwi location slugs by LocationResolver, which caches them on disk.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import urllib.parse
+import urllib.request
+
+from config.selectors import KiwiSelectors
+
+
+logger = logging.getLogger(__name__)
+
+
+def slugify(name):
+    """Best-effort slug for a place name ("São Paulo" -> "sao-paulo")."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-")
+
+
+def kiwi_location_lookup(name, timeout=10):
+    """
+    Ask Kiwi's public locations endpoint for the slug of a city, airport or IATA code.
+
+    :return: Slug string, or None if nothing matched.
+    """
+    query = urllib.parse.urlencode({"term": name, "locale": "en-US", "limit": 1,
+                                    "location_types": ["city", "airport"]}, doseq=True)
+    request = urllib.request.Request(f"{KiwiSelectors.LOCATIONS_API_URL}?{query}",
+                                     headers={"Accept": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        locations = json.load(response).get("locations", [])
+    if not locations:
+        return None
+    location = locations[0]
+    # Airports resolve to their city so the search covers every airport there
+    return (location.get("city") or {}).get("slug") or location.get("slug")
+
+
+class LocationResolver:
+    """Maps place names to Kiwi location slugs, with an in-memory and on-disk cache."""
+
+    def __init__(self, cache_file="json_data/location_slugs.json", lookup=kiwi_location_lookup):
+        """
+        Initialize the resolver.
+
+        :param cache_file: JSON file persisting resolved slugs (None for memory only).
+        :param lookup: Callable name -> slug (or None) used on cache misses; pass `slugify` to work offline.
+        """
+        self.cache_file = cache_file
+        self.lookup = lookup
+        self._lock = threading.Lock()
+        self._cache = {}
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as file:
+                    self._cache = json.load(file)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable slug cache {cache_file}")
+
+    @staticmethod
+    def _key(name):
+        return name.strip().lower()
+
+    def _save(self):
+        """Persist the cache atomically."""
+        if not self.cache_file:
+            return
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.cache_file + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._cache, file, indent=4, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_path, self.cache_file)
+
+    def resolve(self, name):
+        """
+        Return the slug for a place name, looking it up only on the first request.
+
+        :raises LookupError: If the place cannot be resolved.
+        """
+        key = self._key(name)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        slug = None
+        try:
+            slug = self.lookup(name) if self.lookup else None
+        except Exception as e:
+            logger.warning(f"Location lookup failed for {name}: {e}")
+        if not slug:
+            raise LookupError(f"Could not resolve a location slug for {name!r}")
+
+        with self._lock:
+            self._cache[key] = slug
+            self._save()
+        return slug
+
+    def set(self, name, slug):
+        """Pin a slug manually (e.g. for names the lookup gets wrong)."""
+        with self._lock:
+            self._cache[self._key(name)] = slug
+            self._save()
+
+
+def build_search_url(departure_slug, destination_slug, departure_date, return_date=None):
+    """
+    Build the results-page URL for a route.
+
+    :param departure_date: YYYY-MM-DD.
+    :param return_date: YYYY-MM-DD, or None for a one-way search.
+    """
+    return KiwiSelectors.SEARCH_RESULTS_URL.format(
+        departure=departure_slug,
+        destination=destination_slug,
+        departure_date=departure_date,
+        return_date=return_date or "no-return",
+    )
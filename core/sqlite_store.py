@@ -0,0 +1,404 @@
+# core/sqlite_store.py
+
+"""
+This module stores scraped itineraries in SQLite, normalized into itineraries, legs and stops.
+Writes are batched into transactions on a WAL-mode database, and indexes on route/date, scrape time,
+airline and price make lookups such as "cheapest Chicago -> London this week" cheap.
+Every itinerary is keyed by a hash of its record, so importing the same file twice stores it once.
+
+Usage:
+    python -m core.sqlite_store import json_data/flight_results.json json_data/flight_segments
+    python -m core.sqlite_store cheapest Chicago London --from 2025-02-01 --to 2025-02-07
+    python -m core.sqlite_store airline Finnair --limit 5
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from core.jsonl_store import JsonlFlightStore
+from core.records import FlightDetails, Itinerary
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS itineraries (
+    id INTEGER PRIMARY KEY,
+    origin TEXT,
+    destination TEXT,
+    departure_date TEXT,
+    return_date TEXT,
+    flight_type TEXT,
+    airline TEXT,
+    price REAL,
+    price_text TEXT,
+    currency TEXT,
+    scraped_at TEXT,
+    record TEXT NOT NULL,
+    record_hash TEXT
+);
+
+CREATE TABLE IF NOT EXISTS legs (
+    id INTEGER PRIMARY KEY,
+    itinerary_id INTEGER NOT NULL REFERENCES itineraries(id) ON DELETE CASCADE,
+    leg_index INTEGER NOT NULL,
+    flight_label TEXT,
+    departure_root TEXT,
+    arrival_root TEXT,
+    total_duration TEXT,
+    num_stops INTEGER,
+    is_direct INTEGER,
+    departure_time TEXT,
+    arrival_time TEXT,
+    airline TEXT,
+    flight_number TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stops (
+    id INTEGER PRIMARY KEY,
+    leg_id INTEGER NOT NULL REFERENCES legs(id) ON DELETE CASCADE,
+    stop_number INTEGER NOT NULL,
+    departure_time TEXT,
+    departure_date TEXT,
+    departure_location TEXT,
+    departure_airport TEXT,
+    arrival_time TEXT,
+    arrival_date TEXT,
+    arrival_location TEXT,
+    arrival_airport TEXT,
+    airline TEXT,
+    operating_airline TEXT,
+    flight_number TEXT,
+    seating_info TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_itineraries_route ON itineraries (origin, destination, departure_date);
+CREATE INDEX IF NOT EXISTS idx_itineraries_scraped_at ON itineraries (scraped_at);
+CREATE INDEX IF NOT EXISTS idx_itineraries_airline ON itineraries (airline);
+CREATE INDEX IF NOT EXISTS idx_itineraries_price ON itineraries (price);
+CREATE INDEX IF NOT EXISTS idx_legs_itinerary ON legs (itinerary_id);
+CREATE INDEX IF NOT EXISTS idx_legs_airline ON legs (airline);
+CREATE INDEX IF NOT EXISTS idx_stops_leg ON stops (leg_id);
+"""
+
+# Created after _migrate() added record_hash to databases written before it existed
+UNIQUE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_itineraries_record_hash ON itineraries (record_hash)"
+
+# Columns returned by the query API
+SUMMARY_COLUMNS = ("id", "origin", "destination", "departure_date", "return_date", "airline",
+                   "price", "price_text", "currency", "scraped_at")
+
+
+def parse_price(price_text):
+    """
+    Split a card price such as "€1,234", "1 234 €" or "$567.50" into (amount, currency).
+
+    :return: (float or None, currency symbol/code or None)
+    """
+    if not price_text:
+        return None, None
+
+    digits = re.sub(r"[^\d.,]", "", price_text)
+    if not re.search(r"\d", digits):
+        return None, None
+
+    currency_match = re.search(r"[^\d\s.,]+", price_text)
+    currency = currency_match.group(0) if currency_match else None
+    # A trailing ",dd" / ".dd" is a decimal part, every other separator groups thousands
+    decimal_match = re.search(r"[.,](\d{1,2})$", digits)
+    if decimal_match:
+        whole = re.sub(r"[.,]", "", digits[:decimal_match.start()])
+        return float(f"{whole or 0}.{decimal_match.group(1)}"), currency
+    return float(re.sub(r"[.,]", "", digits)), currency
+
+
+def record_hash(record_json):
+    """Uniqueness key of a stored record: SHA-1 of its JSON text."""
+    return hashlib.sha1(record_json.encode("utf-8")).hexdigest()
+
+
+class SqliteFlightStore:
+    """SQLite storage backend compatible with JsonlFlightStore and BackgroundFlightWriter."""
+
+    def __init__(self, path="json_data/flights.db"):
+        """
+        Open (and create if needed) the database.
+
+        :param path: SQLite database file.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(SCHEMA)
+        self._migrate()
+        self._connection.execute(UNIQUE_INDEX)
+
+    def _migrate(self):
+        """
+        Add record_hash to a database created before it existed and fill it in. Copies stored more
+        than once (by repeated imports) are deleted, keeping the oldest row.
+        """
+        columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(itineraries)")}
+        if "record_hash" in columns:
+            return
+
+        with self._connection:
+            self._connection.execute("ALTER TABLE itineraries ADD COLUMN record_hash TEXT")
+            seen = set()
+            duplicates = []
+            for row in self._connection.execute("SELECT id, record FROM itineraries ORDER BY id").fetchall():
+                key = record_hash(row["record"])
+                if key in seen:
+                    duplicates.append((row["id"],))
+                else:
+                    seen.add(key)
+                    self._connection.execute("UPDATE itineraries SET record_hash = ? WHERE id = ?", (key, row["id"]))
+            self._connection.executemany("DELETE FROM itineraries WHERE id = ?", duplicates)
+        if duplicates:
+            logger.info(f"{self.path}: removed {len(duplicates)} duplicate itineraries")
+
+    # ------------------------------------------------------------------ writes
+
+    def _insert(self, cursor, record):
+        """
+        Insert one itinerary (Itinerary or stored dict) with its legs and stops.
+
+        :return: False if the same record is already stored.
+        """
+        itinerary = Itinerary.coerce(record)
+        record_json = itinerary.to_json()
+        legs = itinerary.flights
+        search = itinerary.search or {}
+        first_leg = legs[0] if legs else None
+        first_details = first_leg.first_segment if first_leg else FlightDetails()
+        price, currency = parse_price(itinerary.price)
+
+        cursor.execute(
+            "INSERT OR IGNORE INTO itineraries (origin, destination, departure_date, return_date, flight_type,"
+            " airline, price, price_text, currency, scraped_at, record, record_hash)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (first_leg and first_leg.departure_root) or search.get("departure"),
+                (first_leg and first_leg.arrival_root) or search.get("destination"),
+                search.get("departure_date"),
+                search.get("return_date"),
+                itinerary.flight_type,
+                first_details.airline,
+                price,
+                itinerary.price,
+                currency,
+                itinerary.scraped_at,
+                record_json,
+                record_hash(record_json),
+            ),
+        )
+        if not cursor.rowcount:
+            return False
+        itinerary_id = cursor.lastrowid
+
+        for leg_index, leg in enumerate(legs):
+            details = leg.first_segment
+            cursor.execute(
+                "INSERT INTO legs (itinerary_id, leg_index, flight_label, departure_root, arrival_root,"
+                " total_duration, num_stops, is_direct, departure_time, arrival_time, airline, flight_number)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    itinerary_id, leg_index, leg.flight_label, leg.departure_root, leg.arrival_root,
+                    leg.total_duration, leg.num_stops, int(bool(leg.is_direct)), leg.departure_time,
+                    leg.arrival_time, details.airline, details.flight_number,
+                ),
+            )
+            leg_id = cursor.lastrowid
+
+            cursor.executemany(
+                "INSERT INTO stops (leg_id, stop_number, departure_time, departure_date, departure_location,"
+                " departure_airport, arrival_time, arrival_date, arrival_location, arrival_airport, airline,"
+                " operating_airline, flight_number, seating_info) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        leg_id, stop.stop_number,
+                        stop.departure_time, stop.departure_date, stop.departure_location, stop.departure_airport,
+                        stop.arrival_time, stop.arrival_date, stop.arrival_location, stop.arrival_airport,
+                        stop.flight_details.airline, stop.flight_details.operating_airline,
+                        stop.flight_details.flight_number,
+                        json.dumps(stop.flight_details.seating_info.to_dict(), ensure_ascii=False),
+                    )
+                    for stop in leg.stops
+                ],
+            )
+        return True
+
+    def append(self, record):
+        """Insert a single itinerary record."""
+        self.append_many([record])
+
+    def append_many(self, records, fsync=None):
+        """
+        Insert several itinerary records in one transaction.
+
+        :param records: Iterable of Itinerary objects or itinerary dicts.
+        :param fsync: Checkpoint the WAL after the transaction (mirrors the JSONL store's fsync flag).
+        :return: Number of records inserted (records already stored are skipped).
+        """
+        count = 0
+        with self._lock:
+            with self._connection:
+                cursor = self._connection.cursor()
+                for record in records:
+                    count += self._insert(cursor, record)
+            if fsync:
+                self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return count
+
+    def sync(self):
+        """Checkpoint the WAL into the main database file."""
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    # ------------------------------------------------------------------ migration
+
+    def import_file(self, path, batch_size=1000):
+        """
+        Bulk-import a legacy {"flights": [...]} JSON file or a JSONL store directory.
+        Importing a path again only adds the records that are new since the last import.
+
+        Legacy records carry no price and no search parameters: origin and destination are taken from
+        their first leg, but price and travel dates stay empty, so cheapest() never returns them
+        (by_airline() and scraped_between() do).
+
+        :param path: Legacy JSON file or JsonlFlightStore directory.
+        :param batch_size: Records per transaction.
+        :return: Number of newly imported records.
+        """
+        if os.path.isdir(path):
+            records = JsonlFlightStore.read_directory(path)  # Read-only: a live store keeps its active segment
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                records = iter(json.load(file).get("flights", []))
+
+        total = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += self.append_many(batch)
+                batch = []
+        total += self.append_many(batch)
+        return total
+
+    # ------------------------------------------------------------------ queries
+
+    def _query(self, sql, params):
+        """Run a summary query and return plain dicts."""
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def cheapest(self, origin, destination, date_from=None, date_to=None, limit=10):
+        """
+        Cheapest itineraries for a route, optionally within a departure date range (YYYY-MM-DD).
+        Uses idx_itineraries_route.
+        """
+        sql = (f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM itineraries"
+               " WHERE origin = ? AND destination = ? AND price IS NOT NULL")
+        params = [origin, destination]
+        if date_from:
+            sql += " AND departure_date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND departure_date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY price LIMIT ?"
+        params.append(limit)
+        return self._query(sql, params)
+
+    def by_airline(self, airline, limit=50):
+        """Most recently scraped itineraries whose first segment is flown by an airline."""
+        sql = (f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM itineraries"
+               " WHERE airline = ? ORDER BY scraped_at DESC LIMIT ?")
+        return self._query(sql, (airline, limit))
+
+    def scraped_between(self, start, end=None, limit=1000):
+        """Itineraries scraped in a time range (ISO-8601 UTC strings)."""
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM itineraries WHERE scraped_at >= ?"
+        params = [start]
+        if end:
+            sql += " AND scraped_at < ?"
+            params.append(end)
+        sql += " ORDER BY scraped_at LIMIT ?"
+        params.append(limit)
+        return self._query(sql, params)
+
+    def get(self, itinerary_id):
+        """Return the full itinerary record stored under an id, or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT record FROM itineraries WHERE id = ?",
+                                           (itinerary_id,)).fetchone()
+        return json.loads(row["record"]) if row else None
+
+    def count(self):
+        """Number of stored itineraries."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM itineraries").fetchone()[0]
+
+
+def main():
+    """Command-line entry point for importing and querying the SQLite store."""
+    parser = argparse.ArgumentParser(description="Query or populate the SQLite flight store.")
+    parser.add_argument("--db", default="json_data/flights.db", help="SQLite database file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Bulk-import legacy JSON files or JSONL store directories.")
+    import_parser.add_argument("paths", nargs="+")
+
+    cheapest_parser = commands.add_parser("cheapest", help="Cheapest itineraries for a route.")
+    cheapest_parser.add_argument("origin")
+    cheapest_parser.add_argument("destination")
+    cheapest_parser.add_argument("--from", dest="date_from")
+    cheapest_parser.add_argument("--to", dest="date_to")
+    cheapest_parser.add_argument("--limit", type=int, default=10)
+
+    airline_parser = commands.add_parser("airline", help="Latest itineraries of an airline.")
+    airline_parser.add_argument("airline")
+    airline_parser.add_argument("--limit", type=int, default=50)
+
+    args = parser.parse_args()
+    store = SqliteFlightStore(args.db)
+    try:
+        if args.command == "import":
+            for path in args.paths:
+                count = store.import_file(path)
+                print(f"[SUCCESS] Imported {count} new flights from {path}")
+            return
+
+        if args.command == "cheapest":
+            rows = store.cheapest(args.origin, args.destination, args.date_from, args.date_to, args.limit)
+        else:
+            rows = store.by_airline(args.airline, args.limit)
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
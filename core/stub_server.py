@@ -0,0 +1,136 @@
+# core/stub_server.py
+
+"""
+This module serves recorded pages and API responses from a local HTTP server,
+so network capture, the HTTP engine and benchmarks can run without touching the live site.
+
+A fixture directory contains the recorded files plus a routes.json manifest mapping request paths
+(without the query string) to files, e.g. {"/umbrella/v2/graphql": "search_return_itineraries.json"}.
+A path ending in "*" matches every request path with that prefix, e.g. {"/en/search/results/*": "results.html"}.
+
+Usage:
+    python -m core.stub_server fixtures/network --port 8765
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Serves the recorded file registered for the request path."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real site
+
+    def _serve(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)  # Request bodies (e.g. GraphQL queries) are ignored
+
+        file_name = self.server.resolve(path)
+        if file_name is None:
+            body = b"Not recorded"
+            self.send_response(404)
+            content_type = "text/plain"
+        else:
+            with open(os.path.join(self.server.fixture_dir, file_name), "rb") as file:
+                body = file.read()
+            self.send_response(200)
+            content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record(path, len(body))
+
+    do_GET = _serve
+    do_POST = _serve
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark and scraper output readable
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Threaded local server replaying a fixture directory."""
+
+    daemon_threads = True
+
+    def __init__(self, fixture_dir, host="127.0.0.1", port=0, routes=None):
+        """
+        :param fixture_dir: Directory with the recorded files (and routes.json unless `routes` is given).
+        :param host: Interface to bind.
+        :param port: Port to bind (0 picks a free one).
+        :param routes: Mapping of request path -> file name, overriding routes.json.
+        """
+        super().__init__((host, port), _ReplayHandler)
+        self.fixture_dir = fixture_dir
+        if routes is None:
+            with open(os.path.join(fixture_dir, "routes.json"), "r", encoding="utf-8") as file:
+                routes = json.load(file)
+        self.routes = routes
+        self.requests_served = 0
+        self.bytes_served = 0
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    def resolve(self, path):
+        """Return the file registered for a request path (exact match first, then the longest prefix)."""
+        if path in self.routes:
+            return self.routes[path]
+        prefixes = [route for route in self.routes if route.endswith("*") and path.startswith(route[:-1])]
+        return self.routes[max(prefixes, key=len)] if prefixes else None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path, size):
+        with self._stats_lock:
+            self.requests_served += 1
+            self.bytes_served += size
+
+    def start(self):
+        """Serve in a background thread and return the server."""
+        self._thread = threading.Thread(target=self.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded pages and API responses locally.")
+    parser.add_argument("fixture_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixture_dir, args.host, args.port)
+    print(f"[INFO] Replaying {args.fixture_dir} at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# core/telemetry.py
+
+"""
+This module traces where the time of a route goes and exports it.
+
+- span(name, **attributes) measures a block as a tracing span; spans nest through a context
+  variable, inherit the route of their parent and feed a latency histogram per phase and route.
+- REGISTRY aggregates the histograms and counters and renders them in the Prometheus text format
+  (MetricsHTTPServer serves /metrics) or as JSON (MetricsFileExporter writes a file periodically).
+- configure_logging() sets up leveled, structured logs (text or JSON lines) that carry the
+  current span id, trace id and route.
+"""
+
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers everything from a single WebDriver command to a whole route
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_span = contextvars.ContextVar("flightscraper_span", default=None)
+
+
+class Span:
+    """One timed operation; spans of the same route share a trace id."""
+
+    __slots__ = ("name", "span_id", "parent_id", "trace_id", "attributes", "started", "duration", "error")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.attributes = dict(parent.attributes) if parent else {}
+        self.attributes.update(attributes or {})
+        self.started = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Trace the enclosed block and record its duration in the "flightscraper_phase_seconds" histogram,
+    labelled with the phase name and the route (inherited from the enclosing span).
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        labels = {"phase": name, "route": current.attributes.get("route", "")}
+        REGISTRY.observe("flightscraper_phase_seconds", labels, current.duration)
+        if current.error:
+            REGISTRY.inc("flightscraper_phase_errors_total", labels)
+        logger.debug(f"span {name} finished in {current.duration:.3f}s",
+                     extra={"span_name": name, "duration": round(current.duration, 6),
+                            "parent_id": current.parent_id})
+        _current_span.reset(token)
+
+
+def traced(name=None):
+    """Decorator running a function inside span(name or the function's name)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+def _label_text(labels):
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in sorted(labels.items()))
+    return "{" + ",".join(escaped) + "}" if labels else ""
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled histograms and counters."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def to_json(self):
+        """Histograms (count, sum, mean, p50/p95 bucket bounds) and counters with their labels."""
+        with self._lock:
+            return {
+                "generated_at": time.time(),
+                "histograms": [{"name": name, "labels": dict(labels), **histogram.snapshot()}
+                               for (name, labels), histogram in sorted(self._histograms.items())],
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+            }
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+            declared = set()
+            for (name, labels), histogram in histograms:
+                if name not in declared:
+                    lines.append(f"# TYPE {name} histogram")
+                    declared.add(name)
+                labels = dict(labels)
+                cumulative = 0
+                for bound, count in zip([str(bound) for bound in histogram.buckets] + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_label_text(labels)} {histogram.count}")
+
+            for (name, labels), value in counters:
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                lines.append(f"{name}{_label_text(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(REGISTRY.to_json()).encode("utf-8"), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = REGISTRY.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    """Serves /metrics (Prometheus text) and /metrics.json from a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, port=9108, host="127.0.0.1"):
+        super().__init__((host, port), _MetricsHandler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics at http://{self.server_address[0]}:{self.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MetricsFileExporter:
+    """Writes REGISTRY as JSON to a file every `interval` seconds (and once more on stop)."""
+
+    def __init__(self, path="json_data/metrics.json", interval=15.0):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def export(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(REGISTRY.to_json(), file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()
+
+
+class SpanContextFilter(logging.Filter):
+    """Adds the current span id, trace id and route to every log record."""
+
+    def filter(self, record):
+        current = _current_span.get()
+        record.span_id = current.span_id if current else "-"
+        record.trace_id = current.trace_id if current else "-"
+        record.route = current.attributes.get("route", "-") if current else "-"
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    EXTRA_FIELDS = ("span_name", "duration", "parent_id")
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "span_id": record.span_id,
+            "trace_id": record.trace_id,
+            "route": record.route,
+            "thread": record.threadName,
+        }
+        entry.update({field: getattr(record, field) for field in self.EXTRA_FIELDS if hasattr(record, field)})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level=None, json_format=None):
+    """
+    Route all logs to stderr with span context.
+
+    :param level: Log level (default: FLIGHTSCRAPER_LOG_LEVEL or INFO).
+    :param json_format: JSON lines instead of text (default: FLIGHTSCRAPER_LOG_FORMAT == "json").
+    """
+    level = level or os.environ.get("FLIGHTSCRAPER_LOG_LEVEL", "INFO")
+    if json_format is None:
+        json_format = os.environ.get("FLIGHTSCRAPER_LOG_FORMAT", "text").lower() == "json"
+
+    handler = logging.StreamHandler()
+    handler.addFilter(SpanContextFilter())
+    handler.setFormatter(JsonLogFormatter() if json_format else logging.Formatter(
+        "%(asctime)s %(levelname)-7s %(name)s [span=%(span_id)s route=%(route)s] %(message)s",
+        "%Y-%m-%dT%H:%M:%S"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Keep third-party chatter out of the scraper's logs
+    for noisy in ("selenium", "urllib3", "WDM"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
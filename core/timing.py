@@ -0,0 +1,207 @@
+# core/timing.py
+
+"""
+This module replaces fixed sleeps in the scrape flow with condition-based waits.
+Every wait has a timeout and returns as soon as its condition holds (element present, network idle,
+DOM mutations settled). Human-like jitter is a separate, optional policy, and FlowTiming reports how
+long each phase spent waiting, pausing for jitter and actually working.
+"""
+
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from core.telemetry import span
+
+
+logger = logging.getLogger(__name__)
+
+
+# Resolves once no DOM mutation happened for `quietMs`, or with false after `timeoutMs`.
+DOM_SETTLED_SCRIPT = """
+const quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+let quietTimer = null, hardTimer = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quietMs);
+});
+function finish(settled) {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(hardTimer);
+    done(settled);
+}
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+quietTimer = setTimeout(() => finish(true), quietMs);
+hardTimer = setTimeout(() => finish(false), timeoutMs);
+"""
+
+# Resolves once the page is loaded and no new resource was fetched for `quietMs`.
+NETWORK_IDLE_SCRIPT = """
+const quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+performance.setResourceTimingBufferSize(100000);
+const started = performance.now();
+let lastCount = performance.getEntriesByType('resource').length, stableSince = started;
+(function check() {
+    const now = performance.now(), count = performance.getEntriesByType('resource').length;
+    if (count !== lastCount) {
+        lastCount = count;
+        stableSince = now;
+    }
+    if (document.readyState === 'complete' && now - stableSince >= quietMs) return done(true);
+    if (now - started >= timeoutMs) return done(false);
+    setTimeout(check, 100);
+})();
+"""
+
+
+class JitterPolicy:
+    """Optional random pauses that mimic a human; never needed for correctness."""
+
+    def __init__(self, enabled=True, min_delay=0.5, max_delay=1.5):
+        """
+        :param enabled: Whether pauses happen at all.
+        :param min_delay: Default minimum pause in seconds.
+        :param max_delay: Default maximum pause in seconds.
+        """
+        self.enabled = enabled
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the policy from the environment:
+        FLIGHTSCRAPER_JITTER=0 disables it, FLIGHTSCRAPER_JITTER_MIN / _MAX set the range.
+        """
+        return cls(
+            enabled=os.environ.get("FLIGHTSCRAPER_JITTER", "1").lower() not in ("0", "false", "off", "no"),
+            min_delay=float(os.environ.get("FLIGHTSCRAPER_JITTER_MIN", 0.5)),
+            max_delay=float(os.environ.get("FLIGHTSCRAPER_JITTER_MAX", 1.5)),
+        )
+
+    def delay(self, min_delay=None, max_delay=None):
+        """Return the pause length to apply (0 when disabled)."""
+        if not self.enabled:
+            return 0.0
+        low = self.min_delay if min_delay is None else min_delay
+        high = self.max_delay if max_delay is None else max_delay
+        return random.uniform(low, high)
+
+
+class FlowTiming:
+    """Condition-based waits plus per-phase accounting of waiting, jitter and working time."""
+
+    def __init__(self, jitter=None):
+        """
+        :param jitter: JitterPolicy to apply (default: JitterPolicy.from_env()).
+        """
+        self.jitter = jitter if jitter is not None else JitterPolicy.from_env()
+        self.phases = {}
+        self._stack = []
+
+    def _stats(self, name):
+        return self.phases.setdefault(name, {"calls": 0, "total": 0.0, "waiting": 0.0, "jitter": 0.0,
+                                             "nested": 0.0})
+
+    def _record(self, field, seconds):
+        """Add seconds to a field of the innermost active phase."""
+        self._stats(self._stack[-1] if self._stack else "other")[field] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Account the enclosed block (and the waits inside it) to a named phase, traced as a span."""
+        stats = self._stats(name)
+        stats["calls"] += 1
+        self._stack.append(name)
+        started = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - started
+            stats["total"] += elapsed
+            # Nested phases are reported on their own; exclude them from the parent's working time
+            if self._stack:
+                self._record("nested", elapsed)
+
+    @contextmanager
+    def waiting(self):
+        """Count the enclosed block as waiting time of the current phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record("waiting", time.perf_counter() - started)
+
+    def pause(self, min_delay=None, max_delay=None):
+        """Apply the jitter policy (a no-op when jitter is disabled)."""
+        delay = self.jitter.delay(min_delay, max_delay)
+        if delay > 0:
+            time.sleep(delay)
+            self._record("jitter", delay)
+
+    def wait_until(self, driver, condition, timeout=10, poll_frequency=0.1):
+        """
+        Wait for a Selenium condition.
+
+        :return: The condition's value, or None if it did not hold within the timeout.
+        """
+        # A DriverProfiler attached to the driver records the wait and its polls
+        profiler = getattr(driver, "command_profiler", None)
+        with self.waiting(), (profiler.wait(condition, timeout) if profiler else nullcontext({})) as wait:
+            try:
+                return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+            except TimeoutException:
+                wait["timed_out"] = True
+                return None
+
+    def wait_for_dom_settled(self, driver, quiet_ms=300, timeout=10):
+        """
+        Wait until the DOM stops changing for `quiet_ms` (MutationObserver inside the page).
+
+        :return: True if the DOM settled, False on timeout or error.
+        """
+        with self.waiting():
+            try:
+                return bool(driver.execute_async_script(DOM_SETTLED_SCRIPT, quiet_ms, int(timeout * 1000)))
+            except Exception:
+                return False
+
+    def wait_for_network_idle(self, driver, quiet_ms=500, timeout=15):
+        """
+        Wait until the page is loaded and no resource was fetched for `quiet_ms`.
+
+        :return: True if the network went idle, False on timeout or error.
+        """
+        with self.waiting():
+            try:
+                return bool(driver.execute_async_script(NETWORK_IDLE_SCRIPT, quiet_ms, int(timeout * 1000)))
+            except Exception:
+                return False
+
+    def report(self):
+        """Per-phase totals split into waiting, jitter and working seconds."""
+        report = {}
+        for name, stats in self.phases.items():
+            report[name] = {
+                "calls": stats["calls"],
+                "total": round(stats["total"], 3),
+                "waiting": round(stats["waiting"], 3),
+                "jitter": round(stats["jitter"], 3),
+                "nested": round(stats["nested"], 3),
+                "working": round(max(0.0, stats["total"] - stats["waiting"] - stats["jitter"] - stats["nested"]), 3),
+            }
+        return report
+
+    def print_report(self, label=""):
+        """Print the waiting-versus-working breakdown of every phase."""
+        logger.info(f"Phase timing{f' for {label}' if label else ''}:")
+        for name, stats in self.report().items():
+            logger.info(f"  {name}: {stats['total']}s total, {stats['waiting']}s waiting, "
+                        f"{stats['jitter']}s jitter, {stats['working']}s working ({stats['calls']} calls)")
@@ -1,89 +1,449 @@
 """
 Main entry point for the Kiwi Flight Scraper.
-This script runs two scraper instances in parallel, waits for them to finish, then starts the next batch.
+This script runs a fixed number of scraper workers that continuously pull routes from a rate-limited queue.
+
+For several processes or hosts, one coordinator fills a shared lease queue and workers claim routes from it:
+    python main.py --mode coordinator --queue json_data/job_queue.db
+    python main.py --mode worker --queue json_data/job_queue.db     # start as many as the machines allow
 """
 
-import threading
+import argparse
+import logging
+import os
 import time
+from functools import partial
 from core.scraper_engine import KiwiFlightScraper
+from config.save_data import close_flight_stores, get_flight_store, save_flight_data
+from core.background_writer import BackgroundFlightWriter
+from core.sqlite_store import SqliteFlightStore
+from core.browser_manager import BrowserManager, PerformanceProfile
+from core.driver_pool import DriverPool
+from core.browser_contexts import ContextPool
+from core.scheduler import RouteScheduler, TokenBucket
+from core.search_url import LocationResolver, slugify
+from core.http_engine import HttpSearchEngine
+from core.search_cache import SearchCache
+from core.delta_index import DeltaIndex
+from core.job_journal import JobJournal
+from core.date_grid import CalendarPriceHistory, DateGridSearch, flexible_window
+from core.lease_queue import LeaseQueue, LeaseWorker
+from core.telemetry import MetricsFileExporter, MetricsHTTPServer, configure_logging, span
+
+
+logger = logging.getLogger(__name__)
+
+
+# ✅ Define multiple routes to scrape
+ROUTES = [
+    ("Chicago", "London", "2025-02-06", "2025-03-01", "February 2025", "March 2025"),
+    ("New York", "Paris", "2025-02-10", "2025-03-05", "February 2025", "March 2025"),
+    ("Los Angeles", "LHE", "2025-02-15", "2025-03-10", "February 2025", "March 2025"),
+    ("Toronto", "MUX", "2025-02-20", "2025-03-15", "February 2025", "March 2025"),
+    ("San Francisco", "Tokyo", "2025-02-25", "2025-03-20", "February 2025", "March 2025"),
+    ("Miami", "Dubai", "2025-03-01", "2025-03-25", "March 2025", "March 2025")
+]
+
+
+def run_scraper(departure, destination, departure_date, return_date, departure_month, return_month, sink=None,
+                pool=None, search_mode="form", location_resolver=None, results_mode="cards",
+                max_flights=3, cache=None, refresh=None, force_refresh=False, cache_ttl=None, delta_index=None,
+                journal=None, on_cached=None):
+    """
+    Answers a single route, from the search cache when possible, and returns its number of itineraries.
+    Failures are raised (and recorded in the journal) so the scheduler reports them.
+
+    :param cache: SearchCache consulted before starting a browser (None scrapes every time).
+    :param on_cached: Callable receiving each itinerary answered from the cache. Those were stored when they
+                      were scraped, so they are not passed to the sink again.
+    :param refresh: Callable queuing a background re-scrape of a stale route, called with the route tuple.
+    :param force_refresh: Scrape even if the cache holds the route (used by refresh jobs).
+    :param cache_ttl: Seconds this route's results stay fresh (default: the cache's TTL).
+    :param journal: JobJournal of the run; routes it lists as done are skipped, partial ones resumed.
+    Other parameters are passed to scrape_route().
+    """
+    route = (departure, destination, departure_date, return_date, departure_month, return_month)
+    if journal is None:
+        return fetch_route(route, sink, pool, search_mode, location_resolver, results_mode, max_flights,
+                           cache, refresh, force_refresh, cache_ttl, delta_index, on_cached=on_cached)
+
+    if journal.status(route) == "done" and not force_refresh:
+        logger.info(f"Skipping {departure} -> {destination}: already done according to the job journal.")
+        return 0
+
+    journal_route = journal.start(route)
+    try:
+        count = fetch_route(route, sink, pool, search_mode, location_resolver, results_mode, max_flights,
+                            cache, refresh, force_refresh, cache_ttl, delta_index, journal_route, on_cached)
+    except Exception as e:
+        journal.finish(route, e)
+        raise
+    journal.finish(route)
+    return count
+
+
+def fetch_route(route, sink, pool, search_mode, location_resolver, results_mode, max_flights,
+                cache, refresh, force_refresh, cache_ttl, delta_index, journal_route=None, on_cached=None):
+    """
+    Answer a route from the search cache, or scrape it (see run_scraper() for the parameters).
 
+    :return: Number of itineraries.
+    """
+    departure, destination = route[:2]
+
+    def scrape(records=None):
+        # ✅ Every phase, card and save inside this span is labelled with the route in logs and metrics
+        with span("route", route=f"{departure} -> {destination}"):
+            return scrape_route(*route, sink=sink, pool=pool, search_mode=search_mode,
+                                location_resolver=location_resolver, results_mode=results_mode,
+                                max_flights=max_flights, delta_index=delta_index, journal=journal_route,
+                                collect=records.append if records is not None else None)
+
+    if cache is None:
+        return scrape()
+
+    # ✅ Delta runs and resumed routes only return part of the route's itineraries; never cache those as the answer
+    cacheable = delta_index is None and not (journal_route is not None and journal_route.resumed)
+    key = SearchCache.key(*route)
+    # ✅ Network results are not limited by max_flights, so they answer any limit
+    limit = max_flights if results_mode == "cards" else None
+    # ✅ Only a scrape whose result will be cached keeps its itineraries in memory
+    records = [] if cacheable else None
+    if force_refresh:
+        try:
+            count = scrape(records)
+        finally:
+            cache.end_refresh(key)  # ✅ A failed or empty refresh can be queued again by the next stale hit
+        if records:
+            cache.put(key, records, cache_ttl, limit)
+        return count
+
+    count = 0
 
-def run_scraper(departure, destination, departure_date, return_date, departure_month, return_month):
+    def load():
+        nonlocal count
+        count = scrape(records)
+        return records
+
+    cached, state = cache.fetch(key, load, refresh=(lambda: refresh(route)) if refresh else None, ttl=cache_ttl,
+                                store=cacheable, limit=limit)
+    if state != "miss":
+        logger.info(f"{departure} -> {destination}: {len(cached)} cached itineraries ({state}).")
+        if on_cached is not None:
+            for flight_data in cached:
+                on_cached(flight_data)
+        return len(cached)
+    return count
+
+
+def scrape_route(departure, destination, departure_date, return_date, departure_month, return_month, sink=None,
+                 pool=None, search_mode="form", location_resolver=None, results_mode="cards", max_flights=3,
+                 delta_index=None, journal=None, collect=None):
     """
     Runs a flight scraper instance for a single route.
+    Itineraries are streamed to the sink as they are scraped; only `collect` (if given) keeps them.
+
+    :param sink: Callable receiving each scraped itinerary (default: save_flight_data).
+    :param pool: DriverPool to borrow a browser from; without it a fresh Chrome is started and quit.
+    :param search_mode: "form" or "url" (open the results page directly, falling back to the form).
+    :param location_resolver: Shared LocationResolver for the "url" mode.
+    :param results_mode: "cards" or "network" (read the search API responses instead of the result cards).
+    :param max_flights: Maximum itineraries scraped from the result cards of this route (None for all).
+    :param delta_index: Shared DeltaIndex; only new or re-priced itineraries are then saved.
+    :param journal: JournalRoute recording saved cards (and skipping those saved by an interrupted attempt).
+    :param collect: Callable also receiving each itinerary, e.g. list.append when the search cache needs them.
+    :return: Number of itineraries scraped for this route.
     """
-    print(f"\n[INFO] Starting scraper for: {departure} -> {destination}")
+    logger.info(f"Starting scraper for: {departure} -> {destination}")
+
+    driver = pool.acquire() if pool else None
+    count = 0
 
     # ✅ Initialize the scraper
-    scraper = KiwiFlightScraper(
-        departure=departure,
-        destination=destination,
-        departure_date=departure_date,
-        return_date=return_date,
-        departure_month=departure_month,
-        return_month=return_month,
-        headless=False  # ✅ Run headless for better performance
-    )
+    try:
+        scraper = KiwiFlightScraper(
+            departure=departure,
+            destination=destination,
+            departure_date=departure_date,
+            return_date=return_date,
+            departure_month=departure_month,
+            return_month=return_month,
+            headless=False,  # ✅ Run headless for better performance
+            driver=driver,
+            search_mode=search_mode,
+            location_resolver=location_resolver,
+            results_mode=results_mode,
+            max_flights=max_flights,
+            delta_index=delta_index,
+            journal=journal
+        )
+    except Exception:
+        if pool and driver is not None:
+            pool.release(driver)  # ✅ A scraper that failed to start must not keep the pooled browser
+        raise
 
     try:
-        scraper.open_website()
-        scraper.accept_terms()
-        scraper.set_departure()
-        scraper.random_delay()
-        scraper.add_place()
-        scraper.set_destination()
-        scraper.random_delay()
-        scraper.add_place()
-        scraper.set_dates()
-        scraper.search_flights()
+        # ✅ The store is one consumer of the itinerary stream; records arrive while the scrape continues
+        for flight_data in scraper.iter_flights():
+            (sink or save_flight_data)(flight_data)
+            if collect is not None:
+                collect(flight_data)
+            count += 1
 
     except Exception as e:
-        print(f"[ERROR] Exception in scraper for {departure} -> {destination}: {e}")
+        logger.error(f"Exception in scraper for {departure} -> {destination}: {e}")
+        raise  # ✅ Let the scheduler (and the job journal) record the failure
 
     finally:
-        scraper.driver.quit()  # ✅ Ensure browser closes after execution
-        print(f"[INFO] Scraper finished for: {departure} -> {destination}\n")
+        scraper.timing.print_report(f"{departure} -> {destination}")  # ✅ Waiting vs. working per phase
+        scraper.navigations.print_report(f"{departure} -> {destination}")  # ✅ Bytes and load time per page
+        if scraper.command_profiler:
+            # ✅ Slowest WebDriver commands and timed-out waits, plus a flamegraph input file
+            scraper.command_profiler.print_report(f"{departure} -> {destination}")
+            scraper.command_profiler.dump_folded(
+                f"json_data/profiles/{slugify(departure)}-{slugify(destination)}-{departure_date}.folded")
+        if pool:
+            pool.release(scraper.driver)  # ✅ Reset the browser and hand it to the next route
+        else:
+            scraper.driver.quit()  # ✅ Ensure browser closes after execution
+        logger.info(f"Scraper finished for: {departure} -> {destination}")
+
+    return count
 
 
-def main():
+def main(storage="jsonl", results_mode="cards", engine="browser", delta=False, max_contexts=6):
     """
     Manages multiple scrapers using multithreading.
-    Runs 2 scrapers in parallel, waits for them to finish, then starts the next batch.
+    Two workers pull routes from a priority queue; a new route starts as soon as a worker is free,
+    paced by a token bucket instead of fixed sleeps between batches.
+
+    :param storage: "jsonl" (append-only segments) or "sqlite" (indexed json_data/flights.db).
+    :param results_mode: "cards" (scrape result cards) or "network" (read the search API responses).
+    :param engine: "browser" (one Chrome per worker), "contexts" (one Chrome hosting a tab per route)
+        or "http" (asyncio search API client, no browser).
+    :param delta: Monitor mode: skip cards seen in earlier runs and only save new or re-priced itineraries.
+    :param max_contexts: Routes scraped at the same time in the shared Chrome of the "contexts" engine.
     """
+    if engine == "contexts" and results_mode == "network":
+        # The performance log is read per session, so responses of concurrent tabs would mix
+        raise ValueError("The contexts engine does not support results_mode='network'")
 
-    # ✅ Define multiple routes to scrape
-    routes = [
-        ("Chicago", "London", "2025-02-06", "2025-03-01", "February 2025", "March 2025"),
-        ("New York", "Paris", "2025-02-10", "2025-03-05", "February 2025", "March 2025"),
-        ("Los Angeles", "LHE", "2025-02-15", "2025-03-10", "February 2025", "March 2025"),
-        ("Toronto", "MUX", "2025-02-20", "2025-03-15", "February 2025", "March 2025"),
-        ("San Francisco", "Tokyo", "2025-02-25", "2025-03-20", "February 2025", "March 2025"),
-        ("Miami", "Dubai", "2025-03-01", "2025-03-25", "March 2025", "March 2025")
-    ]
+    routes = ROUTES
 
     max_threads = 2  # ✅ Run only 2 scrapers at a time
-    active_threads = []
 
-    for i in range(0, len(routes), max_threads):
-        batch = routes[i:i + max_threads]  # ✅ Get the next 2 routes
+    # ✅ One writer thread owns the store; scrapers hand records off without waiting on disk I/O
+    store = SqliteFlightStore() if storage == "sqlite" else get_flight_store()
+    writer = BackgroundFlightWriter(store, batch_size=20, flush_interval=2.0,
+                                    fsync_policy="periodic").start()
+
+    journal = None
+    try:
+        if engine == "http":
+            # ✅ No Chrome: all routes run concurrently as API requests over shared keep-alive connections
+            HttpSearchEngine(sink=writer.submit, location_resolver=LocationResolver(),
+                             rate_limiter=TokenBucket(rate=5, capacity=10)).run_routes(routes)
+        else:
+            if engine == "contexts":
+                # ✅ One Chrome hosts an isolated tab per route; routes take turns on its WebDriver session
+                # while the others wait for pages, so more routes run at once than Chrome processes
+                pool = ContextPool(BrowserManager(headless=False,
+                                                  profile=PerformanceProfile(page_load_strategy="none")),
+                                   max_contexts=max_contexts)
+                max_threads = pool.capacity
+            else:
+                # ✅ Keep one browser per worker alive across routes instead of starting Chrome per route;
+                # images, fonts and trackers are blocked and navigations return at DOMContentLoaded
+                pool = DriverPool(BrowserManager(headless=False, capture_network=results_mode == "network",
+                                                 profile=PerformanceProfile()),
+                                  size=max_threads)
 
-        # ✅ Start two scrapers in parallel
-        for route in batch:
-            t = threading.Thread(target=run_scraper, args=route)
-            t.start()
-            active_threads.append(t)
+            try:
+                # ✅ Routes scraped within the last hour are answered from the cache; older ones (up to 6h) are
+                # served from the cache while a low-priority refresh job re-scrapes them
+                cache = SearchCache(ttl=3600, stale_ttl=6 * 3600)
 
-        # ✅ Wait for both scrapers to finish before starting the next batch
-        for t in active_threads:
-            t.join()
+                # ✅ Route states and saved cards survive a crash; a rerun skips finished routes and resumes
+                # the rest. Cards count as saved once the writer has stored them.
+                journal = JobJournal(deferred=True, flush=writer.flush)
+                writer.on_written = journal.written
 
-        active_threads = []  # ✅ Reset thread list for the next batch
+                def refresh(route):
+                    scheduler.submit(route, priority=-1, options={"force_refresh": True})
 
-        # ✅ Add a short delay to avoid detection issues
-        time.sleep(5)
+                # ✅ At most one new route every 5 seconds (bursts of 2) to avoid detection issues
+                scheduler = RouteScheduler(
+                    partial(run_scraper, sink=writer.submit, pool=pool, location_resolver=LocationResolver(),
+                            results_mode=results_mode, cache=cache, refresh=refresh,
+                            delta_index=DeltaIndex() if delta else None, journal=journal),
+                    workers=max_threads,
+                    rate_limiter=TokenBucket(rate=1 / 5, capacity=2)
+                )
+                for route in routes:
+                    journal.add(route)
+                    if journal.status(route) == "done":
+                        continue
+                    # priority=... / deadline=... reorder or bound routes; per-route options such as
+                    # {"search_mode": "url", "max_flights": 10} skip the form and raise the card limit
+                    scheduler.submit(route)
+                scheduler.run()
+            finally:
+                pool.close()  # ✅ Quit Chrome also when a route crashes the run or on Ctrl-C
+            logger.info(f"Search cache: {cache.stats()}")
 
-    print("\n[INFO] All scraping tasks completed successfully.")
+    finally:
+        # ✅ Flush everything still queued before closing the store; the journal stays open until then,
+        # so cards of records written after an error or Ctrl-C are still confirmed
+        writer.close()
+        if journal is not None:
+            journal.print_report()
+            journal.close()  # ✅ Archived once every route is done, kept for the next run otherwise
+        if storage == "sqlite":
+            store.close()
+        close_flight_stores()
+    logger.info("All scraping tasks completed successfully.")
+
+
+def run_date_grid(departure, destination, departure_date, return_date, departure_month, return_month, sink=None,
+                  pool=None, flex_days=3, cheapest=3, max_searches=6, history=None, max_flights=3):
+    """
+    Searches the ±flex_days date grid around a route's dates in one browser session.
+    The month arguments are unused: every combination derives its own months.
+
+    :param history: CalendarPriceHistory; combinations whose calendar prices changed are searched too.
+    :return: One result per searched date combination (see DateGridSearch.run()).
+    """
+    driver = pool.acquire() if pool else None
+    grid = DateGridSearch(departure, destination, flexible_window(departure_date, flex_days),
+                          flexible_window(return_date, flex_days), cheapest=cheapest, max_searches=max_searches,
+                          history=history, sink=sink, driver=driver, headless=False, max_flights=max_flights)
+    try:
+        with span("route", route=f"{departure} -> {destination}"):
+            return grid.run()
+    finally:
+        if pool:
+            pool.release(driver)
+
+
+def search_date_grids(routes=ROUTES, flex_days=3, cheapest=3, max_searches=6):
+    """
+    Flexible-date mode: each route is searched as a ±flex_days grid; its calendar prices pick the
+    date combinations worth scraping.
+    """
+    store = get_flight_store()
+    writer = BackgroundFlightWriter(store, batch_size=20, flush_interval=2.0, fsync_policy="periodic").start()
+    pool = DriverPool(BrowserManager(headless=False, profile=PerformanceProfile()), size=2)
+    scheduler = RouteScheduler(
+        partial(run_date_grid, sink=writer.submit, pool=pool, flex_days=flex_days, cheapest=cheapest,
+                max_searches=max_searches, history=CalendarPriceHistory()),
+        workers=2,
+        rate_limiter=TokenBucket(rate=1 / 5, capacity=2)
+    )
+    for route in routes:
+        scheduler.submit(route)
+    try:
+        scheduler.run()
+    finally:
+        pool.close()
+        writer.close()
+        close_flight_stores()
+
+
+def coordinate(queue_path="json_data/job_queue.db", routes=ROUTES, report_interval=30):
+    """
+    Fill the shared lease queue and report progress until every route is done or failed.
+    Routes whose worker died are put back on the queue once their lease expires.
+    """
+    lease_queue = LeaseQueue(queue_path)
+    created = sum(lease_queue.enqueue(route)[1] for route in routes)
+    logger.info(f"Queued {created} new routes in {queue_path} ({len(routes) - created} already queued or done); "
+                f"start workers with --mode worker.")
+
+    while not lease_queue.is_drained():
+        time.sleep(report_interval)
+        lease_queue.requeue_expired()
+        logger.info(f"Job queue: {lease_queue.counts()}")
+
+    LeaseQueue.print_report(lease_queue.report())
+    lease_queue.close()
+
+
+def work(queue_path="json_data/job_queue.db", results_mode="cards", lease_seconds=300):
+    """
+    Run one worker process: claim routes from the shared lease queue until it is drained.
+    Workers write to the shared SQLite store, which handles several writer processes.
+    """
+    lease_queue = LeaseQueue(queue_path, lease_seconds=lease_seconds)
+    pool = DriverPool(BrowserManager(headless=True, capture_network=results_mode == "network",
+                                     profile=PerformanceProfile()), size=1)
+    store = SqliteFlightStore()
+    writer = BackgroundFlightWriter(store, batch_size=20, flush_interval=2.0, fsync_policy="periodic").start()
+    scrape = partial(run_scraper, sink=writer.submit, pool=pool, location_resolver=LocationResolver(),
+                     results_mode=results_mode)
+
+    def scrape_and_store(*route, **options):
+        count = scrape(*route, **options)
+        writer.flush()  # ✅ Only report a route as done once its itineraries are stored
+        return count
+
+    try:
+        LeaseWorker(lease_queue, scrape_and_store).run()
+    finally:
+        pool.close()
+        writer.close()
+        store.close()
+        lease_queue.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Kiwi Flight Scraper")
+    parser.add_argument("--mode", choices=["local", "coordinator", "worker"], default="local")
+    parser.add_argument("--queue", default="json_data/job_queue.db", help="Shared lease queue (SQLite file).")
+    parser.add_argument("--engine", choices=["browser", "contexts", "http"], default="browser",
+                        help="browser: one Chrome per worker; contexts: one Chrome with a tab per route; "
+                             "http: search API client.")
+    parser.add_argument("--max-contexts", type=int, default=6, help="Tabs per Chrome with --engine contexts.")
+    parser.add_argument("--storage", choices=["jsonl", "sqlite"], default="jsonl",
+                        help="jsonl: append-only segments in json_data/flight_segments; sqlite: indexed "
+                             "json_data/flights.db (workers always write to SQLite).")
+    parser.add_argument("--results-mode", choices=["cards", "network"], default="cards",
+                        help="cards: open every result card; network: read the search API responses the "
+                             "results page receives.")
+    parser.add_argument("--delta", action="store_true",
+                        help="Monitor mode: skip cards seen in earlier runs and only save new or re-priced "
+                             "itineraries (browser engines).")
+    parser.add_argument("--flex-days", type=int, default=0,
+                        help="Search a ±N day date grid per route, scraping only the cheapest/changed dates.")
+    parser.add_argument("--log-level", default=None, help="DEBUG, INFO, WARNING or ERROR (default: INFO).")
+    parser.add_argument("--log-format", choices=["text", "json"], default=None)
+    parser.add_argument("--metrics-file", default="json_data/metrics.json",
+                        help="JSON file the per-phase latency histograms are written to periodically.")
+    parser.add_argument("--metrics-interval", type=float, default=15.0)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics.")
+    parser.add_argument("--profile-commands", action="store_true",
+                        help="Profile every WebDriver command; reports and json_data/profiles/*.folded per route.")
+    args = parser.parse_args()
+    if args.engine == "contexts" and args.results_mode == "network":
+        parser.error("--engine contexts does not support --results-mode network")
+
+    if args.profile_commands:
+        os.environ["FLIGHTSCRAPER_PROFILE_COMMANDS"] = "1"
+
+    configure_logging(args.log_level, None if args.log_format is None else args.log_format == "json")
+    exporter = MetricsFileExporter(args.metrics_file, args.metrics_interval).start()
+    metrics_server = MetricsHTTPServer(args.metrics_port).start() if args.metrics_port else None
+
+    try:
+        if args.mode == "coordinator":
+            coordinate(args.queue)
+        elif args.mode == "worker":
+            work(args.queue, results_mode=args.results_mode)
+        elif args.flex_days:
+            search_date_grids(flex_days=args.flex_days)
+        else:
+            main(storage=args.storage, results_mode=args.results_mode, engine=args.engine, delta=args.delta,
+                 max_contexts=args.max_contexts)
+    finally:
+        exporter.stop()  # ✅ Final snapshot of the histograms
+        if metrics_server:
+            metrics_server.stop()